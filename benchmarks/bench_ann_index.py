@@ -0,0 +1,116 @@
+"""
+Benchmark typów indeksu FAISS (Config.RAG_INDEX_TYPE): recall@k względem flat, QPS i pamięć.
+
+Uruchomienie:
+    python -m benchmarks.bench_ann_index --sizes 10000,100000 --types flat,ivf,hnsw,sq,ivfpq
+    python -m benchmarks.bench_ann_index --sizes 1000000 --types ivf,ivfpq --nprobe 8,32
+
+Korpus jest syntetyczny: skupiska wektorów (jak embeddingi tekstów o podobnej tematyce),
+zapytania to zaszumione wektory z korpusu. Ground truth liczy dokładny IndexFlatL2.
+QPS mierzymy dla zapytań pojedynczych (tak jak /ask) - wątki FAISS ograniczone flagą --threads.
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from src.config import Config
+from src.core import vector_index
+
+
+def synthetic_corpus(size: int, dimension: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype("float32")
+    vectors = np.empty((size, dimension), dtype="float32")
+    step = 100_000  # generowanie kawałkami - bez kilku kopii 1M x 384 w pamięci
+    for start in range(0, size, step):
+        end = min(start + step, size)
+        labels = rng.integers(0, clusters, end - start)
+        vectors[start:end] = centers[labels] + 0.5 * rng.standard_normal((end - start, dimension), dtype="float32")
+    return vectors
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def timed_single_queries(index, queries: np.ndarray, k: int):
+    found = np.empty((len(queries), k), dtype="int64")
+    start = time.perf_counter()
+    for i in range(len(queries)):
+        _, found[i] = index.search(queries[i:i + 1], k)
+    elapsed = time.perf_counter() - start
+    return found, len(queries) / elapsed, elapsed / len(queries) * 1000
+
+
+def search_settings(index_type: str, nprobes, ef_searches):
+    if index_type in (vector_index.IVF, vector_index.IVFPQ):
+        return [{"nprobe": n} for n in nprobes]
+    if index_type == vector_index.HNSW:
+        return [{"ef_search": ef} for ef in ef_searches]
+    return [{}]
+
+
+def run(size: int, index_types, k: int, n_queries: int, nprobes, ef_searches, dimension: int):
+    corpus = synthetic_corpus(size, dimension)
+    rng = np.random.default_rng(1)
+    queries = corpus[rng.choice(size, n_queries, replace=False)] + 0.1 * rng.standard_normal(
+        (n_queries, dimension), dtype="float32"
+    )
+
+    exact = faiss.IndexFlatL2(dimension)
+    exact.add(corpus)
+    _, truth = exact.search(queries, k)
+    del exact
+
+    rows = []
+    for index_type in index_types:
+        start = time.perf_counter()
+        index, built = vector_index.create_index(index_type, dimension, size)
+        vector_index.train_index(index, corpus)
+        index.add_with_ids(corpus, np.arange(size, dtype="int64"))
+        build_s = time.perf_counter() - start
+        memory_mb = vector_index.index_memory_bytes(index) / 1024 ** 2
+
+        for params in search_settings(built, nprobes, ef_searches):
+            vector_index.set_search_params(index, **params)
+            found, qps, latency_ms = timed_single_queries(index, queries, k)
+            setting = ", ".join(f"{key}={value}" for key, value in params.items()) or "-"
+            rows.append((size, built, setting, recall_at_k(found, truth), qps, latency_ms, memory_mb, build_s))
+        del index
+    return rows
+
+
+def parse_ints(value: str):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000", help="Rozmiary korpusu (do 1000000)")
+    parser.add_argument("--types", default=",".join(vector_index.INDEX_TYPES))
+    parser.add_argument("--k", type=int, default=Config.RAG_K_RETRIEVAL)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--nprobe", default="4,16,64")
+    parser.add_argument("--ef-search", default="32,64,128")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--threads", type=int, default=1, help="Wątki OpenMP FAISS")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    index_types = [t for t in args.types.split(",") if t]
+
+    print(f"{'size':>8} {'index':>6} {'params':>12} {'recall@' + str(args.k):>9} {'QPS':>9} "
+          f"{'p-query ms':>10} {'memory MB':>10} {'build s':>8}")
+    for size in parse_ints(args.sizes):
+        rows = run(size, index_types, args.k, args.queries, parse_ints(args.nprobe),
+                   parse_ints(args.ef_search), args.dimension)
+        for size_, built, setting, recall, qps, latency_ms, memory_mb, build_s in rows:
+            print(f"{size_:>8} {built:>6} {setting:>12} {recall:>9.3f} {qps:>9.0f} "
+                  f"{latency_ms:>10.3f} {memory_mb:>10.1f} {build_s:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
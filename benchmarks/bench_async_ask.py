@@ -0,0 +1,87 @@
+"""
+Benchmark opóźnień /ask przy równoległych zapytaniach: ścieżka synchroniczna vs async.
+
+Uruchomienie:
+    python -m benchmarks.bench_async_ask --concurrency 20 --tool-latency-ms 200
+
+Aplikacja FastAPI jest wywoływana w procesie (httpx + ASGITransport) z LocalLLMStub,
+syntetycznym modelem embeddingów i narzędziem pogodowym spowolnionym do zadanej latencji
+(udaje wolne API). Trasa `/ask_blocking` odtwarza poprzednie zachowanie endpointu
+(synchroniczne `process_query` wołane wewnątrz `async def`).
+"""
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+import httpx
+
+import src.core.rag_engine as rag_module
+import src.main_api as main_api
+from benchmarks.bench_rag_batching import SyntheticModel
+from src.core.llm_engine import LocalLLMStub
+from src.core.rag_engine import RagEngine
+from src.main_api import AskRequest, app
+from src.tools.registry import registry
+from src.utils.logger import logger
+
+
+def install_slow_weather_tool(latency_s: float):
+    def slow_weather(city: str):
+        time.sleep(latency_s)
+        return {"city": city, "temperature_c": 21.0, "is_raining": False,
+                "is_snowing": False, "wind_speed_kmh": 10.0}
+
+    registry._tools["get_current_weather"] = slow_weather
+
+
+@app.post("/ask_blocking")
+async def ask_blocking(request: AskRequest):
+    # Poprzednia implementacja: blokujące wywołanie w pętli zdarzeń
+    return {"response": main_api.llm_engine.process_query(request.query)}
+
+
+async def run(path: str, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        # Wszystkie zapytania przychodzą w chwili `start` - latencja liczona od tego momentu,
+        # bo przy zablokowanej pętli klient nie zdąży nawet zapisać własnego czasu startu.
+        async def one(i: int) -> float:
+            response = await client.post(path, json={"query": f"Co ubrać w Krakowie? #{i}"})
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = sorted(await asyncio.gather(*(one(i) for i in range(concurrency))))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "wall_s": elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--tool-latency-ms", type=float, default=200)
+    args = parser.parse_args()
+    logger.setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as empty_store:
+        rag_module.rag_engine = RagEngine(model=SyntheticModel(), vector_store_path=empty_store)
+    install_slow_weather_tool(args.tool_latency_ms / 1000.0)
+    main_api.llm_engine = LocalLLMStub()
+
+    print(f"concurrency={args.concurrency} tool_latency={args.tool_latency_ms:.0f}ms")
+    print(f"{'path':>14} | {'wall s':>7} | {'p50 ms':>8} | {'max ms':>8}")
+    print("-" * 47)
+    for label, path in (("before (sync)", "/ask_blocking"), ("after (async)", "/ask")):
+        result = asyncio.run(run(path, args.concurrency))
+        print(f"{label:>14} | {result['wall_s']:>7.2f} | {result['p50_ms']:>8.1f} | {result['max_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark backendów embeddingów (Config.EMBEDDING_BACKEND): czas ładowania, pamięć procesu,
+opóźnienie pojedynczego zapytania (jak w /ask), przepustowość batcha (jak w ingestion)
+oraz zgodność (cosinus) z PyTorch SentenceTransformerem.
+
+Uruchomienie:
+    python -m benchmarks.bench_embeddings --backends sentence_transformers,onnx,onnx_int8
+    python -m benchmarks.bench_embeddings --model /sciezka/do/modelu --threads 1
+
+Każdy backend mierzony w osobnym procesie, żeby pamięć (RSS) nie mieszała się między backendami.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+_CHILD = r"""
+import json, resource, statistics, sys, time
+import numpy as np
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+from src.config import Config
+Config.EMBEDDING_THREADS = THREADS
+from src.core.embeddings import create_embedding_backend
+
+base_rss = rss_mb()
+start = time.perf_counter()
+model = create_embedding_backend(BACKEND, MODEL)
+load_s = time.perf_counter() - start
+model.encode(["warm-up"])
+
+latencies = []
+for query in QUERIES:
+    t = time.perf_counter()
+    model.encode([query])
+    latencies.append((time.perf_counter() - t) * 1000)
+latencies.sort()
+
+corpus = CORPUS
+t = time.perf_counter()
+embeddings = model.encode(corpus)
+batch_s = time.perf_counter() - t
+
+np.save(OUT, np.asarray(embeddings, dtype="float32"))
+print(json.dumps({
+    "load_s": load_s,
+    "rss_mb": rss_mb() - base_rss,
+    "p50_ms": statistics.median(latencies),
+    "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+    "docs_per_s": len(corpus) / batch_s,
+}))
+"""
+
+WORDS = ("len wełna jedwab bawełna płaszcz kurtka sweter deszcz śnieg upał kolory kontrast "
+         "granat beż czerń biel lato zima jesień wiosna wiatr buty szalik czapka elegancko").split()
+
+
+def synthetic_texts(count: int, min_words: int, max_words: int, seed: int):
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(WORDS, rng.integers(min_words, max_words + 1))) for _ in range(count)]
+
+
+def run_backend(backend: str, model: str, threads: int, queries, corpus, out_path: str) -> dict:
+    code = (f"BACKEND = {backend!r}\nMODEL = {model!r}\nTHREADS = {threads!r}\nOUT = {out_path!r}\n"
+            f"QUERIES = {queries!r}\nCORPUS = {corpus!r}\n") + _CHILD
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env)
+    lines = [line for line in output.stdout.splitlines() if line.startswith("{")]
+    if not lines:
+        return {"error": output.stderr.strip().splitlines()[-1] if output.stderr.strip() else "no output"}
+    return json.loads(lines[-1])
+
+
+def main():
+    from src.config import Config
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="sentence_transformers,onnx,onnx_int8")
+    parser.add_argument("--model", default=Config.EMBEDDING_MODEL)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--corpus", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=0, help="Wątki ONNX Runtime (0 = domyślnie)")
+    args = parser.parse_args()
+
+    queries = synthetic_texts(args.queries, 3, 12, seed=1)
+    corpus = synthetic_texts(args.corpus, 8, 40, seed=2)
+    backends = [b for b in args.backends.split(",") if b]
+
+    results, embeddings = {}, {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in backends:
+            out_path = os.path.join(tmp, f"{backend}.npy")
+            results[backend] = run_backend(backend, args.model, args.threads, queries, corpus, out_path)
+            if os.path.exists(out_path):
+                embeddings[backend] = np.load(out_path)
+
+    reference = embeddings.get("sentence_transformers")
+    print(f"{'backend':<22} {'load s':>7} {'RSS MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'docs/s':>9} {'min cos':>8} {'mean cos':>9}")
+    for backend in backends:
+        r = results[backend]
+        if "error" in r:
+            print(f"{backend:<22} failed: {r['error']}")
+            continue
+        if reference is not None and backend in embeddings:
+            e = embeddings[backend]
+            cos = (e * reference).sum(1) / (np.linalg.norm(e, axis=1) * np.linalg.norm(reference, axis=1))
+            min_cos, mean_cos = f"{cos.min():.5f}", f"{cos.mean():.5f}"
+        else:
+            min_cos = mean_cos = "-"
+        print(f"{backend:<22} {r['load_s']:>7.2f} {r['rss_mb']:>8.0f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+              f"{r['docs_per_s']:>9.0f} {min_cos:>8} {mean_cos:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark skanowania guardrails: pętla `phrase in text` vs PatternMatcher (Aho-Corasick).
+
+Uruchomienie:
+    python -m benchmarks.bench_guardrails --sizes 10,1000,10000
+
+Wzorce to losowe 2-3 wyrazowe frazy (deterministyczny seed), teksty to typowe
+zapytanie użytkownika (~200 znaków) i odpowiedź modelu (~2000 znaków), bez dopasowań -
+to najgorszy i najczęstszy przypadek, bo pętla musi sprawdzić każdy wzorzec.
+"""
+import argparse
+import logging
+import random
+import time
+
+from src.core.pattern_matcher import PatternMatcher
+from src.utils.logger import logger
+
+WORDS = (
+    "ignore previous instructions system prompt delete all reveal secret password admin mode "
+    "jailbreak developer override rules forget policy print config root access token hidden "
+    "wełna len poliester jedwab kurtka płaszcz pogoda deszcz wiatr śnieg buty szalik"
+).split()
+
+
+def make_patterns(count: int, rng: random.Random):
+    patterns = set()
+    while len(patterns) < count:
+        patterns.add(" ".join(rng.choice(WORDS) + rng.choice("xyzqj") for _ in range(rng.randint(2, 3))))
+    return sorted(patterns)
+
+
+def make_text(length: int, rng: random.Random) -> str:
+    words = []
+    while sum(len(w) + 1 for w in words) < length:
+        words.append(rng.choice(WORDS))
+    return " ".join(words)[:length]
+
+
+def naive_scan(patterns, text: str):
+    lower_text = text.lower()
+    for phrase in patterns:
+        if phrase in lower_text:
+            return phrase
+    return None
+
+
+def timeit(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,1000,10000")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    logger.setLevel(logging.ERROR)
+
+    rng = random.Random(42)
+    texts = {"query ~200ch": make_text(200, rng), "answer ~2000ch": make_text(2000, rng)}
+
+    print(f"{'patterns':>9} | {'text':>14} | {'build ms':>9} | {'loop µs':>10} | {'matcher µs':>12} | {'speedup':>7}")
+    print("-" * 77)
+    for size in [int(s) for s in args.sizes.split(",")]:
+        patterns = make_patterns(size, rng)
+        start = time.perf_counter()
+        matcher = PatternMatcher(patterns)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        for label, text in texts.items():
+            assert naive_scan(patterns, text) is None and matcher.search(text) is None
+            loop_us = timeit(lambda: naive_scan(patterns, text), args.repeat)
+            ac_us = timeit(lambda: matcher.search(text), args.repeat)
+            print(f"{size:>9} | {label:>14} | {build_ms:>9.1f} | {loop_us:>10.1f} | {ac_us:>12.1f} | {loop_us / ac_us:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Test obciążeniowy /ask: stała liczba równoległych klientów albo zadane tempo napływu zapytań,
+przepustowość, p50/p95/p99 latencji i odsetek błędów; raport JSON + Markdown.
+
+Uruchomienie:
+    python -m benchmarks.bench_load --concurrency 16 --requests 400
+    python -m benchmarks.bench_load --rate 20 --duration 30 --script chain --gemini-latency-ms 400 --gemini-jitter-ms 200
+    python -m benchmarks.bench_load --url http://127.0.0.1:8000 --concurrency 8   # już działający serwer
+
+Bez --url serwer uvicorn startuje w tym procesie z LLMEngine rozmawiającym z lokalnym FakeGenAIServer
+(opóźnienie, rozrzut, skrypt wywołań narzędzi --script, błędy 503 --gemini-error-rate) i narzędziami
+pogodowymi na FakeOpenMeteoServer (benchmarks/fake_servers.py); retrieval na syntetycznym modelu
+embeddingów (--real-rag: prawdziwy model i indeks). Generator i serwer dzielą wtedy GIL - do pomiaru
+samego serwera uruchom go osobno (z GEMINI_BASE_URL / OPEN_METEO_* na atrapy) i podaj --url.
+
+--concurrency N: zamknięta pętla, N klientów wysyła kolejne zapytanie po odpowiedzi na poprzednie.
+--rate R: otwarta pętla, zapytania przychodzą procesem Poissona (średnio R/s) niezależnie od odpowiedzi;
+latencja liczona od zaplanowanej chwili wysłania, więc kolejkowanie po stronie klienta jej nie ukrywa.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from src.config import Config
+from src.utils.logger import logger
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+QUERIES = [
+    "Jaka pogoda w Warszawie?",
+    "Jest upał 35 stopni, co ubrać?",
+    "Czy poliester jest dobry na wesele?",
+    "Co założyć na spacer po Krakowie, gdy pada?",
+    "Jadę do Gdańska i Torunia, co spakować?",
+    "Jaki płaszcz na zimę w Zakopanem?",
+]
+
+# Wywołania narzędzi zwracane przez atrapę Gemini w kolejnych turach zapytania (patrz FakeGenAIServer)
+SCRIPTS: Dict[str, List[List[Dict]]] = {
+    "answer": [],
+    "weather": [[{"name": "get_current_weather", "args": {"city": "Kraków"}}]],
+    "trip": [[{"name": "get_trip_weather", "args": {"cities": ["Gdańsk", "Toruń"]}}]],
+    "parallel": [[{"name": "get_current_weather", "args": {"city": "Warszawa"}},
+                  {"name": "get_current_weather", "args": {"city": "Zakopane"}}]],
+    "chain": [[{"name": "get_user_style_profile", "args": {"user_id": "anna"}}],
+              [{"name": "get_current_weather", "args": {"city": "Warszawa"}}]],
+}
+
+# LLMEngine zamienia błędy Gemini na odpowiedź 200 z komunikatem - liczymy je jako błędy
+APP_ERROR_PREFIXES = ("Błąd API Gemini", "Błąd podczas odsyłania wyników", "Przekroczono limit pętli wywołań")
+
+
+async def _send(client: httpx.AsyncClient, path: str, query: str, scheduled: float, origin: float) -> Dict:
+    status, error = 0, None
+    try:
+        response = await client.post(path, json={"query": query})
+        status = response.status_code
+        if status != 200:
+            error = response.text[:200]
+        elif str(response.json().get("response", "")).startswith(APP_ERROR_PREFIXES):
+            error = response.json()["response"][:200]
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {
+        "start_s": scheduled - origin,
+        "latency_ms": (time.perf_counter() - scheduled) * 1000,
+        "status": status,
+        "error": error,
+    }
+
+
+async def closed_loop(client: httpx.AsyncClient, path: str, concurrency: int,
+                      requests: Optional[int] = None, duration: Optional[float] = None,
+                      queries: List[str] = QUERIES) -> List[Dict]:
+    """concurrency klientów, każdy wysyła następne zapytanie po odpowiedzi; do requests zapytań albo duration s."""
+    samples: List[Dict] = []
+    origin = time.perf_counter()
+    deadline = origin + duration if duration else None
+    sent = 0
+
+    async def worker():
+        nonlocal sent
+        while (requests is None or sent < requests) and (deadline is None or time.perf_counter() < deadline):
+            i, sent = sent, sent + 1
+            samples.append(await _send(client, path, queries[i % len(queries)], time.perf_counter(), origin))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+async def open_loop(client: httpx.AsyncClient, path: str, rate: float,
+                    requests: Optional[int] = None, duration: Optional[float] = None,
+                    queries: List[str] = QUERIES, seed: int = 0) -> List[Dict]:
+    """Napływ Poissona ze średnią rate/s, bez czekania na odpowiedzi; do requests zapytań albo duration s."""
+    rng = random.Random(seed)
+    origin = time.perf_counter()
+    scheduled, tasks = origin, []
+    while requests is None or len(tasks) < requests:
+        scheduled += rng.expovariate(rate)
+        if duration and scheduled - origin >= duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        query = queries[len(tasks) % len(queries)]
+        tasks.append(asyncio.create_task(_send(client, path, query, scheduled, origin)))
+    return list(await asyncio.gather(*tasks))
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Percentyl metodą najbliższej rangi (wartość z próbki, bez interpolacji)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(-(-p * len(sorted_values) // 100)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(samples: List[Dict], elapsed_s: float) -> Dict:
+    latencies = sorted(s["latency_ms"] for s in samples)
+    ok = [s for s in samples if s["error"] is None]
+    status_codes: Dict[str, int] = {}
+    for s in samples:
+        key = str(s["status"]) if s["status"] else "exception"
+        status_codes[key] = status_codes.get(key, 0) + 1
+    errors = len(samples) - len(ok)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "elapsed_s": round(elapsed_s, 3),
+        "throughput_rps": len(samples) / elapsed_s if elapsed_s > 0 else 0.0,
+        "goodput_rps": len(ok) / elapsed_s if elapsed_s > 0 else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else 0.0,
+        },
+        "status_codes": status_codes,
+        "sample_errors": sorted({s["error"] for s in samples if s["error"]})[:5],
+    }
+
+
+def to_markdown(report: Dict) -> str:
+    r, lat = report["results"], report["results"]["latency_ms"]
+    lines = [
+        "# Load Test Report",
+        "",
+        f"**Date:** {report['date']}",
+        f"**Target:** {report['target']}",
+        "",
+        "| Setting | Value |",
+        "|---------|-------|",
+    ]
+    lines += [f"| {key} | {value} |" for key, value in report["settings"].items()]
+    lines += [
+        "",
+        "| Requests | Errors | Error rate | Throughput (req/s) | p50 (ms) | p95 (ms) | p99 (ms) | Max (ms) |",
+        "|----------|--------|------------|--------------------|----------|----------|----------|----------|",
+        f"| {r['requests']} | {r['errors']} | {r['error_rate']:.2%} | {r['throughput_rps']:.2f} | "
+        f"{lat['p50']:.1f} | {lat['p95']:.1f} | {lat['p99']:.1f} | {lat['max']:.1f} |",
+        "",
+        "**Status codes:** " + ", ".join(f"{code}: {count}" for code, count in sorted(r["status_codes"].items())),
+    ]
+    if report.get("fake_servers"):
+        lines.append("**Fake servers:** " + ", ".join(f"{name} {counts}" for name, counts in report["fake_servers"].items()))
+    if r["sample_errors"]:
+        lines += ["", "Sample errors:", ""] + [f"- `{e}`" for e in r["sample_errors"]]
+    return "\n".join(lines) + "\n"
+
+
+def write_report(report: Dict, output: str):
+    """output bez rozszerzenia: zapisuje <output>.json i <output>.md."""
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output + ".json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    with open(output + ".md", "w", encoding="utf-8") as f:
+        f.write(to_markdown(report))
+
+
+def start_local_stack(args) -> Dict:
+    """Atrapy API, Config wskazujący na nie, silnik i uvicorn w wątku; zwraca obiekty do zatrzymania."""
+    import src.core.rag_engine as rag_module
+    import src.main_api as main_api
+    from benchmarks.bench_rag_batching import SyntheticModel
+    from benchmarks.bench_stream_ttfb import free_port, start_server
+    from benchmarks.fake_servers import FakeGenAIServer, FakeOpenMeteoServer
+    from src.core.llm_engine import LLMEngine, LocalLLMStub
+
+    gemini = FakeGenAIServer(latency_ms=args.gemini_latency_ms, jitter_ms=args.gemini_jitter_ms,
+                             script=SCRIPTS[args.script], error_rate=args.gemini_error_rate, seed=args.seed).start()
+    weather = FakeOpenMeteoServer(latency_ms=args.weather_latency_ms, jitter_ms=args.weather_jitter_ms,
+                                  seed=args.seed).start()
+    Config.GOOGLE_API_KEY = Config.GOOGLE_API_KEY or "fake-key"
+    Config.GEMINI_BASE_URL = gemini.base_url
+    Config.OPEN_METEO_GEOCODING_URL = weather.geocoding_url
+    Config.OPEN_METEO_FORECAST_URL = weather.forecast_url
+    if not args.answer_cache:
+        Config.ANSWER_CACHE_MAX_ENTRIES = 0  # każde zapytanie ma dojść do (atrapy) Gemini
+
+    if not args.real_rag:
+        with tempfile.TemporaryDirectory() as empty_store:
+            rag_module.rag_engine = rag_module.RagEngine(model=SyntheticModel(), vector_store_path=empty_store)
+    main_api.llm_engine = LocalLLMStub() if args.engine == "stub" else LLMEngine()
+
+    port = free_port()
+    return {"server": start_server(port), "url": f"http://127.0.0.1:{port}", "fakes": {"gemini": gemini, "weather": weather}}
+
+
+async def drive(args, url: str) -> Tuple[List[Dict], float]:
+    limits = httpx.Limits(max_connections=args.concurrency or args.max_connections,
+                          max_keepalive_connections=args.concurrency or args.max_connections)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        start = time.perf_counter()
+        if args.rate:
+            samples = await open_loop(client, args.path, args.rate, args.requests, args.duration, seed=args.seed)
+        else:
+            samples = await closed_loop(client, args.path, args.concurrency, args.requests, args.duration)
+        return samples, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, help="Równolegli klienci (zamknięta pętla, domyślnie 8)")
+    load.add_argument("--rate", type=float, help="Średnia liczba zapytań na sekundę (otwarta pętla)")
+    parser.add_argument("--requests", type=int, help="Liczba zapytań (domyślnie 200, gdy brak --duration)")
+    parser.add_argument("--duration", type=float, help="Czas trwania testu w sekundach")
+    parser.add_argument("--path", default="/ask")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--max-connections", type=int, default=256, help="Limit połączeń klienta przy --rate")
+    parser.add_argument("--url", help="Adres działającego serwera (bez lokalnego serwera i atrap)")
+    parser.add_argument("--engine", choices=["gemini", "stub"], default="gemini")
+    parser.add_argument("--script", choices=sorted(SCRIPTS), default="weather", help="Wywołania narzędzi atrapy Gemini")
+    parser.add_argument("--gemini-latency-ms", type=float, default=300)
+    parser.add_argument("--gemini-jitter-ms", type=float, default=100)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--weather-latency-ms", type=float, default=80)
+    parser.add_argument("--weather-jitter-ms", type=float, default=40)
+    parser.add_argument("--real-rag", action="store_true", help="Prawdziwy model embeddingów i indeks z data/vector_store")
+    parser.add_argument("--answer-cache", action="store_true", help="Nie wyłączaj cache odpowiedzi")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Ścieżka raportu bez rozszerzenia (domyślnie benchmarks/results/load_<data>)")
+    args = parser.parse_args()
+    if not args.rate and not args.concurrency:
+        args.concurrency = 8
+    if args.requests is None and args.duration is None:
+        args.requests = 200
+    logger.setLevel(logging.ERROR)
+
+    stack = None if args.url else start_local_stack(args)
+    url = args.url or stack["url"]
+    try:
+        samples, elapsed = asyncio.run(drive(args, url))
+    finally:
+        if stack:
+            stack["server"].should_exit = True
+            for fake in stack["fakes"].values():
+                fake.stop()
+
+    settings = {
+        "mode": f"open loop, {args.rate:g} req/s" if args.rate else f"closed loop, {args.concurrency} clients",
+        "requests": args.requests, "duration_s": args.duration, "path": args.path,
+    }
+    if stack:
+        settings.update({
+            "engine": args.engine, "script": args.script, "rag": "real" if args.real_rag else "synthetic",
+            "gemini_latency_ms": f"{args.gemini_latency_ms:g} + 0..{args.gemini_jitter_ms:g}",
+            "gemini_error_rate": args.gemini_error_rate,
+            "weather_latency_ms": f"{args.weather_latency_ms:g} + 0..{args.weather_jitter_ms:g}",
+            "answer_cache": args.answer_cache, "seed": args.seed,
+        })
+    now = datetime.datetime.now()
+    report = {
+        "date": now.strftime("%Y-%m-%d %H:%M:%S"),
+        "target": url if args.url else f"{url} (in-process)",
+        "host": {"python": platform.python_version(), "cpus": os.cpu_count()},
+        "settings": settings,
+        "results": summarize(samples, elapsed),
+        "fake_servers": {name: dict(fake.requests) for name, fake in stack["fakes"].items()} if stack else {},
+        "samples": samples,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"load_{now.strftime('%Y%m%d-%H%M%S')}")
+    write_report(report, output)
+
+    r, lat = report["results"], report["results"]["latency_ms"]
+    print(f"{settings['mode']}: {r['requests']} requests in {r['elapsed_s']:.1f}s")
+    print(f"{'req/s':>8} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | {'errors':>7}")
+    print("-" * 50)
+    print(f"{r['throughput_rps']:>8.2f} | {lat['p50']:>8.1f} | {lat['p95']:>8.1f} | {lat['p99']:>8.1f} | {r['error_rate']:>7.2%}")
+    print(f"Report: {output}.json, {output}.md")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark kosztu logowania na ścieżce żądania: synchroniczne handlery (plik + konsola, jak wcześniej)
+vs kolejka z zapisem w wątku w tle (JSON lines), z próbkowaniem INFO i bez logowania.
+
+Uruchomienie:
+    python -m benchmarks.bench_logging --requests 5000 --sample-rate 0.1
+
+Jedno "żądanie" to linie logów z typowej ścieżki /ask (zapytanie, kontekst, wywołanie narzędzia
+z argumentami, wynik, odpowiedź) z zapytaniem ~1000 znaków. Konsola pisze do os.devnull, plik
+do katalogu tymczasowego. "drain ms" to czas opróżnienia kolejki po ostatnim żądaniu -
+praca, którą wątek w tle wykonał poza czasem żądań.
+"""
+import argparse
+import logging
+import os
+import queue
+import tempfile
+import time
+import uuid
+from logging.handlers import QueueListener
+
+from src.config import Config
+from src.utils import logger as log_module
+
+QUERY = "Jaki strój na wesele w Krakowie w październiku, gdy ma padać? " * 16
+TOOL_ARGS = {"city": "Kraków", "days": 3, "note": "x" * 500}
+
+
+def old_request(logger: logging.Logger):
+    # Logowanie sprzed kolejki: f-stringi z pełnym zapytaniem i argumentami
+    logger.info(f"Processing query (async): {QUERY}")
+    logger.info(f"Context for '{QUERY}': 3/8 chunks, 210 tokens (90 saved vs top-3; dropped: 0 too far, 2 duplicates, 0 over budget)")
+    logger.info(f"AI requested tool: get_weather with args: {TOOL_ARGS}")
+    logger.info(f"Executing tool: get_weather with args: {TOOL_ARGS}")
+    logger.info(f"Tool get_weather success.")
+
+
+def new_request(logger: logging.Logger):
+    logger.info("Processing query (async): %.200s", QUERY)
+    logger.info("Context for '%.200s': %d/%d chunks, %d tokens (%d saved vs top-%d; "
+                "dropped: %d too far, %d duplicates, %d over budget)", QUERY, 3, 8, 210, 90, 3, 0, 2, 0)
+    logger.info("AI requested tool: %s with args: %.200s", "get_weather", TOOL_ARGS)
+    logger.info("Executing tool: %s with args: %.200s", "get_weather", TOOL_ARGS)
+    logger.info("Tool %s success.", "get_weather")
+
+
+def sync_logger(name: str, log_dir: str, devnull) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    formatter = logging.Formatter(log_module.TEXT_FORMAT)
+    for handler in (logging.FileHandler(os.path.join(log_dir, f"{name}.log")), logging.StreamHandler(devnull)):
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+    return logger
+
+
+def queue_logger(name: str, log_dir: str, devnull, sample_rate: float):
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    file_handler = log_module.SizeAndTimeRotatingFileHandler(os.path.join(log_dir, f"{name}.log"))
+    file_handler.setFormatter(log_module.JsonFormatter())
+    console_handler = logging.StreamHandler(devnull)
+    console_handler.setFormatter(logging.Formatter(log_module.TEXT_FORMAT))
+    queue_handler = log_module.DroppingQueueHandler(queue.Queue(Config.LOG_QUEUE_SIZE))
+    queue_handler.addFilter(log_module.RequestContextFilter(sample_rate))
+    listener = QueueListener(queue_handler.queue, file_handler, console_handler)
+    listener.start()
+    logger.addHandler(queue_handler)
+    return logger, listener
+
+
+def run(logger: logging.Logger, request, requests: int) -> list:
+    latencies = []
+    for _ in range(requests):
+        token = log_module.set_request_id(uuid.uuid4().hex[:16])
+        start = time.perf_counter()
+        request(logger)
+        latencies.append(time.perf_counter() - start)
+        log_module.reset_request_id(token)
+    latencies.sort()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--sample-rate", type=float, default=0.1, help="LOG_INFO_SAMPLE_RATE dla wariantu z próbkowaniem")
+    args = parser.parse_args()
+    log_module.logger.setLevel(logging.ERROR)
+
+    print(f"requests={args.requests} lines/request=5 query={len(QUERY)} chars")
+    print(f"{'mode':>16} | {'p50 µs':>8} | {'p99 µs':>8} | {'mean µs':>8} | {'drain ms':>9} | {'file KB':>8}")
+    print("-" * 73)
+
+    with tempfile.TemporaryDirectory() as log_dir, open(os.devnull, "w") as devnull:
+        modes = {
+            "disabled": lambda: (logging.getLogger("bench_disabled"), None),
+            "sync (old)": lambda: (sync_logger("bench_sync", log_dir, devnull), None),
+            "queue json": lambda: queue_logger("bench_queue", log_dir, devnull, 1.0),
+            f"queue {args.sample_rate:g} sampled": lambda: queue_logger("bench_sampled", log_dir, devnull, args.sample_rate),
+        }
+        for label, make in modes.items():
+            logger, listener = make()
+            logger.setLevel(logging.WARNING if listener is None and not logger.handlers else logging.INFO)
+            request = old_request if label == "sync (old)" else new_request
+            latencies = run(logger, request, args.requests)
+
+            start = time.perf_counter()
+            if listener is not None:
+                listener.stop()
+            drain_ms = (time.perf_counter() - start) * 1000
+            for handler in logger.handlers + (list(listener.handlers) if listener else []):
+                handler.close()
+            log_file = os.path.join(log_dir, f"{logger.name}.log")
+            size_kb = os.path.getsize(log_file) / 1024 if os.path.exists(log_file) else 0.0
+
+            n = len(latencies)
+            print(f"{label:>16} | {latencies[n // 2] * 1e6:>8.1f} | {latencies[int(n * 0.99) - 1] * 1e6:>8.1f} | "
+                  f"{sum(latencies) / n * 1e6:>8.1f} | {drain_ms:>9.1f} | {size_kb:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
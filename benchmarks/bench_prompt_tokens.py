@@ -0,0 +1,130 @@
+"""
+Benchmark tokenów promptu wysyłanych do Gemini na jedno /ask, dla trzech układów promptu:
+
+    per_query      - poprzedni układ: kontekst RAG wklejony w środek instrukcji systemowej,
+                     config budowany od nowa przy każdym zapytaniu
+    static         - stałe instrukcje + narzędzia (budowane raz), kontekst RAG w wiadomości użytkownika
+    context_cache  - jak static, ale prefiks w jawnym context cache (GEMINI_CONTEXT_CACHE)
+
+Uruchomienie:
+    python -m benchmarks.bench_prompt_tokens --queries 50
+
+LLMEngine rozmawia z lokalnym FakeGenAIServer (benchmarks/fake_servers.py), który liczy tokeny
+w każdym zapytaniu oraz najdłuższy prefiks identyczny z wcześniejszymi zapytaniami
+(to, co provider może obsłużyć z cache prefiksów). Retrieval zwraca różne fragmenty
+bazy wiedzy dla kolejnych pytań, jak przy prawdziwym ruchu.
+"""
+import argparse
+import glob
+import logging
+import os
+import statistics
+
+import numpy as np
+
+import src.core.llm_engine as llm_module
+from benchmarks.fake_servers import FakeGenAIServer
+from src.config import Config
+from src.utils.logger import logger
+
+
+class RotatingRetriever:
+    """Zamiast FAISS: k kolejnych linii bazy wiedzy, przesunięte dla każdego pytania."""
+
+    def __init__(self):
+        lines = []
+        for path in sorted(glob.glob(os.path.join(Config.DATA_DIR, "knowledge_base", "*.txt"))):
+            with open(path, encoding="utf-8") as f:
+                lines.extend((line.strip(), os.path.basename(path)) for line in f if line.strip())
+        self.lines = lines or [("Len na upały", "fabrics_guide.txt")]
+        self.calls = 0
+
+    def search(self, query, k=3):
+        self.calls += 1
+        return [{"content": c, "source": s, "score": 0.0}
+                for c, s in (self.lines[(self.calls + i) % len(self.lines)] for i in range(k))]
+
+    async def asearch(self, query, k=3):
+        return self.search(query, k)
+
+    def encode_queries(self, queries):
+        return np.ones((len(queries), 8), dtype="float32")
+
+    def cached_query_vector(self, query):
+        return self.encode_queries([query])[0]
+
+    def chunk_vectors(self, results):
+        return None
+
+
+class PerQueryPromptEngine(llm_module.LLMEngine):
+    """Odtworzenie poprzedniego układu: kontekst RAG w instrukcji systemowej, config per zapytanie."""
+
+    def process_query(self, user_query):
+        self._rag_results = self.rag.search(user_query, k=Config.RAG_K_RETRIEVAL)
+        self.rag.search = lambda query, k=3: self._rag_results
+        try:
+            return super().process_query(user_query)
+        finally:
+            del self.rag.search
+
+    def _request_config(self):
+        context_str = "\n".join([f"- {r['content']}" for r in self._rag_results])
+        prompt = self.system_prompt.replace(
+            "Każda wiadomość użytkownika zaczyna się od sekcji",
+            f"WIEDZA Z BAZY (RAG Context):\n        {context_str}\n\n        Poniżej instrukcje, a po nich sekcja"
+        )
+        config = self._build_generate_config()
+        config.system_instruction = prompt
+        return config
+
+    def _build_user_message(self, user_query, context, summary=()):
+        return user_query
+
+
+def run(mode: str, queries: int, call_tools: bool) -> dict:
+    with FakeGenAIServer(call_tools=call_tools) as server:
+        Config.GEMINI_BASE_URL = server.base_url
+        Config.GEMINI_CONTEXT_CACHE = mode == "context_cache"
+        engine_class = PerQueryPromptEngine if mode == "per_query" else llm_module.LLMEngine
+        engine = engine_class()
+
+        for i in range(queries):
+            engine.process_query(f"Co ubrać na spacer, pytanie numer {i}?")
+
+        prompts = server.prompts
+        return {
+            "requests": len(prompts),
+            "sent": statistics.mean(p["sent_tokens"] for p in prompts),
+            "prompt": statistics.mean(p["prompt_tokens"] for p in prompts),
+            "cached": statistics.mean(p["cached_tokens"] for p in prompts),
+            "prefix": statistics.mean(p["prefix_tokens"] for p in prompts[1:]) if len(prompts) > 1 else 0.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--modes", default="per_query,static,context_cache")
+    parser.add_argument("--tools", action="store_true", help="Model wywołuje narzędzie pogodowe (2 tury na pytanie)")
+    args = parser.parse_args()
+    logger.setLevel(logging.ERROR)
+
+    Config.GOOGLE_API_KEY = Config.GOOGLE_API_KEY or "fake-key"
+    Config.ANSWER_CACHE_MAX_ENTRIES = 0  # każde pytanie ma dojść do modelu
+    llm_module.get_rag_engine = RotatingRetriever
+    if args.tools:
+        from benchmarks.bench_async_ask import install_slow_weather_tool
+        install_slow_weather_tool(0)
+
+    print(f"queries={args.queries} tools={args.tools} (średnio na zapytanie do modelu, przybliżone tokeny)")
+    print(f"{'mode':>14} | {'requests':>8} | {'sent':>6} | {'prompt':>6} | {'explicit cache':>14} | {'reusable prefix':>15}")
+    print("-" * 80)
+    for mode in args.modes.split(","):
+        r = run(mode, args.queries, args.tools)
+        reuse = f"{r['prefix']:.0f} ({r['prefix'] / r['prompt']:.0%})"
+        print(f"{mode:>14} | {r['requests']:>8} | {r['sent']:>6.0f} | {r['prompt']:>6.0f} | {r['cached']:>14.0f} | {reuse:>15}")
+
+
+if __name__ == "__main__":
+    main()
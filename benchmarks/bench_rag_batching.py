@@ -0,0 +1,128 @@
+"""
+Benchmark micro-batchingu zapytań w RagEngine.search.
+
+Uruchomienie:
+    python -m benchmarks.bench_rag_batching --clients 32 --queries 20 --windows 0,1,2,5,10
+
+Domyślnie używa syntetycznego modelu, który symuluje koszt forward-passa
+SentenceTransformera (stały narzut na wywołanie + koszt na zapytanie).
+Z flagą --real ładuje prawdziwy Config.EMBEDDING_MODEL.
+"""
+import argparse
+import logging
+import tempfile
+import threading
+import time
+import zlib
+
+import faiss
+import numpy as np
+
+from src.config import Config
+from src.core.rag_engine import RagEngine
+from src.utils.logger import logger
+
+
+class SyntheticModel:
+    """
+    Udaje SentenceTransformer: stały narzut na encode() + koszt liniowy od rozmiaru batcha.
+    Forward-pass na CPU zajmuje wszystkie rdzenie, więc wywołania są serializowane.
+    """
+
+    def __init__(self, dimension: int = 384, call_overhead_ms: float = 8.0, per_item_ms: float = 0.5):
+        self.dimension = dimension
+        self.call_overhead = call_overhead_ms / 1000.0
+        self.per_item = per_item_ms / 1000.0
+        self._cpu = threading.Lock()
+
+    def encode(self, sentences):
+        with self._cpu:
+            time.sleep(self.call_overhead + self.per_item * len(sentences))
+        vectors = []
+        for sentence in sentences:
+            rng = np.random.default_rng(zlib.crc32(sentence.encode("utf-8")))
+            vectors.append(rng.standard_normal(self.dimension))
+        return np.asarray(vectors, dtype="float32")
+
+
+def build_engine(model, window_ms: float, max_batch_size: int, corpus_size: int) -> RagEngine:
+    Config.RAG_BATCH_WINDOW_MS = window_ms
+    Config.RAG_MAX_BATCH_SIZE = max_batch_size
+
+    with tempfile.TemporaryDirectory() as empty_store:
+        engine = RagEngine(model=model, vector_store_path=empty_store)
+
+    rng = np.random.default_rng(0)
+    dimension = engine.dimension
+    engine.index = faiss.IndexFlatL2(dimension)
+    engine.index.add(rng.standard_normal((corpus_size, dimension)).astype("float32"))
+    engine.documents = [{"content": f"chunk {i}", "source": "synthetic.txt"} for i in range(corpus_size)]
+    return engine
+
+
+def run_load(engine: RagEngine, clients: int, queries_per_client: int) -> dict:
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients)
+
+    def client(client_id: int):
+        barrier.wait()
+        local = []
+        for i in range(queries_per_client):
+            start = time.perf_counter()
+            engine.search(f"client {client_id} query {i}", k=Config.RAG_K_RETRIEVAL)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    total = clients * queries_per_client
+    return {
+        "qps": total / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--queries", type=int, default=20, help="Zapytań na klienta")
+    parser.add_argument("--windows", default="0,1,2,5,10", help="Okna batchowania w ms (0 = bez batchowania)")
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--corpus-size", type=int, default=10_000)
+    parser.add_argument("--real", action="store_true", help="Użyj prawdziwego modelu embeddingów")
+    args = parser.parse_args()
+    logger.setLevel(logging.ERROR)
+
+    if args.real:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(Config.EMBEDDING_MODEL)
+    else:
+        model = SyntheticModel()
+
+    print(f"clients={args.clients} queries/client={args.queries} corpus={args.corpus_size} "
+          f"max_batch={args.max_batch_size} model={'real' if args.real else 'synthetic'}")
+    print(f"{'window_ms':>10} | {'QPS':>9} | {'p50 ms':>8} | {'p95 ms':>8} | {'avg batch':>9}")
+    print("-" * 56)
+
+    for window in [float(w) for w in args.windows.split(",")]:
+        engine = build_engine(model, window, args.max_batch_size, args.corpus_size)
+        result = run_load(engine, args.clients, args.queries)
+        avg_batch = engine.batcher.stats()["avg_batch_size"] if engine.batcher else 1.0
+        print(f"{window:>10.1f} | {result['qps']:>9.1f} | {result['p50_ms']:>8.2f} | "
+              f"{result['p95_ms']:>8.2f} | {avg_batch:>9.2f}")
+        if engine.batcher:
+            engine.batcher.close()
+
+
+if __name__ == "__main__":
+    main()
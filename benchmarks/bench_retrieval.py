@@ -0,0 +1,405 @@
+"""
+Benchmark ścieżki retrieval (RagEngine) na syntetycznych korpusach: czas ładowania generacji,
+latencja pojedynczych zapytań (vector / lexical / hybrid), latencja batchy (search_batch) i pamięć.
+
+Uruchomienie:
+    python -m benchmarks.bench_retrieval --sizes 1000,10000,100000
+    python -m benchmarks.bench_retrieval --sizes 1000000 --types flat,ivf --corpus-dir /data/bench-corpora
+    python -m benchmarks.bench_retrieval --sizes 10000 --compare benchmarks/results/retrieval_20260101-120000.json
+
+Korpus: fragmenty po 8-24 słów z syntetycznego słownika (rozkład Zipfa, 256 tematów), zapisane jako
+normalna generacja indeksu (FAISS + magazyn dokumentów + BM25, data_ingestion.write_generation),
+strumieniowo blokami - 1M fragmentów nie trzyma wszystkich wektorów w pamięci naraz.
+Embeddingi liczy HashEmbedder: suma stałych losowych wektorów słów (seed z crc32 słowa), bez pobierania
+modelu - koszt "encode" jest więc dużo mniejszy niż SentenceTransformera, reszta ścieżki jest prawdziwa.
+Zapytania to 3-5 słów wylosowanych z fragmentu korpusu (hit@k = fragment źródłowy w top-k).
+
+Wynik trafia do benchmarks/results/retrieval_<data>.json (z commitem i parametrami); --compare
+wypisuje zmianę każdej metryki względem wcześniejszego pliku. --corpus-dir zachowuje korpusy między
+uruchomieniami (budowa to ok. minuty na 100k fragmentów, więc 1M - kilkanaście minut).
+"""
+import argparse
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import Config
+from src.core import lexical, vector_index
+from src.core.generations import current_generation, generation_path
+from src.core.rag_engine import HYBRID, LEXICAL, VECTOR, RagEngine
+from src.utils.logger import logger
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+VOCABULARY_SIZE = 20_000
+TOPICS = 256
+TOPIC_WORDS = 200
+BLOCK = 50_000
+SYLLABLES = ("ba be bi bo bu da de di do du fa fe fi fo ga ge go ka ke ki ko ku la le li lo lu ma me mi mo mu "
+             "na ne ni no nu pa pe pi po pu ra re ri ro ru sa se si so su ta te ti to tu wa we wi wo za ze zo").split()
+ENDINGS = "bcdfgklnprstz"
+
+
+def vocabulary(size: int = VOCABULARY_SIZE) -> List[str]:
+    """Deterministyczne pseudo-słowa, które tokenizer BM25 zostawia bez zmian (tokenize(w) == [w])."""
+    words, seen = [], set()
+    for i in range(size * 4):
+        n = i
+        word = SYLLABLES[n % len(SYLLABLES)] + SYLLABLES[n // len(SYLLABLES) % len(SYLLABLES)]
+        n //= len(SYLLABLES) ** 2
+        # Dwie spółgłoski na końcu - bez końcówek fleksyjnych; 6 znaków = bez obcinania przez stemmer
+        word += ENDINGS[n % len(ENDINGS)] + ENDINGS[n // len(ENDINGS) % len(ENDINGS)]
+        if word not in seen and lexical.tokenize(word) == [word]:
+            seen.add(word)
+            words.append(word)
+            if len(words) == size:
+                return words
+    raise ValueError(f"Could not build a vocabulary of {size} words")
+
+
+class HashEmbedder:
+    """
+    Deterministyczny embedder bez modelu: wektor tekstu = znormalizowana suma wektorów jego tokenów BM25,
+    wektor tokenu losowany z seedem crc32(token). Podobne słownictwo = bliskie wektory.
+    """
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self._vectors: Dict[str, np.ndarray] = {}
+
+    def token_vector(self, token: str) -> np.ndarray:
+        vector = self._vectors.get(token)
+        if vector is None:
+            vector = np.random.default_rng(zlib.crc32(token.encode("utf-8"))).standard_normal(self.dimension)
+            vector = self._vectors.setdefault(token, vector.astype("float32"))
+        return vector
+
+    def token_matrix(self, tokens: List[str]) -> np.ndarray:
+        return np.vstack([self.token_vector(t) for t in tokens])
+
+    def encode(self, sentences) -> np.ndarray:
+        vectors = np.zeros((len(sentences), self.dimension), dtype="float32")
+        for row, sentence in enumerate(sentences):
+            for token in lexical.tokenize(sentence):
+                vectors[row] += self.token_vector(token)
+        return _normalize(vectors)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+class SyntheticCorpus:
+    """Fragmenty generowane blokami z seedem (seed, blok) - te same przy każdym przejściu."""
+
+    def __init__(self, size: int, embedder: HashEmbedder, seed: int = 0):
+        self.size = size
+        self.embedder = embedder
+        self.seed = seed
+        self.words = np.asarray(vocabulary())
+        self.word_vectors = embedder.token_matrix(list(self.words))
+        rng = np.random.default_rng(seed)
+        self.topics = rng.integers(0, len(self.words), (TOPICS, TOPIC_WORDS))
+        ranks = np.arange(1, len(self.words) + 1, dtype="float64")
+        self.zipf = (1.0 / ranks) / (1.0 / ranks).sum()
+
+    def block(self, start: int) -> Tuple[List[np.ndarray], np.ndarray]:
+        """(ID słów każdego fragmentu, wektory) dla fragmentów start..start+BLOCK."""
+        count = min(BLOCK, self.size - start)
+        rng = np.random.default_rng((self.seed, start))
+        lengths = rng.integers(8, 25, count)
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        total = int(lengths.sum())
+        # 70% słów z tematu fragmentu, reszta z całego słownika (Zipf)
+        topics = np.repeat(rng.integers(0, TOPICS, count), lengths)
+        ids = np.where(rng.random(total) < 0.7, self.topics[topics, rng.integers(0, TOPIC_WORDS, total)],
+                       rng.choice(len(self.words), total, p=self.zipf))
+
+        vectors = np.empty((count, self.embedder.dimension), dtype="float32")
+        for s in range(0, count, 2000):  # sumy wektorów słów kawałkami - ograniczona pamięć pośrednia
+            e = min(s + 2000, count)
+            lo, hi = offsets[s], offsets[e - 1] + lengths[e - 1]
+            vectors[s:e] = np.add.reduceat(self.word_vectors[ids[lo:hi]], offsets[s:e] - lo, axis=0)
+        return np.split(ids, offsets[1:]), _normalize(vectors)
+
+    def blocks(self) -> Iterator[Tuple[int, List[np.ndarray], np.ndarray]]:
+        for start in range(0, self.size, BLOCK):
+            docs, vectors = self.block(start)
+            yield start, docs, vectors
+
+    def text(self, ids: np.ndarray) -> str:
+        return " ".join(self.words[ids])
+
+    def doc_rows(self) -> Iterator[Tuple[int, str, str]]:
+        for start, docs, _ in self.blocks():
+            for offset, ids in enumerate(docs):
+                yield start + offset, self.text(ids), f"synthetic_{(start + offset) % 100:02d}.txt"
+
+    def queries(self, count: int, seed: int = 1) -> List[Tuple[int, str]]:
+        """(ID fragmentu źródłowego, zapytanie z 3-5 jego słów) - bez powtórzeń."""
+        rng = np.random.default_rng(seed)
+        doc_ids = rng.integers(0, self.size, count * 2)
+        docs = {}
+        for start in sorted({int(i) - int(i) % BLOCK for i in doc_ids}):
+            block_docs = self.block(start)[0]
+            docs.update({int(i): block_docs[int(i) - start] for i in doc_ids if int(i) - int(i) % BLOCK == start})
+
+        queries, seen = [], set()
+        for doc_id in doc_ids:
+            ids = docs[int(doc_id)]
+            query = self.text(rng.choice(ids, min(int(rng.integers(3, 6)), len(ids)), replace=False))
+            if query not in seen:
+                seen.add(query)
+                queries.append((int(doc_id), query))
+                if len(queries) == count:
+                    break
+        return queries
+
+
+def build_store(store_path: str, corpus: SyntheticCorpus, index_type: str) -> Dict:
+    """Zapisuje korpus jako generację indeksu (jak data_ingestion); istniejącą generację używa ponownie."""
+    if current_generation(store_path):
+        return {"build_s": None, "reused": True}
+
+    from src.data_ingestion import write_generation  # ciężki import (sentence-transformers) tylko przy budowie
+    start = time.perf_counter()
+    index, built_type = vector_index.create_index(index_type, corpus.embedder.dimension, corpus.size)
+    if vector_index.requires_training(built_type):
+        sample, rows = [], 0
+        for _, _, vectors in corpus.blocks():
+            sample.append(vectors)
+            rows += len(vectors)
+            if rows >= vector_index.MAX_TRAINING_POINTS:
+                break
+        vector_index.train_index(index, np.vstack(sample))
+        del sample
+    for block_start, _, vectors in corpus.blocks():
+        index.add_with_ids(vectors, np.arange(block_start, block_start + len(vectors), dtype="int64"))
+
+    manifest = {"version": 1, "embedding_model": "hash-embedder", "index_type": built_type,
+                "dimension": corpus.embedder.dimension, "chunks": {}, "files": {}, "next_id": corpus.size}
+    write_generation(store_path, index, corpus.doc_rows(), manifest)
+    return {"build_s": time.perf_counter() - start, "reused": False}
+
+
+def rss_mb() -> float:
+    """Bieżące RSS procesu (Linux: /proc/self/statm), inaczej szczytowe z getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def directory_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names) / 2 ** 20
+
+
+def latency_stats(latencies_s: List[float]) -> Dict:
+    values = sorted(latencies_s)
+    pick = lambda p: values[min(int(p / 100 * len(values)), len(values) - 1)] * 1000
+    return {"p50_ms": pick(50), "p95_ms": pick(95), "p99_ms": pick(99),
+            "mean_ms": sum(values) / len(values) * 1000, "qps": len(values) / sum(values)}
+
+
+def _clear_caches(engine: RagEngine):
+    engine.embedding_cache.clear()
+    engine.results_cache.clear()
+
+
+def measure(store_path: str, queries: List[Tuple[int, str]], options: Dict) -> Dict:
+    """
+    Ładowanie i wyszukiwanie na gotowej generacji. Uruchamiane w świeżym procesie (spawn), więc RSS
+    i czas ładowania nie zależą od budowy korpusu ani od poprzednich rozmiarów.
+    """
+    logger.setLevel(logging.ERROR)
+    # Sama ścieżka wyszukiwania: bez micro-batchingu i bez wątku przeładowań
+    Config.RAG_BATCH_WINDOW_MS = 0
+    Config.RAG_RELOAD_POLL_SECONDS = 0
+    k, modes, batch_sizes, n_single = options["k"], options["modes"], options["batch_sizes"], options["queries"]
+    embedder = HashEmbedder(options["dimension"])
+
+    rss_base = rss_mb()
+    start = time.perf_counter()
+    engine = RagEngine(model=embedder, vector_store_path=store_path)
+    load_ms = (time.perf_counter() - start) * 1000
+    try:
+        engine.warm_up()
+        result = {
+            "index_type": vector_index.index_type_of(engine.index),
+            "load_ms": load_ms,
+            "store_load_ms": engine.index_status()["last_load_ms"],
+            "rss_base_mb": rss_base,
+            "rss_load_mb": rss_mb() - rss_base,
+            "single": {},
+            "batch": {},
+        }
+
+        # Pojedyncze zapytania, każde pierwszy raz (pusty cache) - jak nowe pytanie w /ask
+        single = queries[:n_single]
+        for mode in modes:
+            _clear_caches(engine)
+            latencies, hits = [], 0
+            for doc_id, query in single:
+                t = time.perf_counter()
+                found = engine.search(query, k=k, mode=mode)
+                latencies.append(time.perf_counter() - t)
+                hits += any(r["id"] == doc_id for r in found)
+            result["single"][mode] = {**latency_stats(latencies), "hit_at_k": hits / len(single)}
+
+        # Batche: jedno encode + jedno przeszukanie FAISS na batch (np. /ask/batch)
+        texts = [q for _, q in queries]
+        for batch_size in batch_sizes:
+            _clear_caches(engine)
+            batches = [texts[i:i + batch_size] for i in range(0, len(texts) - batch_size + 1, batch_size)]
+            latencies = []
+            for batch in batches[:max(n_single // batch_size, 4)]:
+                t = time.perf_counter()
+                engine.search_batch(batch, k=k, mode=VECTOR)
+                latencies.append(time.perf_counter() - t)
+            stats = latency_stats(latencies)
+            result["batch"][str(batch_size)] = {**stats, "per_query_ms": stats["mean_ms"] / batch_size,
+                                               "qps": stats["qps"] * batch_size}
+
+        # Po wyszukiwaniu: doszły strony mmap magazynu dokumentów i BM25, których dotknęły zapytania
+        result["rss_search_mb"] = rss_mb() - rss_base
+        result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return result
+    finally:
+        engine.close()
+
+
+def run_size(size: int, index_type: str, args, corpus_dir: str) -> Dict:
+    corpus = SyntheticCorpus(size, HashEmbedder(args.dimension), seed=args.seed)
+    store_path = os.path.join(corpus_dir, f"{size}_{index_type}_{args.dimension}d_seed{args.seed}")
+    build = build_store(store_path, corpus, index_type)
+    queries = corpus.queries(args.queries + max(args.batch_sizes) * 4, seed=args.seed + 1)
+    del corpus
+
+    options = {"k": args.k, "modes": args.modes, "batch_sizes": args.batch_sizes,
+               "queries": args.queries, "dimension": args.dimension}
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        measured = pool.submit(measure, store_path, queries, options).result()
+
+    path = generation_path(store_path)
+    return {
+        "size": size,
+        "index_type": measured.pop("index_type"),
+        "build_s": build["build_s"],
+        "disk_mb": directory_mb(path),
+        "index_file_mb": os.path.getsize(os.path.join(path, "index.faiss")) / 2 ** 20,
+        **measured,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(result: Dict, prefix: str = "") -> Dict[str, float]:
+    """Metryki liczbowe jako płaskie klucze ("single.hybrid.p95_ms") - do porównań między uruchomieniami."""
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = float(value)
+    return flat
+
+
+def compare(current: List[Dict], previous_path: str):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = {(r["size"], r["index_type"]): r for r in json.load(f)["results"]}
+    print(f"\nvs {previous_path}:")
+    print(f"{'size':>8} | {'type':>6} | {'metric':<24} | {'before':>10} | {'now':>10} | {'change':>8}")
+    print("-" * 80)
+    for result in current:
+        before = previous.get((result["size"], result["index_type"]))
+        if before is None:
+            continue
+        old = flatten(before)
+        for key, value in flatten(result).items():
+            if key in ("size", "build_s") or key not in old:
+                continue
+            change = f"{(value - old[key]) / old[key]:+.1%}" if old[key] else "n/a"
+            print(f"{result['size']:>8} | {result['index_type']:>6} | {key:<24} | {old[key]:>10.3f} | {value:>10.3f} | {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Liczby fragmentów korpusu (do 1000000)")
+    parser.add_argument("--types", default=Config.RAG_INDEX_TYPE, help="Typy indeksu (flat,ivf,hnsw,sq,ivfpq)")
+    parser.add_argument("--modes", default=f"{VECTOR},{LEXICAL},{HYBRID}")
+    parser.add_argument("--batch-sizes", default="8,32")
+    parser.add_argument("--queries", type=int, default=200, help="Zapytań pojedynczych na tryb")
+    parser.add_argument("--k", type=int, default=Config.RAG_K_RETRIEVAL)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", help="Katalog na korpusy do ponownego użycia (domyślnie tymczasowy)")
+    parser.add_argument("--output", help="Plik JSON z wynikami (domyślnie benchmarks/results/retrieval_<data>.json)")
+    parser.add_argument("--compare", help="Wcześniejszy plik JSON z wynikami do porównania")
+    args = parser.parse_args()
+    args.modes = args.modes.split(",")
+    args.batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    logger.setLevel(logging.ERROR)
+
+    corpus_dir = args.corpus_dir or tempfile.mkdtemp(prefix="bench-retrieval-")
+    results = []
+    print(f"dim={args.dimension} k={args.k} queries={args.queries} modes={','.join(args.modes)}")
+    print(f"{'size':>8} | {'type':>6} | {'load ms':>8} | {'+RSS MB':>7} | {'disk MB':>8} | "
+          + " | ".join(f"{m + ' p50/p99 ms':>20}" for m in args.modes)
+          + " | " + " | ".join(f"{'batch' + str(b) + ' ms/q':>12}" for b in args.batch_sizes))
+    try:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            for index_type in args.types.split(","):
+                r = run_size(size, index_type, args, corpus_dir)
+                results.append(r)
+                print(f"{size:>8} | {r['index_type']:>6} | {r['load_ms']:>8.1f} | {r['rss_load_mb']:>7.1f} | "
+                      f"{r['disk_mb']:>8.1f} | "
+                      + " | ".join(f"{r['single'][m]['p50_ms']:>9.3f}/{r['single'][m]['p99_ms']:<10.3f}" for m in args.modes)
+                      + " | " + " | ".join(f"{r['batch'][str(b)]['per_query_ms']:>12.3f}" for b in args.batch_sizes))
+    finally:
+        if not args.corpus_dir:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    now = datetime.datetime.now()
+    report = {
+        "date": now.strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": git_commit(),
+        "host": {"python": platform.python_version(), "cpus": os.cpu_count(), "machine": platform.machine()},
+        "settings": {"dimension": args.dimension, "k": args.k, "queries": args.queries, "seed": args.seed,
+                     "modes": args.modes, "batch_sizes": args.batch_sizes,
+                     "nprobe": Config.RAG_NPROBE, "hnsw_ef_search": Config.RAG_HNSW_EF_SEARCH},
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"retrieval_{now.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Results: {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
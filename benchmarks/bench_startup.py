@@ -0,0 +1,146 @@
+"""
+Benchmark startu procesu API: rozbicie na importy, ładowanie modelu, ładowanie indeksu i rozgrzewkę
+oraz czas do pierwszej odpowiedzi /health i do gotowości /ready przy prawdziwym uvicornie.
+
+Uruchomienie:
+    python -m benchmarks.bench_startup --runs 3
+    python -m benchmarks.bench_startup --synthetic-model   # bez pobierania modelu (np. offline)
+
+Każdy pomiar to świeży proces Pythona (zimne importy, ciepły page cache po pierwszym przebiegu).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+
+from benchmarks.bench_stream_ttfb import free_port
+
+# Kod mierzony w osobnym procesie - każda faza osobno, w kolejności startu serwera
+_BREAKDOWN = r"""
+import json, sys, time
+result = {}
+
+def phase(name, fn):
+    start = time.perf_counter()
+    try:
+        value = fn()
+    except Exception as e:
+        result[name] = None
+        result["error"] = f"{name}: {e}"
+        print(json.dumps(result)); sys.exit(0)
+    result[name] = time.perf_counter() - start
+    return value
+
+phase("import_api", lambda: __import__("src.main_api"))
+phase("import_faiss", lambda: __import__("faiss"))
+phase("import_sentence_transformers", lambda: __import__("sentence_transformers"))
+phase("import_genai", lambda: __import__("google.genai"))
+
+from src.core import rag_engine
+if SYNTHETIC:
+    from benchmarks.bench_rag_batching import SyntheticModel
+    rag_engine.load_embedding_model = lambda: SyntheticModel(call_overhead_ms=0, per_item_ms=0)
+model = phase("model_load", rag_engine.load_embedding_model)
+rag = phase("index_load", lambda: rag_engine.RagEngine(model=model))
+phase("warmup", rag.warm_up)
+rag.close()
+print(json.dumps(result))
+"""
+
+_SERVE = r"""
+import sys, uvicorn
+if SYNTHETIC:
+    from src.core import rag_engine
+    from benchmarks.bench_rag_batching import SyntheticModel
+    rag_engine.load_embedding_model = lambda: SyntheticModel(call_overhead_ms=0, per_item_ms=0)
+from src.main_api import app
+uvicorn.run(app, host="127.0.0.1", port=PORT, log_level="warning")
+"""
+
+
+def _child_env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+    env.setdefault("RAG_RELOAD_POLL_SECONDS", "0")
+    return env
+
+
+def measure_breakdown(synthetic: bool) -> dict:
+    code = f"SYNTHETIC = {synthetic!r}\n" + _BREAKDOWN
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=_child_env())
+    lines = [line for line in output.stdout.splitlines() if line.startswith("{")]
+    if not lines:
+        raise RuntimeError(output.stderr[-2000:])
+    return json.loads(lines[-1])
+
+
+def measure_server(synthetic: bool, timeout: float) -> dict:
+    """Czas od uruchomienia procesu do pierwszego 200 z /health i do 200 z /ready."""
+    port = free_port()
+    code = f"SYNTHETIC = {synthetic!r}\nPORT = {port}\n" + _SERVE
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", code], env=_child_env(),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {"first_health": None, "ready": None, "ready_components": None}
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                if result["first_health"] is None:
+                    if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).ok:
+                        result["first_health"] = time.perf_counter() - start
+                response = requests.get(f"http://127.0.0.1:{port}/ready", timeout=1)
+                components = response.json()["components"]
+                if response.ok or any(c["state"] == "failed" for c in components.values()):
+                    result["ready"] = time.perf_counter() - start if response.ok else None
+                    result["ready_components"] = components
+                    break
+            except requests.ConnectionError:
+                pass
+            time.sleep(0.02)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return result
+
+
+def _fmt(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return "failed"
+    return f"{statistics.median(values) * 1000:8.0f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--synthetic-model", action="store_true", help="Syntetyczny model zamiast SentenceTransformera")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    breakdowns = [measure_breakdown(args.synthetic_model) for _ in range(args.runs)]
+    phases = ["import_api", "import_faiss", "import_sentence_transformers", "import_genai",
+              "model_load", "index_load", "warmup"]
+    print(f"Startup breakdown (median of {args.runs} fresh processes):")
+    for name in phases:
+        print(f"  {name:<30} {_fmt([b.get(name) for b in breakdowns])}")
+    errors = {b["error"] for b in breakdowns if "error" in b}
+    for error in errors:
+        print(f"  error: {error}")
+
+    servers = [measure_server(args.synthetic_model, args.timeout) for _ in range(args.runs)]
+    print("\nServer (uvicorn):")
+    print(f"  {'first /health 200':<30} {_fmt([s['first_health'] for s in servers])}")
+    print(f"  {'/ready 200':<30} {_fmt([s['ready'] for s in servers])}")
+    last = servers[-1]["ready_components"] or {}
+    for name, component in last.items():
+        duration = f"{component['duration_ms']:.0f} ms" if component["duration_ms"] is not None else "-"
+        print(f"    {name:<28} {component['state']:<8} {duration}" + (f"  ({component['error']})" if component["error"] else ""))
+
+
+if __name__ == "__main__":
+    main()
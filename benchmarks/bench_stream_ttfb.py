@@ -0,0 +1,94 @@
+"""
+Benchmark czasu do pierwszego bajtu (TTFB): /ask vs /ask/stream (SSE).
+
+Uruchomienie:
+    python -m benchmarks.bench_stream_ttfb --requests 10 --tool-latency-ms 300
+
+Serwer uvicorn startuje lokalnie w wątku (ASGITransport z httpx buforuje całą odpowiedź,
+więc nie nadaje się do mierzenia strumienia). Silnik to LocalLLMStub z syntetycznym
+modelem embeddingów i narzędziem pogodowym spowolnionym do zadanej latencji.
+"""
+import argparse
+import logging
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+
+import src.core.rag_engine as rag_module
+import src.main_api as main_api
+from benchmarks.bench_async_ask import install_slow_weather_tool
+from benchmarks.bench_rag_batching import SyntheticModel
+from src.core.llm_engine import LocalLLMStub
+from src.core.rag_engine import RagEngine
+from src.utils.logger import logger
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(main_api.app, host="127.0.0.1", port=port, log_level="error"))
+    # Silnik ustawiamy ręcznie - startup_event nie może go nadpisać
+    main_api.app.router.on_startup.clear()
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def measure(client: httpx.Client, path: str, query: str) -> dict:
+    start = time.perf_counter()
+    first_byte = first_token = None
+    with client.stream("POST", path, json={"query": query}) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            now = time.perf_counter()
+            if first_byte is None:
+                first_byte = now
+            if first_token is None and (line.startswith("event: token") or line.startswith('{"query"')):
+                first_token = now
+    end = time.perf_counter()
+    return {
+        "ttfb_ms": (first_byte - start) * 1000,
+        "first_token_ms": ((first_token or end) - start) * 1000,
+        "total_ms": (end - start) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--tool-latency-ms", type=float, default=300)
+    args = parser.parse_args()
+    logger.setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as empty_store:
+        rag_module.rag_engine = RagEngine(model=SyntheticModel(), vector_store_path=empty_store)
+    install_slow_weather_tool(args.tool_latency_ms / 1000.0)
+    main_api.llm_engine = LocalLLMStub()
+
+    port = free_port()
+    server = start_server(port)
+
+    print(f"requests={args.requests} tool_latency={args.tool_latency_ms:.0f}ms (median)")
+    print(f"{'endpoint':>12} | {'TTFB ms':>8} | {'first token ms':>14} | {'total ms':>8}")
+    print("-" * 52)
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+        for path in ("/ask", "/ask/stream"):
+            runs = [measure(client, path, f"Co ubrać w Krakowie? #{i}") for i in range(args.requests)]
+            median = {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+            print(f"{path:>12} | {median['ttfb_ms']:>8.1f} | {median['first_token_ms']:>14.1f} | {median['total_ms']:>8.1f}")
+
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
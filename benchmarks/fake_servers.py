@@ -0,0 +1,287 @@
+"""
+Lokalne atrapy zewnętrznych API do testów i benchmarków (bez dostępu do internetu).
+
+FakeOpenMeteoServer obsługuje:
+    GET /v1/search    - geokodowanie (jak geocoding-api.open-meteo.com)
+    GET /v1/forecast  - bieżąca pogoda, także dla list współrzędnych "lat1,lat2"
+
+FakeGenAIServer (Gemini API, google-genai z http_options.base_url / Config.GEMINI_BASE_URL) obsługuje:
+    POST /{wersja}/models/{model}:generateContent - odpowiedź tekstowa albo wywołanie narzędzia
+    POST /{wersja}/cachedContents                 - jawny context cache (uchwyt do cached_content)
+
+Opóźnienie obu atrap: latency_ms + losowo 0..jitter_ms (deterministyczny seed).
+"""
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_CITIES: Dict[str, Tuple[float, float]] = {
+    "warszawa": (52.22977, 21.01178),
+    "warsaw": (52.22977, 21.01178),
+    "kraków": (50.06143, 19.93658),
+    "zakopane": (49.29899, 19.94885),
+    "gdańsk": (54.35205, 18.64637),
+    "toruń": (53.01375, 18.59814),
+    "bydgoszcz": (53.1235, 18.00762),
+}
+
+
+class _FakeServer:
+    """Wspólna obsługa: serwer HTTP/1.1 (keep-alive) w wątku tła, liczniki i sztuczne opóźnienie."""
+
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 0):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.requests: Dict[str, int] = {}
+        self.client_ports = set()
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        fake = self
+
+        class Handler(self.handler_class):
+            protocol_version = "HTTP/1.1"
+            server_fake = fake
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def record(self, path: str, client_address):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.client_ports.add(client_address[1])
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+    def draw(self) -> float:
+        """Liczba z [0, 1) z generatora atrapy (wspólny seed z opóźnieniami)."""
+        with self._lock:
+            return self._rng.random()
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    def send_json(self, payload, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _OpenMeteoHandler(_JsonHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        fake = self.server_fake
+        fake.record(url.path, self.client_address)
+
+        if url.path == "/v1/search":
+            coords = fake.cities.get(params.get("name", "").casefold())
+            if coords is None:
+                return self.send_json({"generationtime_ms": 0.1})
+            return self.send_json({"results": [{
+                "name": params["name"], "latitude": coords[0], "longitude": coords[1]
+            }]})
+
+        if url.path == "/v1/forecast":
+            latitudes = [float(x) for x in params["latitude"].split(",")]
+            longitudes = [float(x) for x in params["longitude"].split(",")]
+            items = [fake.current_for(lat, lon) for lat, lon in zip(latitudes, longitudes)]
+            return self.send_json(items[0] if len(items) == 1 else items)
+
+        self.send_json({"error": True, "reason": "not found"}, status=404)
+
+
+class FakeOpenMeteoServer(_FakeServer):
+    """Atrapa Open-Meteo. Pogoda jest deterministyczna: zależy tylko od współrzędnych."""
+
+    handler_class = _OpenMeteoHandler
+
+    def __init__(self, latency_ms: float = 0.0, cities: Optional[Dict[str, Tuple[float, float]]] = None,
+                 jitter_ms: float = 0.0, seed: int = 0):
+        super().__init__(latency_ms, jitter_ms, seed)
+        self.cities = dict(cities or DEFAULT_CITIES)
+
+    @property
+    def geocoding_url(self) -> str:
+        return f"{self.base_url}/v1/search"
+
+    @property
+    def forecast_url(self) -> str:
+        return f"{self.base_url}/v1/forecast"
+
+    @staticmethod
+    def current_for(latitude: float, longitude: float) -> Dict:
+        # Im dalej na północ, tym zimniej - wystarczy, żeby miasta się różniły
+        temperature = round(40.0 - 0.6 * latitude + 0.1 * longitude, 1)
+        return {
+            "latitude": latitude,
+            "longitude": longitude,
+            "current": {
+                "temperature_2m": temperature,
+                "rain": 0.4 if int(latitude) % 2 else 0.0,
+                "snowfall": 0.0,
+                "wind_speed_10m": round(abs(longitude) % 20, 1)
+            }
+        }
+
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def _common_prefix(a: List[str], b: List[str]) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+class _GenAIHandler(_JsonHandler):
+    def do_POST(self):
+        path = urlparse(self.path).path
+        fake = self.server_fake
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+        if path.endswith("/cachedContents"):
+            fake.record("cachedContents", self.client_address)
+            return self.send_json(fake.create_cache(body))
+        if path.endswith(":generateContent"):
+            fake.record("generateContent", self.client_address)
+            if fake.error_rate and fake.draw() < fake.error_rate:
+                fake.record("errors", self.client_address)
+                return self.send_json({"error": {"code": 503, "message": "Fake overload", "status": "UNAVAILABLE"}},
+                                      status=503)
+            return self.send_json(fake.generate(body))
+        self.send_json({"error": {"code": 404, "message": f"Unknown path {path}"}}, status=404)
+
+
+class FakeGenAIServer(_FakeServer):
+    """
+    Atrapa Gemini API, która liczy tokeny promptu w każdym zapytaniu.
+
+    Dla każdego generateContent zapisuje (w self.prompts):
+    - sent_tokens: tokeny faktycznie wysłane w treści zapytania,
+    - prompt_tokens: tokeny całego promptu (łącznie z jawnym cache),
+    - cached_tokens: tokeny z jawnego context cache (cachedContent),
+    - prefix_tokens: najdłuższy prefiks promptu identyczny z jednym z wcześniejszych zapytań
+      (to, co provider może wziąć z niejawnego cache prefiksów).
+
+    script: wywołania narzędzi kolejnych tur zapytania - script[i] to lista {"name", "args"}
+    zwracanych razem w turze i (kilka = równoległe wywołania); po ostatniej turze skryptu odpowiedź tekstowa.
+    call_tools=True to skrót dla [[get_current_weather(tool_city)]].
+    error_rate: część generateContent kończona błędem 503 (jak przeciążone API).
+    """
+
+    handler_class = _GenAIHandler
+    HISTORY = 32
+
+    def __init__(self, latency_ms: float = 0.0, call_tools: bool = False, tool_city: str = "Kraków",
+                 script: Optional[List[List[Dict]]] = None, error_rate: float = 0.0,
+                 jitter_ms: float = 0.0, seed: int = 0):
+        super().__init__(latency_ms, jitter_ms, seed)
+        if script is None and call_tools:
+            script = [[{"name": "get_current_weather", "args": {"city": tool_city}}]]
+        self.script = script or []
+        self.error_rate = error_rate
+        self.prompts: List[Dict] = []
+        self._caches: Dict[str, List[str]] = {}
+        self._recent: List[List[str]] = []
+        self._ids = itertools.count(1)
+
+    @staticmethod
+    def _tokens(*parts) -> List[str]:
+        """Przybliżone tokeny (słowa i znaki interpunkcyjne) - stała miara do porównań."""
+        tokens = []
+        for part in parts:
+            if part:
+                tokens.extend(_TOKEN.findall(part if isinstance(part, str) else json.dumps(part, sort_keys=True)))
+        return tokens
+
+    @staticmethod
+    def _turn(contents: List[Dict]) -> int:
+        """Numer tury bieżącego zapytania: odpowiedzi modelu po ostatniej wiadomości tekstowej użytkownika."""
+        turn = 0
+        for content in reversed(contents):
+            if content.get("role") == "model":
+                turn += 1
+            elif any("text" in part for part in content.get("parts", [])):
+                break
+        return turn
+
+    def _prefix_tokens(self, body: Dict) -> List[str]:
+        return self._tokens(body.get("systemInstruction"), body.get("tools"))
+
+    def create_cache(self, body: Dict) -> Dict:
+        name = f"cachedContents/fake-{next(self._ids)}"
+        tokens = self._prefix_tokens(body) + self._tokens(body.get("contents"))
+        with self._lock:
+            self._caches[name] = tokens
+        return {"name": name, "model": body.get("model"), "usageMetadata": {"totalTokenCount": len(tokens)}}
+
+    def generate(self, body: Dict) -> Dict:
+        sent = self._prefix_tokens(body)
+        contents = self._tokens(body.get("contents"))
+        with self._lock:
+            cached = list(self._caches.get(body.get("cachedContent"), []))
+            prompt = cached + sent + contents
+            prefix = max((_common_prefix(prompt, previous) for previous in self._recent), default=0)
+            self._recent = (self._recent + [prompt])[-self.HISTORY:]
+            self.prompts.append({
+                "sent_tokens": len(sent) + len(contents),
+                "prompt_tokens": len(prompt),
+                "cached_tokens": len(cached),
+                "prefix_tokens": prefix,
+            })
+
+        turn = self._turn(body.get("contents") or [])
+        if turn < len(self.script):
+            parts = [{"functionCall": {"name": call["name"], "args": call.get("args", {})}} for call in self.script[turn]]
+        else:
+            parts = [{"text": "Stylista radzi: len i jasne kolory, zgodnie z poradnikiem tkanin."}]
+
+        return {
+            "candidates": [{"content": {"role": "model", "parts": parts}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {
+                "promptTokenCount": len(prompt),
+                "cachedContentTokenCount": max(len(cached), prefix),
+                "candidatesTokenCount": 12,
+                "totalTokenCount": len(prompt) + 12,
+            },
+        }
@@ -12,15 +12,120 @@ class Config:
     # Settings
     LLM_PROVIDER = os.getenv("LLM_PROVIDER", "local_stub")
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    # Logi: plik logs/app.log w formacie json (linia = rekord) albo text, zapis w wątku w tle przez kolejkę
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))  # pełna kolejka = rekord odrzucony, żądanie nie czeka
+    # Rotacja po przekroczeniu rozmiaru albo czasu (0 = bez danego kryterium), liczba zachowanych kopii
+    LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+    LOG_ROTATE_SECONDS = float(os.getenv("LOG_ROTATE_SECONDS", 86400))
+    LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 7))
+    # Część żądań, z których zapisujemy INFO/DEBUG (1.0 = wszystkie); WARNING i wyżej zawsze
+    LOG_INFO_SAMPLE_RATE = float(os.getenv("LOG_INFO_SAMPLE_RATE", 1.0))
     
     # fallback na 'gemini-pro', jeśli w env nic nie ma
     GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-pro")
+    # Alternatywny adres API (np. lokalny fake serwer w benchmarkach); pusty = domyślny endpoint Google
+    GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "")
+    # Jawny context cache stałego prefiksu (instrukcje + narzędzia); wymaga modelu z obsługą cache
+    GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "false").lower() in ("1", "true", "yes")
+    GEMINI_CONTEXT_CACHE_TTL_SECONDS = float(os.getenv("GEMINI_CONTEXT_CACHE_TTL_SECONDS", 3600))
     
     # RAG Settings
     RAG_K_RETRIEVAL = int(os.getenv("RAG_K_RETRIEVAL", 3))
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    # Backend embeddingów: sentence_transformers (PyTorch) | onnx | onnx_int8 (ONNX Runtime, wymaga onnxruntime)
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence_transformers")
+    EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "")  # nadpisuje plik .onnx w repo modelu
+    EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", 0))  # wątki ONNX Runtime (0 = domyślnie)
+    # Micro-batching zapytań: okno zbierania (ms, 0 = wyłączone) i maksymalny rozmiar batcha
+    RAG_BATCH_WINDOW_MS = float(os.getenv("RAG_BATCH_WINDOW_MS", 0))
+    RAG_MAX_BATCH_SIZE = int(os.getenv("RAG_MAX_BATCH_SIZE", 32))
+    # Cache embeddingów zapytań i wyników top-k (LRU + TTL, 0 = bez wygasania)
+    RAG_CACHE_MAX_ENTRIES = int(os.getenv("RAG_CACHE_MAX_ENTRIES", 2048))
+    RAG_CACHE_MAX_MB = float(os.getenv("RAG_CACHE_MAX_MB", 32))
+    RAG_CACHE_TTL_SECONDS = float(os.getenv("RAG_CACHE_TTL_SECONDS", 3600))
+    # Typ indeksu FAISS: flat | ivf | hnsw | sq | ivfpq (budowany/trenowany w data_ingestion.py)
+    RAG_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "flat")
+    RAG_IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", 0))  # 0 = ~4*sqrt(liczba wektorów)
+    RAG_HNSW_M = int(os.getenv("RAG_HNSW_M", 32))
+    RAG_HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", 80))
+    RAG_PQ_M = int(os.getenv("RAG_PQ_M", 48))  # liczba pod-kwantyzatorów, musi dzielić wymiar (384)
+    RAG_PQ_NBITS = int(os.getenv("RAG_PQ_NBITS", 8))
+    # Parametry zapytania (ustawiane przy ładowaniu indeksu): listy IVF do przeszukania i efSearch HNSW
+    RAG_NPROBE = int(os.getenv("RAG_NPROBE", 16))
+    RAG_HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", 64))
+    # Tryb wyszukiwania: vector (FAISS) | lexical (tylko BM25, bez embeddingu) | hybrid (RRF obu list)
+    # | auto (lexical dla krótkich zapytań, których wszystkie termy są w indeksie BM25, w pozostałych hybrid)
+    RAG_SEARCH_MODE = os.getenv("RAG_SEARCH_MODE", "vector")
+    RAG_HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", 20))  # kandydaci z każdej listy przed fuzją
+    RAG_RRF_K = int(os.getenv("RAG_RRF_K", 60))  # stała reciprocal-rank fusion: 1 / (RRF_K + pozycja)
+    RAG_LEXICAL_MAX_TERMS = int(os.getenv("RAG_LEXICAL_MAX_TERMS", 2))  # "krótkie zapytanie" w trybie auto
+    # Składanie kontekstu dla LLM: z CONTEXT_CANDIDATES wyników wybieramy co najwyżej RAG_K_RETRIEVAL fragmentów
+    # - próg odległości L2 (kwadrat; dla znormalizowanych embeddingów 1.5 ~ kosinus 0.25; domyślnie 0 = bez progu,
+    #   bo odrzucanie fragmentów zmienia odpowiedzi - włączać po sprawdzeniu na run_evaluation.py),
+    # - duplikaty (podobieństwo kosinusowe), różnorodność MMR (1.0 = tylko trafność) i budżet tokenów (0 = bez limitu)
+    CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", 8))
+    CONTEXT_MAX_DISTANCE = float(os.getenv("CONTEXT_MAX_DISTANCE", 0))
+    CONTEXT_DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", 0.95))
+    CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", 0.7))
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 600))
+    # Ingestion: dzielenie plików na fragmenty (line | window), rozmiar/zakładka w znakach,
+    # rozmiar batcha do kodowania i liczba procesów kodujących (1 = w procesie ingestion)
+    INGEST_CHUNK_MODE = os.getenv("INGEST_CHUNK_MODE", "line")
+    INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 1000))
+    INGEST_CHUNK_OVERLAP = int(os.getenv("INGEST_CHUNK_OVERLAP", 150))
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 256))
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 1))
+    # Co ile sekund sprawdzać, czy ingestion opublikował nową generację indeksu (0 = tylko /admin/reload)
+    RAG_RELOAD_POLL_SECONDS = float(os.getenv("RAG_RELOAD_POLL_SECONDS", 5))
+
+    # Cache odpowiedzi LLM po znaczeniu pytania (0 wpisów = wyłączony): próg podobieństwa kosinusowego,
+    # TTL zwykłych odpowiedzi i krótszy TTL odpowiedzi opartych na pogodzie (Open-Meteo odświeża dane co 15 min)
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 512))
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95))
+    ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", 3600))
+    ANSWER_CACHE_WEATHER_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_WEATHER_TTL_SECONDS", 900))
+
+    # Sesje rozmów (session_id w /ask): backend magazynu, limit sesji, wygasanie po bezczynności,
+    # budżet tokenów historii i podsumowania starszych tur, ważność wyników narzędzi w sesji
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+    SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", 1000))
+    SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", 1800))
+    SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", 1500))
+    SESSION_SUMMARY_TOKENS = int(os.getenv("SESSION_SUMMARY_TOKENS", 300))
+    SESSION_TOOL_TTL_SECONDS = float(os.getenv("SESSION_TOOL_TTL_SECONDS", 900))
+
+    # Token wymagany przez endpointy /admin/* (nagłówek X-Admin-Token); pusty = endpointy /admin/* wyłączone
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+    # /ask/batch: maksymalna liczba pytań w żądaniu i ile z nich przetwarzamy równolegle (LLM + narzędzia)
+    ASK_BATCH_MAX_QUERIES = int(os.getenv("ASK_BATCH_MAX_QUERIES", 100))
+    ASK_BATCH_CONCURRENCY = int(os.getenv("ASK_BATCH_CONCURRENCY", 4))
+
+    # Metryki (GET /metrics, format Prometheusa); false = bez zbierania i bez endpointu
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+    # Tools: współdzielona pula wątków, limit równoległości per narzędzie i timeout (s)
+    TOOL_POOL_SIZE = int(os.getenv("TOOL_POOL_SIZE", 16))
+    TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", 8))
+    TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", 5))
+
+    # Weather API (Open-Meteo) i pula połączeń HTTP
+    OPEN_METEO_GEOCODING_URL = os.getenv("OPEN_METEO_GEOCODING_URL", "https://geocoding-api.open-meteo.com/v1/search")
+    OPEN_METEO_FORECAST_URL = os.getenv("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+    HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", 5))
+    HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 4))
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 16))
 
     # Paths
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     DATA_DIR = os.path.join(BASE_DIR, "data")
-    VECTOR_STORE_PATH = os.path.join(DATA_DIR, "vector_store")
\ No newline at end of file
+    VECTOR_STORE_PATH = os.path.join(DATA_DIR, "vector_store")
+    # Gazetteer dostarczany z repozytorium (tylko do odczytu) i miasta dopisane po geokodowaniu (poza repozytorium)
+    GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", os.path.join(DATA_DIR, "gazetteer.json"))
+    GAZETTEER_CACHE_PATH = os.getenv(
+        "GAZETTEER_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "ai_stylist", "gazetteer.json")
+    )
+    # Pliki z wzorcami guardrails (kilka plików rozdzielonych os.pathsep)
+    GUARDRAILS_INPUT_PATTERNS = os.getenv("GUARDRAILS_INPUT_PATTERNS", os.path.join(DATA_DIR, "guardrails", "input_patterns.txt"))
+    GUARDRAILS_OUTPUT_PATTERNS = os.getenv("GUARDRAILS_OUTPUT_PATTERNS", os.path.join(DATA_DIR, "guardrails", "output_patterns.txt"))
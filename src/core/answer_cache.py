@@ -0,0 +1,252 @@
+# src/core/answer_cache.py
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.core.guardrails import guardrails
+from src.core.lexical import fold
+
+# Narzędzia, których wynik zależy od bieżącej pogody - odpowiedź z ich udziałem żyje krócej
+WEATHER_TOOLS = ("get_current_weather", "get_trip_weather")
+# Argumenty narzędzi, które muszą pojawić się w nowym pytaniu (embedding "Kraków" i "Gdańsk" bywa bardzo podobny)
+MENTIONED_ARGUMENTS = ("city", "cities")
+# Ile pierwszych liter słowa porównujemy - odmiana przez przypadki ("Kraków" / "w Krakowie")
+STEM_LENGTH = 4
+
+ToolCall = Tuple[str, Dict[str, Any]]
+
+
+def query_key(query: str) -> Tuple[str, ...]:
+    """Słowa pytania bez wielkości liter, polskich znaków i interpunkcji - klucz dopasowania bez embeddingu."""
+    return tuple(re.findall(r"\w+", fold(query)))
+
+
+def _mentions(query_words: Sequence[str], value: str) -> bool:
+    """Czy każde słowo wartości (np. nazwy miasta) występuje w pytaniu, z dokładnością do końcówki."""
+    for word in fold(value).split():
+        stem = word[:STEM_LENGTH]
+        if not any(q.startswith(stem) for q in query_words):
+            return False
+    return True
+
+
+def context_fingerprint(rag_results: List[Dict]) -> str:
+    """Odcisk kontekstu RAG: te same fragmenty (bez względu na kolejność i odległości) = ten sam odcisk."""
+    contents = sorted(f"{r['source']}\0{r['content']}" for r in rag_results)
+    return hashlib.sha256("\n".join(contents).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    words: Tuple[str, ...]
+    vector: Optional[np.ndarray]
+    context: str
+    tool_calls: List[ToolCall]
+    answer: str
+    expires_at: float
+    key: int = -1
+
+
+class SemanticAnswerCache:
+    """
+    Cache odpowiedzi LLM po znaczeniu pytania.
+
+    Trafienie wymaga:
+    - podobieństwa kosinusowego embeddingu pytania >= similarity
+      (bez embeddingu - np. po wyszukiwaniu tylko BM25 - tych samych słów pytania, query_key),
+    - identycznego kontekstu RAG (context_fingerprint),
+    - wzmianki w pytaniu o argumenty narzędzi (miasta) z zapisanej odpowiedzi.
+
+    Trafienie nie ponawia narzędzi (pogoda to zapytanie HTTP) - wyniki zapisane z odpowiedzią
+    uznajemy za aktualne, dopóki wpis żyje. Dlatego odpowiedzi z pogodą wygasają po
+    weather_ttl_seconds (wiek danych pogodowych), pozostałe po ttl_seconds;
+    najdawniej używane wpisy są usuwane po przekroczeniu max_entries.
+
+    Wpisy są pogrupowane po kontekście RAG: te same słowa pytania (query_key) to jedno
+    sprawdzenie w słowniku, a podobieństwo embeddingów liczymy jednym iloczynem macierzy
+    tylko dla wpisów z tym samym kontekstem.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        similarity: float = 0.95,
+        ttl_seconds: float = 3600,
+        weather_ttl_seconds: float = 900,
+    ):
+        self.max_entries = max(max_entries, 1)
+        self.similarity = similarity
+        self.ttl = ttl_seconds
+        self.weather_ttl = weather_ttl_seconds
+
+        self._data: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        # kontekst RAG -> klucze wpisów; (kontekst, słowa pytania) -> klucz; kontekst -> (klucze, macierz embeddingów)
+        self._contexts: Dict[str, Dict[int, None]] = {}
+        self._by_words: Dict[Tuple[str, Tuple[str, ...]], int] = {}
+        self._matrices: Dict[str, Tuple[List[int], np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self._next_key = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.blocked = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def match(self, query: str, vector: Optional[np.ndarray], context: str) -> Optional[CachedAnswer]:
+        """Najbardziej podobny ważny wpis dla tego kontekstu RAG (None = chybienie, liczone od razu)."""
+        vector = self._normalize(vector)
+        words = query_key(query)
+        query_words = fold(query).split()
+        now = time.monotonic()
+
+        with self._lock:
+            best = None
+            if context in self._contexts:
+                self._expire(context, now)
+                key = self._by_words.get((context, words))
+                if key is not None and self._arguments_mentioned(self._data[key], query_words):
+                    best = key
+                elif vector is not None:
+                    best = self._closest(context, vector, query_words)
+
+            if best is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(best)
+            return self._data[best]
+
+    def confirm(self, entry: CachedAnswer) -> Optional[str]:
+        """
+        Kończy trafienie z match(): ponownie przepuszcza odpowiedź przez guardrails
+        (wzorce mogły się zmienić). Zablokowana odpowiedź jest usuwana z cache.
+        """
+        answer = guardrails.validate_output(entry.answer)
+        with self._lock:
+            if answer != entry.answer:
+                self.blocked += 1
+                self.misses += 1
+                self._remove(entry.key)
+                return None
+            self.hits += 1
+        return answer
+
+    def store(self, query: str, vector: Optional[np.ndarray], context: str,
+              tool_calls: List[ToolCall], answer: str):
+        """
+        Zapisuje odpowiedź - tylko taką, która przechodzi guardrails wyjścia.
+        Wywołujący zapisuje tylko odpowiedzi, w których wszystkie narzędzia się powiodły.
+        """
+        if not answer or guardrails.validate_output(answer) != answer:
+            return
+
+        tool_calls = [(name, dict(args or {})) for name, args in tool_calls]
+        uses_weather = any(name in WEATHER_TOOLS for name, _ in tool_calls)
+        ttl = self.weather_ttl if uses_weather else self.ttl
+        entry = CachedAnswer(
+            query=query,
+            words=query_key(query),
+            vector=self._normalize(vector),
+            context=context,
+            tool_calls=tool_calls,
+            answer=answer,
+            expires_at=time.monotonic() + ttl,
+        )
+
+        with self._lock:
+            # To samo pytanie z tym samym kontekstem zastępuje starszą odpowiedź
+            self._remove(self._by_words.get((context, entry.words)))
+            entry.key = self._next_key
+            self._next_key += 1
+            self._data[entry.key] = entry
+            self._contexts.setdefault(context, {})[entry.key] = None
+            self._by_words[(context, entry.words)] = entry.key
+            self._matrices.pop(context, None)
+            while len(self._data) > self.max_entries:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._contexts.clear()
+            self._by_words.clear()
+            self._matrices.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "blocked": self.blocked,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _expire(self, context: str, now: float):
+        for key in [key for key in self._contexts[context] if self._data[key].expires_at <= now]:
+            self._remove(key)
+            self.expirations += 1
+
+    def _closest(self, context: str, vector: np.ndarray, query_words: List[str]) -> Optional[int]:
+        """Najbardziej podobny wpis z embeddingiem (>= similarity), którego argumenty narzędzi padają w pytaniu."""
+        if context not in self._matrices:
+            keys = [key for key in self._contexts.get(context, ()) if self._data[key].vector is not None]
+            matrix = np.stack([self._data[key].vector for key in keys]) if keys else np.empty((0, vector.size), "float32")
+            self._matrices[context] = (keys, matrix)
+        keys, matrix = self._matrices[context]
+        if not keys:
+            return None
+
+        scores = matrix @ vector
+        for i in np.argsort(-scores, kind="stable"):
+            if scores[i] < self.similarity:
+                break
+            if self._arguments_mentioned(self._data[keys[i]], query_words):
+                return keys[i]
+        return None
+
+    def _remove(self, key: Optional[int]):
+        entry = self._data.pop(key, None) if key is not None else None
+        if entry is None:
+            return
+        keys = self._contexts[entry.context]
+        del keys[key]
+        if not keys:
+            del self._contexts[entry.context]
+        if self._by_words.get((entry.context, entry.words)) == key:
+            del self._by_words[(entry.context, entry.words)]
+        self._matrices.pop(entry.context, None)
+
+    @staticmethod
+    def _arguments_mentioned(entry: CachedAnswer, query_words: List[str]) -> bool:
+        for _, args in entry.tool_calls:
+            for name in MENTIONED_ARGUMENTS:
+                values = args.get(name)
+                if values is None:
+                    continue
+                for value in ([values] if isinstance(values, str) else values):
+                    if not _mentions(query_words, str(value)):
+                        return False
+        return True
+
+    @staticmethod
+    def _normalize(vector: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        if vector is None:
+            return None
+        vector = np.asarray(vector, dtype="float32").ravel()
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
@@ -0,0 +1,110 @@
+# src/core/batching.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+
+from src.utils.logger import logger
+
+# batch_fn(queries, k, context) -> lista wyników (po jednej liście na zapytanie)
+BatchFn = Callable[[List[str], int, Any], List[List[Dict]]]
+
+_STOP = object()
+
+
+class QueryBatcher:
+    """
+    Zbiera równoległe zapytania do RAG i wykonuje je jednym wywołaniem batch_fn.
+
+    Pierwsze zapytanie otwiera okno czasowe (window_ms). Wszystko, co przyjdzie
+    w tym oknie (maksymalnie max_batch_size zapytań), jest kodowane jednym
+    `encode` i przeszukiwane jednym `index.search`. Każdy wywołujący dostaje
+    swoje własne wyniki przycięte do swojego `k`.
+
+    context (np. migawka indeksu, którą widział wywołujący) trafia do batch_fn bez zmian;
+    zapytania z różnymi context nie są łączone w jedno wywołanie.
+    """
+
+    def __init__(self, batch_fn: BatchFn, window_ms: float, max_batch_size: int = 32):
+        self._batch_fn = batch_fn
+        self.window = max(window_ms, 0) / 1000.0
+        self.max_batch_size = max(max_batch_size, 1)
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._queries = 0
+        self._largest_batch = 0
+
+        self._thread = threading.Thread(target=self._run, name="rag-query-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, query: str, k: int, context: Any = None) -> List[Dict]:
+        """Blokuje wywołującego do momentu, aż jego batch zostanie przetworzony."""
+        future: Future = Future()
+        self._queue.put((query, k, context, future))
+        return future.result()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join(timeout=5)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            batches = self._batches
+            return {
+                "batches": batches,
+                "queries": self._queries,
+                "avg_batch_size": (self._queries / batches) if batches else 0.0,
+                "largest_batch": self._largest_batch,
+            }
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+
+            batch = [first]
+            stop = False
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            # Zwykle jedna grupa; kilka tylko wtedy, gdy w oknie podmieniono indeks
+            groups: Dict[int, List[Tuple[str, int, Any, Future]]] = {}
+            for item in batch:
+                groups.setdefault(id(item[2]), []).append(item)
+            for group in groups.values():
+                self._dispatch(group)
+            if stop:
+                return
+
+    def _dispatch(self, batch: List[Tuple[str, int, Any, Future]]):
+        queries = [query for query, _, _, _ in batch]
+        k = max(item_k for _, item_k, _, _ in batch)
+
+        try:
+            results = self._batch_fn(queries, k, batch[0][2])
+        except Exception as e:
+            logger.error(f"RAG batch of {len(batch)} queries failed: {e}")
+            for _, _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self._batches += 1
+            self._queries += len(batch)
+            self._largest_batch = max(self._largest_batch, len(batch))
+
+        for (_, item_k, _, future), item_results in zip(batch, results):
+            future.set_result(item_results[:item_k])
@@ -0,0 +1,71 @@
+# src/core/chunking.py
+from typing import Iterable, Iterator, List
+
+# Tryby dzielenia plików bazy wiedzy na fragmenty (Config.INGEST_CHUNK_MODE)
+LINE = "line"      # niepusta linia = fragment (baza wiedzy to zdania-fakty); za długie linie dzielone oknami
+WINDOW = "window"  # ciągły tekst cięty na okna po ~size znaków z zakładką (proza, dokumenty)
+
+CHUNK_MODES = (LINE, WINDOW)
+
+
+def iter_lines(file_path: str) -> Iterator[str]:
+    """Leniwie czyta plik linia po linii (bez wczytywania całości do pamięci)."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield line.strip()
+
+
+def windows(words: Iterable[str], size: int, overlap: int) -> Iterator[str]:
+    """
+    Skleja słowa w okna o długości <= size znaków (cięcie tylko na granicy słów).
+    Każde kolejne okno zaczyna się od ostatnich słów poprzedniego (łącznie <= overlap znaków),
+    żeby zdanie przecięte granicą okna było w całości w jednym z fragmentów.
+    """
+    overlap = max(0, min(overlap, size // 2))
+    window: List[str] = []
+    length = 0
+    for word in words:
+        extra = len(word) + (1 if window else 0)
+        if window and length + extra > size:
+            yield " ".join(window)
+            tail: List[str] = []
+            tail_length = 0
+            for previous in reversed(window):
+                added = len(previous) + (1 if tail else 0)
+                if tail_length + added > overlap:
+                    break
+                tail.insert(0, previous)
+                tail_length += added
+            window, length = tail, tail_length
+            extra = len(word) + (1 if window else 0)
+        window.append(word)
+        length += extra
+    if window:
+        yield " ".join(window)
+
+
+def validate_settings(mode: str, size: int, overlap: int):
+    """Sprawdza ustawienia cięcia (ValueError) - przed czytaniem plików, a nie przy pierwszym fragmencie."""
+    if mode not in CHUNK_MODES:
+        raise ValueError(f"Unknown chunk mode '{mode}', expected one of {', '.join(CHUNK_MODES)}")
+    if size < 0 or (mode == WINDOW and size == 0):
+        raise ValueError(f"Invalid chunk size {size} for mode '{mode}'")
+    if overlap < 0:
+        raise ValueError(f"Invalid chunk overlap {overlap}")
+
+
+def iter_chunks(file_path: str, mode: str = LINE, size: int = 1000, overlap: int = 100) -> Iterator[str]:
+    """Fragmenty pliku generowane strumieniowo - pamięć ograniczona rozmiarem jednego okna."""
+    validate_settings(mode, size, overlap)
+
+    if mode == WINDOW:
+        yield from windows((word for line in iter_lines(file_path) for word in line.split()), size, overlap)
+        return
+
+    for line in iter_lines(file_path):
+        if not line:
+            continue
+        if size and len(line) > size:
+            yield from windows(line.split(), size, overlap)
+        else:
+            yield line
@@ -0,0 +1,103 @@
+# src/core/context_builder.py
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.core.sessions import estimate_tokens
+
+
+def chunk_tokens(content: str) -> int:
+    """Tokeny fragmentu w wiadomości do modelu (linia "- fragment")."""
+    return estimate_tokens(content) + 1
+
+
+@dataclass
+class ContextSelection:
+    results: List[Dict]    # wybrane fragmenty w kolejności dla modelu
+    candidates: int        # ile fragmentów zwróciło wyszukiwanie
+    tokens: int            # tokeny wybranego kontekstu
+    baseline_tokens: int   # tokeny kontekstu bez selekcji (pierwsze max_chunks wyników)
+    too_far: int = 0       # odrzucone przez próg odległości
+    duplicates: int = 0    # odrzucone jako (prawie) duplikaty
+    over_budget: int = 0   # pominięte, bo nie mieściły się w budżecie tokenów
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(self.baseline_tokens - self.tokens, 0)
+
+
+class ContextBuilder:
+    """
+    Składa kontekst RAG z kandydatów wyszukiwania:
+    1. próg odległości L2 (wyniki bez odległości - np. z samego BM25 - przechodzą),
+    2. usuwanie duplikatów: identyczny tekst albo podobieństwo kosinusowe wektorów >= duplicate_similarity,
+    3. kolejność MMR: trafność (pozycja z wyszukiwania) kontra podobieństwo do już wybranych fragmentów,
+    4. twardy budżet tokenów i co najwyżej max_chunks fragmentów.
+    Bez wektorów fragmentów kroki oparte o podobieństwo sprowadzają się do kolejności wyszukiwania.
+    """
+
+    def __init__(
+        self,
+        max_chunks: int = 3,
+        max_distance: float = 0.0,
+        duplicate_similarity: float = 0.95,
+        mmr_lambda: float = 0.7,
+        token_budget: int = 600,
+    ):
+        self.max_chunks = max(max_chunks, 0)
+        self.max_distance = max_distance
+        self.duplicate_similarity = duplicate_similarity
+        self.mmr_lambda = mmr_lambda
+        self.token_budget = token_budget
+
+    def build(self, results: List[Dict], vectors: Optional[np.ndarray] = None) -> ContextSelection:
+        """results w kolejności trafności; vectors (opcjonalnie) - wektory fragmentów w tej samej kolejności."""
+        selection = ContextSelection(
+            results=[], candidates=len(results), tokens=0,
+            baseline_tokens=sum(chunk_tokens(r["content"]) for r in results[:self.max_chunks]),
+        )
+        if vectors is not None:
+            vectors = np.asarray(vectors, dtype="float32")
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms > 0, norms, 1.0)
+
+        # 1-2. Próg odległości i duplikaty (z pary zostaje fragment wyżej w rankingu)
+        kept: List[int] = []
+        seen_texts = set()
+        for i, r in enumerate(results):
+            if self.max_distance > 0 and r.get("score") is not None and r["score"] > self.max_distance:
+                selection.too_far += 1
+                continue
+            text = " ".join(r["content"].casefold().split())
+            duplicate = text in seen_texts
+            if not duplicate and vectors is not None and kept:
+                duplicate = float(np.max(vectors[kept] @ vectors[i])) >= self.duplicate_similarity
+            if duplicate:
+                selection.duplicates += 1
+                continue
+            seen_texts.add(text)
+            kept.append(i)
+
+        # 3-4. MMR w ramach budżetu; trafność z pozycji, bo wyniki bywają z FAISS, BM25 albo fuzji RRF
+        relevance = {i: 1.0 - rank / len(kept) for rank, i in enumerate(kept)}
+        chosen: List[int] = []
+        remaining = list(kept)
+        while remaining and len(chosen) < self.max_chunks:
+            best, best_score = remaining[0], None
+            for i in remaining:
+                redundancy = float(np.max(vectors[chosen] @ vectors[i])) if vectors is not None and chosen else 0.0
+                score = self.mmr_lambda * relevance[i] - (1.0 - self.mmr_lambda) * redundancy
+                if best_score is None or score > best_score:
+                    best, best_score = i, score
+            remaining.remove(best)
+
+            tokens = chunk_tokens(results[best]["content"])
+            if self.token_budget > 0 and selection.tokens + tokens > self.token_budget:
+                selection.over_budget += 1
+                continue
+            chosen.append(best)
+            selection.tokens += tokens
+
+        selection.results = [results[i] for i in chosen]
+        return selection
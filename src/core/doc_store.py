@@ -0,0 +1,158 @@
+# src/core/doc_store.py
+import json
+import os
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Pliki magazynu dokumentów (kolumnowo, obok index.faiss)
+IDS_FILE = "docs.ids.npy"              # int64 [n]   - ID fragmentu w indeksie FAISS (rosnąco)
+OFFSETS_FILE = "docs.offsets.npy"      # int64 [n+1] - początek tekstu fragmentu w blobie (bajty)
+SOURCE_IDS_FILE = "docs.source_ids.npy"  # int32 [n] - indeks w liście źródeł
+TEXT_FILE = "docs.text.bin"            # UTF-8       - treści wszystkich fragmentów sklejone razem
+META_FILE = "docs.meta.json"           # liczba dokumentów + internowana lista źródeł
+
+ALL_FILES = (IDS_FILE, OFFSETS_FILE, SOURCE_IDS_FILE, TEXT_FILE, META_FILE)
+
+
+def exists(path: str) -> bool:
+    return os.path.exists(os.path.join(path, META_FILE))
+
+
+class DocStore:
+    """
+    Magazyn metadanych fragmentów mapowany w pamięć (read-only).
+
+    Start jest O(1) niezależnie od liczby fragmentów: nic nie jest deserializowane,
+    a strony plików trafiają do page cache systemu i są współdzielone między workerami.
+    Interfejs jak słownik {id: {"content", "source"}}, więc RagEngine używa go tak samo jak dawnego pickla.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        self.path = path
+        self.sources: List[str] = meta["sources"]
+        self._count = meta["count"]
+        self._contiguous = meta.get("contiguous", False)
+
+        self._ids = np.load(os.path.join(path, IDS_FILE), mmap_mode="r")
+        self._offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        self._source_ids = np.load(os.path.join(path, SOURCE_IDS_FILE), mmap_mode="r")
+        text_path = os.path.join(path, TEXT_FILE)
+        # np.memmap nie obsługuje pustych plików
+        self._text = np.memmap(text_path, dtype=np.uint8, mode="r") if os.path.getsize(text_path) else np.zeros(0, np.uint8)
+
+        if len(self._ids) != self._count or len(self._offsets) != self._count + 1 or len(self._source_ids) != self._count:
+            raise ValueError(f"Inconsistent document store at {path}")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _row(self, doc_id: int) -> int:
+        if self._contiguous:
+            row = int(doc_id)
+            if 0 <= row < self._count:
+                return row
+            raise KeyError(doc_id)
+        row = int(np.searchsorted(self._ids, doc_id))
+        if row < self._count and self._ids[row] == doc_id:
+            return row
+        raise KeyError(doc_id)
+
+    def _document(self, row: int) -> Dict:
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        return {
+            "content": self._text[start:end].tobytes().decode("utf-8"),
+            "source": self.sources[int(self._source_ids[row])],
+        }
+
+    def __getitem__(self, doc_id: int) -> Dict:
+        return self._document(self._row(doc_id))
+
+    def __contains__(self, doc_id: int) -> bool:
+        try:
+            self._row(doc_id)
+            return True
+        except KeyError:
+            return False
+
+    def get(self, doc_id: int, default=None) -> Optional[Dict]:
+        try:
+            return self[doc_id]
+        except KeyError:
+            return default
+
+    def items(self) -> Iterator[Tuple[int, Dict]]:
+        """Wszystkie dokumenty w kolejności rosnących ID."""
+        for row in range(self._count):
+            yield int(self._ids[row]), self._document(row)
+
+    def values(self) -> Iterator[Dict]:
+        for _, document in self.items():
+            yield document
+
+
+class DocStoreWriter:
+    """
+    Zapisuje magazyn strumieniowo: tekst idzie od razu do pliku, w pamięci zostają tylko
+    kolumny liczbowe (8-12 bajtów na fragment). ID muszą być dodawane rosnąco.
+    Pliki powstają jako *.tmp i są podmieniane dopiero w commit().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._text = open(os.path.join(path, TEXT_FILE + ".tmp"), "wb")
+        self._ids = array("q")
+        self._offsets = array("q", [0])
+        self._source_ids = array("i")
+        self._sources: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, doc_id: int, content: str, source: str):
+        if self._ids and doc_id <= self._ids[-1]:
+            raise ValueError(f"Document ids must be increasing (got {doc_id} after {self._ids[-1]})")
+
+        data = content.encode("utf-8")
+        self._text.write(data)
+        self._ids.append(doc_id)
+        self._offsets.append(self._offsets[-1] + len(data))
+        self._source_ids.append(self._sources.setdefault(source, len(self._sources)))
+
+    def commit(self):
+        self._text.close()
+        count = len(self._ids)
+        ids = np.frombuffer(self._ids, dtype=np.int64) if count else np.zeros(0, np.int64)
+
+        columns = {
+            IDS_FILE: ids,
+            OFFSETS_FILE: np.frombuffer(self._offsets, dtype=np.int64),
+            SOURCE_IDS_FILE: np.frombuffer(self._source_ids, dtype=np.int32) if count else np.zeros(0, np.int32),
+        }
+        for name, column in columns.items():
+            with open(os.path.join(self.path, name + ".tmp"), "wb") as f:
+                np.save(f, column)
+
+        meta = {
+            "count": count,
+            "contiguous": bool(count == 0 or (ids[0] == 0 and ids[-1] == count - 1)),
+            "sources": sorted(self._sources, key=self._sources.get),
+        }
+        with open(os.path.join(self.path, META_FILE + ".tmp"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        # Meta na końcu: jego obecność oznacza kompletny magazyn
+        for name in ALL_FILES:
+            os.replace(os.path.join(self.path, name + ".tmp"), os.path.join(self.path, name))
+
+    def abort(self):
+        self._text.close()
+        for name in ALL_FILES:
+            tmp = os.path.join(self.path, name + ".tmp")
+            if os.path.exists(tmp):
+                os.remove(tmp)
@@ -0,0 +1,153 @@
+# src/core/embeddings.py
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+import numpy as np
+
+from src.config import Config
+from src.utils.logger import logger
+
+# Config.EMBEDDING_BACKEND
+SENTENCE_TRANSFORMERS = "sentence_transformers"  # pełna precyzja, PyTorch
+ONNX = "onnx"                                    # ten sam model w ONNX Runtime (fp32)
+ONNX_INT8 = "onnx_int8"                          # ONNX Runtime, wagi skwantyzowane do int8
+
+BACKENDS = (SENTENCE_TRANSFORMERS, ONNX, ONNX_INT8)
+
+ONNX_MODEL_FILE = "onnx/model.onnx"
+# Skwantyzowane (dynamic int8) warianty publikowane w repozytoriach sentence-transformers na HF Hub
+ONNX_INT8_MODEL_FILE = "onnx/model_quint8_avx2.onnx"
+
+
+class EmbeddingBackend(ABC):
+    """
+    Wspólny interfejs modeli embeddingów: encode(lista tekstów) -> macierz float32 [n, dimension].
+    RagEngine i data_ingestion.py używają tylko tej metody, więc backend można podmienić w Config.
+    """
+
+    name = "base"
+    dimension: int
+
+    @abstractmethod
+    def encode(self, sentences: List[str]) -> np.ndarray:
+        ...
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    name = SENTENCE_TRANSFORMERS
+
+    def __init__(self, model_name: str):
+        # Import dopiero tutaj - sam sentence-transformers (torch) to kilka sekund
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, sentences: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(list(sentences)), dtype='float32')
+
+
+def hub_repo_id(model_name: str) -> str:
+    """'all-MiniLM-L6-v2' -> 'sentence-transformers/all-MiniLM-L6-v2' (tak jak rozwija to SentenceTransformer)."""
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    Model sentence-transformers uruchamiany w ONNX Runtime (bez torcha w procesie).
+    Odtwarza pipeline SentenceTransformera: tokenizacja -> transformer -> mean pooling -> (normalizacja).
+    Pliki (.onnx, tokenizer.json, konfiguracje) są pobierane z HF Hub albo brane z lokalnego katalogu modelu.
+    """
+
+    name = ONNX
+
+    def __init__(self, model_name: str, model_file: str = ONNX_MODEL_FILE, threads: int = 0):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("ONNX embedding backend requires 'onnxruntime' (pip install onnxruntime)") from e
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.model_file = model_file
+
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self._file(model_file), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(self._file("tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self._max_length())
+        pad_token = "[PAD]" if self.tokenizer.token_to_id("[PAD]") is not None else "<pad>"
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token) or 0, pad_token=pad_token)
+
+        modules = self._json("modules.json") or []
+        self.normalize = any(m.get("type", "").endswith("Normalize") for m in modules)
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+
+    def _max_length(self) -> int:
+        """Limit tokenów jak w SentenceTransformerze: max_seq_length modelu, inaczej limit tokenizera."""
+        max_length = (self._json("sentence_bert_config.json") or {}).get("max_seq_length")
+        if not max_length:
+            max_length = (self._json("tokenizer_config.json") or {}).get("model_max_length")
+        return max_length if max_length and max_length < 100_000 else 512
+
+    def _file(self, filename: str) -> str:
+        local = os.path.join(self.model_name, filename)
+        if os.path.exists(local):
+            return local
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(hub_repo_id(self.model_name), filename)
+
+    def _json(self, filename: str) -> Optional[object]:
+        try:
+            with open(self._file(filename), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def encode(self, sentences: List[str], batch_size: int = 32) -> np.ndarray:
+        sentences = list(sentences)
+        embeddings = np.zeros((len(sentences), self.dimension), dtype='float32')
+        # Jak SentenceTransformer: batche z tekstów o podobnej długości = mniej paddingu
+        order = np.argsort([-len(s) for s in sentences], kind="stable")
+        for start in range(0, len(sentences), batch_size):
+            rows = order[start:start + batch_size]
+            embeddings[rows] = self._encode_batch([sentences[i] for i in rows])
+        return embeddings
+
+    def _encode_batch(self, sentences: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(sentences)
+        input_ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.asarray([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling po tokenach (bez paddingu), jak moduł Pooling w sentence-transformers
+        mask = attention_mask[..., None].astype(np.float32)
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+
+def create_embedding_backend(backend: Optional[str] = None, model_name: Optional[str] = None) -> EmbeddingBackend:
+    """Backend embeddingów wg Config.EMBEDDING_BACKEND (albo jawnie podanego)."""
+    backend = (backend or Config.EMBEDDING_BACKEND).lower()
+    model_name = model_name or Config.EMBEDDING_MODEL
+
+    if backend == SENTENCE_TRANSFORMERS:
+        return SentenceTransformerBackend(model_name)
+    if backend in (ONNX, ONNX_INT8):
+        model_file = Config.EMBEDDING_ONNX_FILE or (ONNX_INT8_MODEL_FILE if backend == ONNX_INT8 else ONNX_MODEL_FILE)
+        instance = OnnxBackend(model_name, model_file=model_file, threads=Config.EMBEDDING_THREADS)
+        instance.name = backend
+        logger.info(f"Embedding backend: ONNX Runtime ({model_file})")
+        return instance
+    raise ValueError(f"Unknown embedding backend '{backend}', expected one of {', '.join(BACKENDS)}")
@@ -0,0 +1,85 @@
+# src/core/generations.py
+import os
+import re
+import shutil
+import tempfile
+from typing import List, Optional
+
+from src.utils.logger import logger
+
+# Układ data/vector_store:
+#   gen-000001/ gen-000002/ ...  - kompletne wersje indeksu (index.faiss, docs.*, manifest.json)
+#   CURRENT                      - nazwa aktywnej generacji, podmieniana atomowo jako ostatni krok ingestion
+# Czytelnik, który wczytał CURRENT, zawsze widzi spójny komplet plików jednej generacji.
+# Starszy układ (pliki bezpośrednio w vector_store) jest dalej czytany jako generacja "legacy".
+CURRENT_FILE = "CURRENT"
+LEGACY = "legacy"
+KEEP_GENERATIONS = 2
+
+_GENERATION_RE = re.compile(r"^gen-(\d+)$")
+
+
+def list_generations(store_path: str) -> List[str]:
+    """Nazwy generacji w kolejności tworzenia."""
+    if not os.path.isdir(store_path):
+        return []
+    names = [n for n in os.listdir(store_path) if _GENERATION_RE.match(n)]
+    return sorted(names, key=lambda n: int(_GENERATION_RE.match(n).group(1)))
+
+
+def current_generation(store_path: str) -> Optional[str]:
+    """Aktywna generacja z pliku CURRENT albo None (brak / starszy układ)."""
+    try:
+        with open(os.path.join(store_path, CURRENT_FILE), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return name if _GENERATION_RE.match(name) else None
+
+
+def generation_path(store_path: str, generation: Optional[str] = None) -> str:
+    """Katalog z plikami generacji; dla starszego układu to sam store_path."""
+    if generation is None:
+        generation = current_generation(store_path)
+    if generation is None or generation == LEGACY:
+        return store_path
+    return os.path.join(store_path, generation)
+
+
+def new_generation(store_path: str) -> str:
+    """Tworzy pusty katalog następnej generacji i zwraca jej nazwę."""
+    existing = list_generations(store_path)
+    number = int(_GENERATION_RE.match(existing[-1]).group(1)) + 1 if existing else 1
+    name = f"gen-{number:06d}"
+    os.makedirs(os.path.join(store_path, name))
+    return name
+
+
+def publish(store_path: str, generation: str):
+    """Atomowo ustawia aktywną generację (tempfile + os.replace)."""
+    fd, tmp_path = tempfile.mkstemp(dir=store_path, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(generation + "\n")
+        os.replace(tmp_path, os.path.join(store_path, CURRENT_FILE))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def prune(store_path: str, keep: int = KEEP_GENERATIONS):
+    """
+    Usuwa stare generacje, zostawiając `keep` najnowszych (zawsze z aktywną).
+    Poprzednia generacja zostaje, bo procesy API mogą jeszcze z niej czytać, zanim przeładują indeks.
+    """
+    active = current_generation(store_path)
+    names = list_generations(store_path)
+    for name in names[:-keep] if keep > 0 else names:
+        if name == active:
+            continue
+        try:
+            shutil.rmtree(os.path.join(store_path, name))
+        except OSError as e:
+            # Np. Windows nie pozwala usunąć plików zmapowanych w pamięć - spróbujemy następnym razem
+            logger.warning(f"Could not remove old index generation {name}: {e}")
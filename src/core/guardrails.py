@@ -1,16 +1,108 @@
-from typing import List
+import os
+from typing import List, Optional
+
+from src.config import Config
+from src.core.pattern_matcher import PatternMatch, PatternMatcher, load_patterns
+from src.utils.logger import logger
+from src.utils.metrics import STAGE_SECONDS
+
+DEFAULT_BLOCKED_PHRASES = [
+    "ignore previous instructions",
+    "system prompt",
+    "delete all"
+]
+
+DEFAULT_FORBIDDEN_PHRASES = [
+    "pwned",
+    "hacked",
+    "root access",
+    "system prompt"
+]
+
+OUTPUT_BLOCKED_MESSAGE = "[Security Alert] Odpowiedź modelu została zablokowana ze względów bezpieczeństwa."
 
 class SecurityError(Exception):
     """Exception raised for security violations."""
     pass
 
+def _patterns_from(paths: str, defaults: List[str]) -> List[str]:
+    """Wzorce z plików (lista ścieżek rozdzielona os.pathsep) albo domyślne, gdy plików brak."""
+    files = [p for p in paths.split(os.pathsep) if p and os.path.exists(p)] if paths else []
+    if not files:
+        return list(defaults)
+    return load_patterns(files)
+
+class OutputStreamGuard:
+    """
+    Przyrostowa walidacja odpowiedzi strumieniowanej token po tokenie.
+
+    Tekst jest wypuszczany z opóźnieniem (max długość wzorca - 1 znaków), bo zakazana fraza
+    może zaczynać się w ogonie bieżącego fragmentu i kończyć w następnym. Po wykryciu frazy
+    strażnik blokuje się i nie wypuszcza już niczego, także wstrzymanego ogona.
+    """
+
+    def __init__(self, matcher: PatternMatcher):
+        self._scanner = matcher.scanner()
+        self._holdback = max(matcher.max_length - 1, 0)
+        self._pending = ""
+        self.blocked = False
+        self.match: Optional[PatternMatch] = None
+
+    def push(self, chunk: str) -> str:
+        """Zwraca bezpieczny do wysłania fragment (może być pusty)."""
+        if self.blocked or not chunk:
+            return ""
+
+        matches = self._scanner.feed(chunk)
+        if matches:
+            self.blocked = True
+            self.match = matches[0]
+            self._pending = ""
+            return ""
+
+        self._pending += chunk
+        if len(self._pending) <= self._holdback:
+            return ""
+        cut = len(self._pending) - self._holdback
+        safe, self._pending = self._pending[:cut], self._pending[cut:]
+        return safe
+
+    def flush(self) -> str:
+        """Koniec strumienia - ogona nie trzeba już wstrzymywać."""
+        if self.blocked:
+            return ""
+        rest, self._pending = self._pending, ""
+        return rest
+
 class Guardrails:
-    def __init__(self):
-        self.blocked_phrases: List[str] = [
-            "ignore previous instructions",
-            "system prompt",
-            "delete all"
-        ]
+    def __init__(self, input_patterns: Optional[str] = None, output_patterns: Optional[str] = None):
+        self.blocked_phrases: List[str] = _patterns_from(
+            input_patterns if input_patterns is not None else Config.GUARDRAILS_INPUT_PATTERNS,
+            DEFAULT_BLOCKED_PHRASES
+        )
+        self.forbidden_phrases: List[str] = _patterns_from(
+            output_patterns if output_patterns is not None else Config.GUARDRAILS_OUTPUT_PATTERNS,
+            DEFAULT_FORBIDDEN_PHRASES
+        )
+
+        # Automaty budowane raz - skan tekstu to jedno przejście niezależnie od liczby wzorców
+        self.input_matcher = PatternMatcher(self.blocked_phrases)
+        self.output_matcher = PatternMatcher(self.forbidden_phrases)
+        logger.info(
+            f"Guardrails loaded {len(self.input_matcher)} input and {len(self.output_matcher)} output patterns."
+        )
+
+    def scan_input(self, text: str) -> List[PatternMatch]:
+        """Wszystkie dopasowania wzorców wejściowych (z pozycjami)."""
+        return self.input_matcher.find_all(text)
+
+    def scan_output(self, text: str) -> List[PatternMatch]:
+        """Wszystkie dopasowania wzorców wyjściowych (z pozycjami)."""
+        return self.output_matcher.find_all(text)
+
+    def output_stream(self) -> OutputStreamGuard:
+        """Strażnik dla odpowiedzi strumieniowanej (SSE)."""
+        return OutputStreamGuard(self.output_matcher)
 
     def validate_input(self, text: str) -> bool:
         """
@@ -19,11 +111,11 @@ class Guardrails:
         """
         if not text:
             return True
-            
-        lower_text = text.lower()
-        for phrase in self.blocked_phrases:
-            if phrase in lower_text:
-                raise SecurityError(f"Potential prompt injection detected: prohibited phrase '{phrase}' found.")
+
+        with STAGE_SECONDS.labels("guardrails_input").time():
+            match = self.input_matcher.search(text)
+        if match:
+            raise SecurityError(f"Potential prompt injection detected: prohibited phrase '{match.pattern}' found.")
         return True
 
     def sanitize(self, text: str) -> str:
@@ -44,18 +136,11 @@ class Guardrails:
         """
         if not text:
             return ""
-            
-        lower_text = text.lower()
-        forbidden_phrases = [
-            "pwned",
-            "hacked",
-            "root access",
-            "system prompt"
-        ]
-        
-        for phrase in forbidden_phrases:
-            if phrase in lower_text:
-                return "[Security Alert] Odpowiedź modelu została zablokowana ze względów bezpieczeństwa."
+
+        with STAGE_SECONDS.labels("guardrails_output").time():
+            blocked = self.output_matcher.search(text)
+        if blocked:
+            return OUTPUT_BLOCKED_MESSAGE
                 
         return text
 
@@ -0,0 +1,205 @@
+# src/core/lexical.py
+import json
+import math
+import os
+import re
+import unicodedata
+from array import array
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Wersja tokenizacji/formatu - zmiana wymusza przebudowę indeksu BM25 w data_ingestion.py
+VERSION = 1
+
+# Pliki indeksu BM25 (obok index.faiss i docs.*)
+IDS_FILE = "bm25.ids.npy"            # int64 [n]  - ID fragmentu (jak w FAISS / magazynie dokumentów)
+LENGTHS_FILE = "bm25.lengths.npy"    # int32 [n]  - liczba tokenów fragmentu
+POSTINGS_FILE = "bm25.postings.npy"  # int32 [p]  - wiersze fragmentów, pogrupowane po termie
+TF_FILE = "bm25.tf.npy"              # uint16 [p] - liczba wystąpień termu we fragmencie
+TERMS_FILE = "bm25.terms.json"       # term -> [początek listy, df] + statystyki korpusu
+
+ALL_FILES = (IDS_FILE, LENGTHS_FILE, POSTINGS_FILE, TF_FILE, TERMS_FILE)
+
+# Parametry BM25 (wartości standardowe)
+K1 = 1.2
+B = 0.75
+
+# Polskie słowa bez znaczenia dla wyszukiwania (po usunięciu diakrytyków)
+STOPWORDS = frozenset("""
+a aby ale bez bo by byc byl byla bylo czy co dla do gdy gdzie go i ich ile im jak jaki jakie jako je jego jej jest
+juz ktora ktore ktory ma mam mi mnie mozna na nad nie nim no o od oraz po pod przez przy sa sie so ta tak tam te
+tego tej ten to tu ty tylko u w we wiec za ze zeby
+""".split())
+
+# Końcówki fleksyjne odcinane przed porównaniem (najdłuższe najpierw) - lekki stemmer zamiast słownika
+SUFFIXES = tuple(sorted("""
+owych owego owemu owej owym owa owe owy ami ach ego emu owi ymi imi ich ych iej ej ym im ow om em ie a e i o u y
+""".split(), key=len, reverse=True))
+MIN_STEM = 3     # krótszych rdzeni nie skracamy dalej ("len", "lnu")
+STEM_LENGTH = 6  # dłuższe rdzenie obcinamy (wełniany/wełnianej, poliester/poliestru)
+
+_WORD = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Małe litery bez polskich znaków (ł nie rozkłada się w NFKD, więc osobno)."""
+    text = unicodedata.normalize("NFKD", text.lower().replace("ł", "l"))
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def stem(word: str) -> str:
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            word = word[:-len(suffix)]
+            break
+    return word[:STEM_LENGTH]
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokeny BM25: słowa bez diakrytyków i stopwords, sprowadzone do rdzenia ("wełnę", "wełny" -> "weln")."""
+    tokens = []
+    for word in _WORD.findall(fold(text)):
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        tokens.append(stem(word))
+    return tokens
+
+
+def exists(path: str) -> bool:
+    return os.path.exists(os.path.join(path, TERMS_FILE))
+
+
+class BM25Index:
+    """
+    Odwrócony indeks BM25 mapowany w pamięć (read-only), zapisany przez BM25Writer.
+    Zapytanie czyta tylko listy wystąpień swoich termów - bez embeddingu i bez skanowania korpusu.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, TERMS_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        self.path = path
+        self.version = meta["version"]
+        self.terms: Dict[str, List[int]] = meta["terms"]
+        self._count = meta["count"]
+        self._avgdl = meta["avgdl"] or 1.0
+
+        self._ids = np.load(os.path.join(path, IDS_FILE), mmap_mode="r")
+        self._lengths = np.load(os.path.join(path, LENGTHS_FILE), mmap_mode="r")
+        self._postings = np.load(os.path.join(path, POSTINGS_FILE), mmap_mode="r")
+        self._tf = np.load(os.path.join(path, TF_FILE), mmap_mode="r")
+
+        if len(self._ids) != self._count or len(self._lengths) != self._count or len(self._postings) != len(self._tf):
+            raise ValueError(f"Inconsistent BM25 index at {path}")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def known_terms(self, query: str) -> Tuple[int, int]:
+        """(liczba termów zapytania, ile z nich występuje w korpusie)."""
+        tokens = set(tokenize(query))
+        return len(tokens), sum(1 for t in tokens if t in self.terms)
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[int, float]]:
+        """k najlepszych fragmentów: lista (ID, wynik BM25) malejąco po wyniku."""
+        rows, scores = [], []
+        for term in set(tokenize(query)):
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            start, df = entry
+            postings = self._postings[start:start + df]
+            tf = self._tf[start:start + df].astype(np.float32)
+            idf = math.log(1.0 + (self._count - df + 0.5) / (df + 0.5))
+            norm = K1 * (1.0 - B + B * self._lengths[postings] / self._avgdl)
+            rows.append(postings)
+            scores.append(idf * tf * (K1 + 1.0) / (tf + norm))
+
+        if not rows:
+            return []
+        if len(rows) == 1:
+            unique, totals = np.asarray(rows[0]), scores[0]
+        else:
+            unique, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+            totals = np.bincount(inverse, weights=np.concatenate(scores))
+
+        if len(totals) > k:
+            top = np.argpartition(-totals, k - 1)[:k]
+        else:
+            top = np.arange(len(totals))
+        top = top[np.argsort(-totals[top], kind="stable")]
+        return [(int(self._ids[unique[i]]), float(totals[i])) for i in top]
+
+
+class BM25Writer:
+    """
+    Buduje indeks BM25 strumieniowo (dokument po dokumencie) - w pamięci tylko kolumny liczbowe
+    list wystąpień (~10 bajtów na parę term-fragment) i słownik termów. Interfejs jak DocStoreWriter.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._terms: Dict[str, int] = {}
+        self._ids = array("q")
+        self._lengths = array("i")
+        self._term_ids = array("i")
+        self._rows = array("i")
+        self._tf = array("H")
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, doc_id: int, content: str):
+        row = len(self._ids)
+        tokens = tokenize(content)
+        self._ids.append(doc_id)
+        self._lengths.append(len(tokens))
+
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            self._term_ids.append(self._terms.setdefault(token, len(self._terms)))
+            self._rows.append(row)
+            self._tf.append(min(count, 65535))
+
+    def commit(self):
+        count = len(self._ids)
+        term_ids = np.frombuffer(self._term_ids, dtype=np.int32) if self._term_ids else np.zeros(0, np.int32)
+        # Listy wystąpień pogrupowane po termie; stabilne sortowanie zachowuje rosnące wiersze w liście
+        order = np.argsort(term_ids, kind="stable")
+        df = np.bincount(term_ids, minlength=len(self._terms))
+        starts = np.concatenate([[0], np.cumsum(df)[:-1]]) if len(df) else df
+        lengths = np.frombuffer(self._lengths, dtype=np.int32) if count else np.zeros(0, np.int32)
+
+        columns = {
+            IDS_FILE: np.frombuffer(self._ids, dtype=np.int64) if count else np.zeros(0, np.int64),
+            LENGTHS_FILE: lengths,
+            POSTINGS_FILE: (np.frombuffer(self._rows, dtype=np.int32)[order] if len(order) else np.zeros(0, np.int32)),
+            TF_FILE: (np.frombuffer(self._tf, dtype=np.uint16)[order] if len(order) else np.zeros(0, np.uint16)),
+        }
+        for name, column in columns.items():
+            with open(os.path.join(self.path, name + ".tmp"), "wb") as f:
+                np.save(f, column)
+
+        meta = {
+            "version": VERSION,
+            "count": count,
+            "avgdl": float(lengths.mean()) if count else 0.0,
+            "terms": {term: [int(starts[i]), int(df[i])] for term, i in self._terms.items()},
+        }
+        with open(os.path.join(self.path, TERMS_FILE + ".tmp"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        # Termy na końcu: ich obecność oznacza kompletny indeks
+        for name in ALL_FILES:
+            os.replace(os.path.join(self.path, name + ".tmp"), os.path.join(self.path, name))
+
+    def abort(self):
+        for name in ALL_FILES:
+            tmp = os.path.join(self.path, name + ".tmp")
+            if os.path.exists(tmp):
+                os.remove(tmp)
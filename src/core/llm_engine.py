@@ -1,13 +1,88 @@
 import os
 import json
+import time
+import asyncio
+import threading
+from typing import AsyncIterator, Dict, List, Optional
 from google import genai
 from google.genai import types
 from src.config import Config
-from src.core.rag_engine import get_rag_engine
+from src.core.rag_engine import get_rag_engine, normalize_query
+from src.core.answer_cache import SemanticAnswerCache, context_fingerprint
+from src.core.context_builder import ContextBuilder
+from src.core.sessions import Session, SessionNotFoundError, Turn, create_session_store, new_session_id
 from src.tools.registry import registry
 import src.tools.definitions # Rejestracja narzędzi
-from src.core.guardrails import guardrails, SecurityError
+from src.core.guardrails import guardrails, SecurityError, OUTPUT_BLOCKED_MESSAGE
 from src.utils.logger import logger
+from src.utils.metrics import GEMINI_ERRORS, GEMINI_SECONDS, GEMINI_TOKENS, LLM_TURNS, STAGE_SECONDS
+
+def stream_event(event: str, **data) -> Dict:
+    """Zdarzenie strumienia /ask/stream (zamieniane na SSE w API)."""
+    return {"event": event, "data": data}
+
+def _tool_succeeded(result_data) -> bool:
+    if isinstance(result_data, str) and result_data.startswith("Error executing tool"):
+        return False
+    try:
+        return not (isinstance(result_data, str) and "error" in json.loads(result_data))
+    except (ValueError, TypeError):
+        return True
+
+async def _execute_indexed(index: int, name: str, args):
+    """registry.aexecute z zachowaniem pozycji wywołania (wyniki kończą się w dowolnej kolejności)."""
+    try:
+        return index, await registry.aexecute(name, args)
+    except Exception as e:
+        return index, f"Error executing tool: {str(e)}"
+
+async def _process_batch(engine, queries: List[str], k: int, max_concurrency: Optional[int] = None) -> Dict:
+    """
+    Wspólna obsługa /ask/batch dla LLMEngine i LocalLLMStub:
+    - identyczne pytania (po normalize_query) liczone są raz,
+    - retrieval dla wszystkich jednym search_batch (jedno encode i jedno przeszukanie FAISS)
+      - pojedyncze aprocess_query trafiają potem w cache wyników RAG,
+    - pętle LLM/narzędzi równolegle, najwyżej max_concurrency naraz.
+    Błąd jednego pytania nie przerywa batcha - trafia do jego wyniku.
+    """
+    started = time.perf_counter()
+    keys = [normalize_query(q) for q in queries]
+    texts: Dict[str, str] = {}
+    for query, key in zip(queries, keys):
+        texts.setdefault(key, query)
+    unique = list(texts)
+
+    try:
+        await asyncio.to_thread(engine.rag.search_batch, [texts[key] for key in unique], k)
+    except Exception as e:
+        logger.warning(f"Batch retrieval failed, queries will search one by one: {e}")
+    retrieval_ms = (time.perf_counter() - started) * 1000
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency or Config.ASK_BATCH_CONCURRENCY))
+
+    async def answer(key: str):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                item = {"response": await engine.aprocess_query(texts[key]), "status": "success"}
+            except Exception as e:
+                logger.error(f"Error processing batch query '{texts[key]}': {e}")
+                item = {"response": None, "status": "error", "error": str(e)}
+            item["duration_ms"] = (time.perf_counter() - start) * 1000
+            return key, item
+
+    answers = dict(await asyncio.gather(*(answer(key) for key in unique)))
+
+    results, seen = [], set()
+    for query, key in zip(queries, keys):
+        results.append({"query": query, **answers[key], "deduplicated": key in seen})
+        seen.add(key)
+    return {
+        "results": results,
+        "unique_queries": len(unique),
+        "retrieval_ms": retrieval_ms,
+        "total_ms": (time.perf_counter() - started) * 1000,
+    }
 
 class LLMEngine:
     def __init__(self):
@@ -15,12 +90,46 @@ class LLMEngine:
         if not Config.GOOGLE_API_KEY:
             logger.warning("GOOGLE_API_KEY is missing!")
         
-        self.client = genai.Client(api_key=Config.GOOGLE_API_KEY)
+        # GEMINI_BASE_URL pozwala podpiąć lokalny serwer (benchmarki, testy obciążeniowe)
+        http_options = types.HttpOptions(base_url=Config.GEMINI_BASE_URL) if Config.GEMINI_BASE_URL else None
+        self.client = genai.Client(api_key=Config.GOOGLE_API_KEY, http_options=http_options)
         self.rag = get_rag_engine()
         
         # Przygotowanie narzędzi
         self.tools_list = self._prepare_tools()
 
+        # Instrukcje i schematy narzędzi są stałe - budujemy je raz i wysyłamy jako identyczny prefiks
+        # każdego zapytania (provider może go cache'ować); kontekst RAG idzie do wiadomości użytkownika
+        self.system_prompt = self._build_system_prompt()
+        self.generate_config = self._build_generate_config()
+
+        # Selekcja kontekstu RAG: próg odległości, duplikaty, MMR i budżet tokenów
+        self.context_builder = ContextBuilder(
+            max_chunks=Config.RAG_K_RETRIEVAL,
+            max_distance=Config.CONTEXT_MAX_DISTANCE,
+            duplicate_similarity=Config.CONTEXT_DUPLICATE_SIMILARITY,
+            mmr_lambda=Config.CONTEXT_MMR_LAMBDA,
+            token_budget=Config.CONTEXT_TOKEN_BUDGET
+        )
+
+        # Sesje rozmów (session_id): historia w budżecie tokenów + wyniki narzędzi pobrane w rozmowie
+        self.sessions = create_session_store()
+
+        # Jawny context cache (client.caches) dla stałego prefiksu - odnawiany przed wygaśnięciem
+        self._context_cache_lock = threading.Lock()
+        self._context_cache_config = None
+        self._context_cache_renew_at = 0.0
+
+        # Cache odpowiedzi po znaczeniu pytania (0 wpisów = wyłączony)
+        self.answer_cache = None
+        if Config.ANSWER_CACHE_MAX_ENTRIES > 0:
+            self.answer_cache = SemanticAnswerCache(
+                max_entries=Config.ANSWER_CACHE_MAX_ENTRIES,
+                similarity=Config.ANSWER_CACHE_SIMILARITY,
+                ttl_seconds=Config.ANSWER_CACHE_TTL_SECONDS,
+                weather_ttl_seconds=Config.ANSWER_CACHE_WEATHER_TTL_SECONDS
+            )
+
     def _prepare_tools(self):
         """Konwertuje narzędzia z rejestru na format Google GenAI SDK."""
         tools_schemas = registry.get_tools_definitions()
@@ -38,15 +147,16 @@ class LLMEngine:
         # Pakujemy w jeden obiekt Tool
         return [types.Tool(function_declarations=declarations)]
 
-    def _build_system_prompt(self, rag_context: str) -> str:
-        return f"""
+    def _build_system_prompt(self) -> str:
+        return """
         Jesteś Asystentem Stylistą (AI Stylist).
         
-        WIEDZA Z BAZY (RAG Context):
-        {rag_context}
+        Każda wiadomość użytkownika zaczyna się od sekcji "WIEDZA Z BAZY" (RAG Context) - fragmentów
+        bazy wiedzy wyszukanych dla tego pytania. Po niej jest sekcja "PYTANIE" z pytaniem użytkownika.
         
         INSTRUKCJA:
         1. Jeśli pytanie dotyczy pogody lub wyjazdu -> UŻYJ NARZĘDZIA `get_current_weather`.
+           Jeśli wyjazd obejmuje kilka miast -> UŻYJ JEDNEGO wywołania `get_trip_weather` z listą miast.
         2. Jeśli pytanie dotyczy profilu -> UŻYJ NARZĘDZIA `get_user_style_profile`.
         3. Odpowiedź końcowa ma być zwięzła i po polsku.
         
@@ -58,101 +168,544 @@ class LLMEngine:
         - Nie zmyślaj faktów. Jeśli czegoś nie ma w bazie, napisz ogólną poradę, ale nie cytuj "bazy".
         """
 
-    def process_query(self, user_query: str) -> str:
-        logger.info(f"Processing query: {user_query}")
-        
-        # Guardrails Validation
+    def _build_user_message(self, user_query: str, context: List[str], summary: List[str] = ()) -> str:
+        """Część zmienna: kontekst RAG i pytanie - za stałym prefiksem (instrukcje + narzędzia)."""
+        context_str = "\n".join([f"- {chunk}" for chunk in context]) or "(bez nowych fragmentów)"
+        message = f"WIEDZA Z BAZY (RAG Context):\n{context_str}\n\nPYTANIE:\n{user_query}"
+        if summary:
+            message = "WCZEŚNIEJ W ROZMOWIE:\n" + "\n".join(summary) + "\n\n" + message
+        return message
+
+    def _retrieval_k(self) -> int:
+        """Ile kandydatów pobrać z RAG - selekcja kontekstu wybiera z nich co najwyżej RAG_K_RETRIEVAL."""
+        return max(Config.RAG_K_RETRIEVAL, Config.CONTEXT_CANDIDATES)
+
+    def _select_context(self, user_query: str, rag_results):
+        """Fragmenty, które faktycznie trafią do modelu (patrz ContextBuilder)."""
+        with STAGE_SECONDS.labels("context").time():
+            selection = self.context_builder.build(rag_results, self.rag.chunk_vectors(rag_results))
+        logger.info("Context for '%.200s': %d/%d chunks, %d tokens (%d saved vs top-%d; "
+                    "dropped: %d too far, %d duplicates, %d over budget)",
+                    user_query, len(selection.results), selection.candidates, selection.tokens,
+                    selection.saved_tokens, self.context_builder.max_chunks,
+                    selection.too_far, selection.duplicates, selection.over_budget)
+        return selection.results
+
+    def create_session(self) -> str:
+        """Zakłada pustą sesję i zwraca jej id - tylko takie id są później przyjmowane."""
+        session = Session(new_session_id())
+        self.sessions.save(session)
+        return session.session_id
+
+    def has_session(self, session_id: str) -> bool:
+        return self.sessions.get(session_id) is not None
+
+    def end_session(self, session_id: str) -> bool:
+        return self.sessions.delete(session_id)
+
+    def _open_session(self, session_id: Optional[str]) -> Optional[Session]:
+        if not session_id:
+            return None
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise SessionNotFoundError(session_id)
+        return session
+
+    def _session_turn(self, user_query: str, rag_results, session: Optional[Session]):
+        """
+        (historia dla czatu, wiadomość użytkownika, nowe fragmenty kontekstu).
+        W sesji model dostaje tylko fragmenty RAG, których nie ma jeszcze w historii.
+        """
+        context = [r["content"] for r in rag_results]
+        if session is None:
+            return None, self._build_user_message(user_query, context), context
+
+        seen = session.seen_context()
+        new_context = [chunk for chunk in dict.fromkeys(context) if chunk not in seen]
+        history = []
+        for turn in session.turns:
+            history.append(types.Content(role="user", parts=[
+                types.Part(text=self._build_user_message(turn.question, turn.context))
+            ]))
+            history.append(types.Content(role="model", parts=[types.Part(text=turn.answer)]))
+        message = self._build_user_message(user_query, new_context, summary=session.summary)
+        return history, message, new_context
+
+    def _finish_turn(self, session: Optional[Session], user_query: str, new_context: List[str], answer: str):
+        if session is None:
+            return
+        # Inna tura tej sesji mogła się w międzyczasie zakończyć - dopisujemy do najnowszej wersji, nie do odczytanej
+        with self.sessions.lock(session.session_id):
+            latest = self.sessions.get(session.session_id)
+            if latest is None:
+                # Sesja zakończona (DELETE) albo wygasła w trakcie tury - nie wskrzeszamy jej
+                return
+            if latest is not session:
+                latest.merge_tool_results(session)
+            latest.add_turn(Turn(user_query, new_context, answer),
+                            Config.SESSION_HISTORY_TOKENS, Config.SESSION_SUMMARY_TOKENS)
+            self.sessions.save(latest)
+
+    def _split_cached_tools(self, calls, session: Optional[Session]):
+        """(wyniki z sesji albo None na pozycjach do wykonania, indeksy do wykonania)."""
+        results = [None] * len(calls)
+        if session is not None:
+            for i, (name, args) in enumerate(calls):
+                results[i] = session.cached_tool_result(name, args, Config.SESSION_TOOL_TTL_SECONDS)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if len(missing) < len(calls):
+            logger.info(f"Reusing {len(calls) - len(missing)} tool result(s) from session {session.session_id}")
+        return results, missing
+
+    def _merge_tool_results(self, calls, results, missing, fresh, session: Optional[Session]):
+        for i, result_data in zip(missing, fresh):
+            results[i] = result_data
+            if session is not None and _tool_succeeded(result_data):
+                name, args = calls[i]
+                session.remember_tool_result(name, args, result_data)
+        return results
+
+    def _run_tools(self, calls, session: Optional[Session]):
+        results, missing = self._split_cached_tools(calls, session)
+        if not missing:
+            return results
+        try:
+            fresh = registry.execute_many([calls[i] for i in missing])
+        except Exception as e:
+            fresh = [f"Error executing tool: {str(e)}"] * len(missing)
+        return self._merge_tool_results(calls, results, missing, fresh, session)
+
+    async def _arun_tools(self, calls, session: Optional[Session]):
+        results, missing = self._split_cached_tools(calls, session)
+        if not missing:
+            return results
+        try:
+            fresh = await registry.aexecute_many([calls[i] for i in missing])
+        except Exception as e:
+            fresh = [f"Error executing tool: {str(e)}"] * len(missing)
+        return self._merge_tool_results(calls, results, missing, fresh, session)
+
+    def _check_input(self, user_query: str):
+        """Zwraca komunikat blokady, jeśli zapytanie nie przeszło przez guardrails."""
         try:
             guardrails.validate_input(user_query)
         except SecurityError as e:
             logger.warning(f"Query blocked by guardrails: {str(e)}")
             return "Zablokowano potencjalnie niebezpieczne zapytanie."
-        
-        # 1. RAG Retrieval
-        rag_results = self.rag.search(user_query, k=Config.RAG_K_RETRIEVAL)
-        context_str = "\n".join([f"- {r['content']}" for r in rag_results])
-        
-        # 2. Konfiguracja Generowania
+        return None
+
+    def _build_generate_config(self, cached_content: str = None) -> types.GenerateContentConfig:
         # Używamy prostej konfiguracji. Wyłączamy automat, by spełnić wymóg "pętla call->execute".
-        generate_config = types.GenerateContentConfig(
+        if cached_content:
+            # Instrukcje i narzędzia są już w cache po stronie providera - nie wolno ich wysłać drugi raz
+            return types.GenerateContentConfig(
+                cached_content=cached_content,
+                temperature=0.5,
+                automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=True)
+            )
+        return types.GenerateContentConfig(
             tools=self.tools_list,
-            system_instruction=self._build_system_prompt(context_str),
+            system_instruction=self.system_prompt,
             temperature=0.5,
             automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=True)
         )
 
-        # 3. Inicjalizacja Czatu
+    def _context_cache_due(self) -> bool:
+        return Config.GEMINI_CONTEXT_CACHE and time.monotonic() >= self._context_cache_renew_at
+
+    def _request_config(self) -> types.GenerateContentConfig:
+        """
+        Config zapytania: z uchwytem jawnego context cache, jeśli włączony i dostępny,
+        w przeciwnym razie stały self.generate_config (prefiks dalej identyczny między zapytaniami).
+        """
+        if self._context_cache_due():
+            with self._context_cache_lock:
+                if self._context_cache_due():
+                    self._refresh_context_cache()
+        return self._context_cache_config or self.generate_config
+
+    async def _arequest_config(self) -> types.GenerateContentConfig:
+        # Odnowienie cache to zapytanie HTTP - poza pętlą zdarzeń (zdarza się raz na TTL)
+        if self._context_cache_due():
+            return await asyncio.to_thread(self._request_config)
+        return self._request_config()
+
+    def _refresh_context_cache(self):
+        ttl = Config.GEMINI_CONTEXT_CACHE_TTL_SECONDS
+        try:
+            cache = self.client.caches.create(
+                model=Config.GEMINI_MODEL,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=self.system_prompt,
+                    tools=self.tools_list,
+                    ttl=f"{int(ttl)}s",
+                    display_name="ai-stylist-static-prefix"
+                )
+            )
+        except Exception as e:
+            # Np. model bez context cache albo prefiks poniżej minimalnej liczby tokenów - spróbujemy po TTL
+            logger.warning(f"Context cache unavailable, sending full prefix: {e}")
+            self._context_cache_config = None
+            self._context_cache_renew_at = time.monotonic() + ttl
+            return
+
+        logger.info(f"Context cache created: {cache.name}")
+        self._context_cache_config = self._build_generate_config(cached_content=cache.name)
+        # Nowy uchwyt zanim stary wygaśnie (trwające rozmowy dokończą na starym)
+        self._context_cache_renew_at = time.monotonic() + ttl * 0.8
+
+    def _extract_function_calls(self, response):
+        """
+        Zwraca (lista function_call, komunikat końcowy, czy komunikat to odpowiedź modelu).
+        Komunikat jest ustawiony, gdy pętla ma się zakończyć (błąd albo zwykły tekst).
+        """
+        # Sprawdzenie czy są kandydaci odpowiedzi
+        if not response.candidates:
+            return [], "Błąd: Model nie zwrócił odpowiedzi.", False
+        
+        # Pobranie contentu (bezpiecznie)
+        content = response.candidates[0].content
+        if not content or not content.parts:
+            # Jeśli content jest pusty, sprawdźmy powód
+            finish_reason = response.candidates[0].finish_reason
+            return [], f"Model zakończył bez treści. Powód: {finish_reason}", False
+
+        # Sprawdzenie czy model chce użyć funkcji
+        executable_calls = [part.function_call for part in content.parts if part.function_call]
+        if executable_calls:
+            return executable_calls, None, False
+
+        # Zwykły Tekst (Koniec)
+        return [], guardrails.validate_output(response.text), True
+
+    def _answer_cache_key(self, user_query: str, rag_results):
+        """
+        (embedding pytania, odcisk kontekstu RAG). Embedding tylko z cache RagEngine - bez wywołania modelu
+        (po wyszukiwaniu leksykalnym go nie ma i cache porównuje same słowa pytania).
+        """
+        return self.rag.cached_query_vector(user_query), context_fingerprint(rag_results)
+
+    def _cached_answer(self, user_query: str, cache_key):
+        """Odpowiedź z cache albo None. Zapisane wyniki narzędzi są aktualne, dopóki wpis nie wygasł."""
+        entry = self.answer_cache.match(user_query, *cache_key)
+        if entry is None:
+            return None
+        answer = self.answer_cache.confirm(entry)
+        if answer is not None:
+            logger.info("Answer cache hit for '%.200s' (cached query: '%.200s')", user_query, entry.query)
+        return answer
+
+    def _remember_answer(self, user_query: str, cache_key, tool_calls, tool_results, answer: str):
+        # Odpowiedź zbudowana na błędzie narzędzia nie trafia do cache - trafienie nie ponawia narzędzi
+        if cache_key is not None and all(_tool_succeeded(result) for result in tool_results):
+            self.answer_cache.store(user_query, *cache_key, tool_calls, answer)
+
+    @staticmethod
+    def _count_tokens(usage):
+        """Zużycie tokenów tury (usage_metadata odpowiedzi) do licznika GEMINI_TOKENS."""
+        if usage is None:
+            return
+        GEMINI_TOKENS.labels("prompt").inc(usage.prompt_token_count or 0)
+        GEMINI_TOKENS.labels("cached").inc(usage.cached_content_token_count or 0)
+        GEMINI_TOKENS.labels("output").inc(usage.candidates_token_count or 0)
+
+    def _send(self, chat, message):
+        """Jedna tura rozmowy z Gemini (czas, błędy i tokeny trafiają do metryk)."""
+        with GEMINI_SECONDS.labels("sync").time():
+            try:
+                response = chat.send_message(message)
+            except Exception:
+                GEMINI_ERRORS.labels("sync").inc()
+                raise
+        self._count_tokens(response.usage_metadata)
+        return response
+
+    async def _asend(self, chat, message):
+        with GEMINI_SECONDS.labels("async").time():
+            try:
+                response = await chat.send_message(message)
+            except Exception:
+                GEMINI_ERRORS.labels("async").inc()
+                raise
+        self._count_tokens(response.usage_metadata)
+        return response
+
+    def _function_response_part(self, f_name: str, result_data) -> types.Part:
+        # Przygotowanie odpowiedzi dla modelu
+        return types.Part.from_function_response(
+            name=f_name,
+            response={"result": result_data}
+        )
+
+    def process_query(self, user_query: str, session_id: Optional[str] = None) -> str:
+        logger.info("Processing query: %.200s", user_query)
+        
+        # Guardrails Validation
+        blocked = self._check_input(user_query)
+        if blocked:
+            return blocked
+        
+        # 1. RAG Retrieval
+        rag_results = self._select_context(user_query, self.rag.search(user_query, k=self._retrieval_k()))
+        session = self._open_session(session_id)
+        history, message, new_context = self._session_turn(user_query, rag_results, session)
+
+        # 1b. Cache odpowiedzi: podobne pytanie i ten sam kontekst -> bez Gemini (i bez ponawiania narzędzi)
+        # (tylko bez historii - w rozmowie odpowiedź zależy też od wcześniejszych tur)
+        cache_key = None
+        if self.answer_cache is not None and (session is None or session.empty):
+            cache_key = self._answer_cache_key(user_query, rag_results)
+            cached = self._cached_answer(user_query, cache_key)
+            if cached is not None:
+                self._finish_turn(session, user_query, new_context, cached)
+                return cached
+        
+        # 2. Konfiguracja Generowania (stały prefiks, budowany raz)
+        generate_config = self._request_config()
+
+        # 3. Inicjalizacja Czatu (z historią sesji, jeśli jest)
         chat = self.client.chats.create(
             model=Config.GEMINI_MODEL,
-            config=generate_config
+            config=generate_config,
+            history=history
         )
 
-        # 4. Wysłanie wiadomości
+        # 4. Wysłanie wiadomości (kontekst RAG + pytanie)
         try:
-            response = chat.send_message(user_query)
+            response = self._send(chat, message)
         except Exception as e:
             return f"Błąd API Gemini: {str(e)}"
 
         # 5. Pętla Obsługi Narzędzi (Manual Dispatcher Loop)
         max_turns = 5
         turn = 0
+        tool_calls, tool_results = [], []
 
         while turn < max_turns:
-            # Sprawdzenie czy są kandydaci odpowiedzi
-            if not response.candidates:
-                return "Błąd: Model nie zwrócił odpowiedzi."
-            
-            # Pobranie contentu (bezpiecznie)
-            content = response.candidates[0].content
-            if not content or not content.parts:
-                # Jeśli content jest pusty, sprawdźmy powód
-                finish_reason = response.candidates[0].finish_reason
-                return f"Model zakończył bez treści. Powód: {finish_reason}"
-
-            # Sprawdzenie czy model chce użyć funkcji
-            executable_calls = []
-            for part in content.parts:
-                if part.function_call:
-                    executable_calls.append(part.function_call)
+            executable_calls, final_text, answered = self._extract_function_calls(response)
+
+            # SCENARIUSZ B: Zwykły Tekst albo błąd (Koniec)
+            if not executable_calls:
+                LLM_TURNS.observe(turn + 1)
+                if answered:
+                    self._remember_answer(user_query, cache_key, tool_calls, tool_results, final_text)
+                    self._finish_turn(session, user_query, new_context, final_text)
+                return final_text
 
             # SCENARIUSZ A: Wykonanie Funkcji
-            if executable_calls:
-                parts_to_send = []
-                for call in executable_calls:
-                    f_name = call.name
-                    f_args = call.args # To jest już słownik (dict)
-                    
-                    logger.info(f"AI requested tool: {f_name} with args: {f_args}")
-                    
-                    # --- DISPATCHER (Wykonanie + Bezpieczeństwo) ---
-                    try:
-                        result_data = registry.execute(f_name, f_args)
-                    except Exception as e:
-                        result_data = f"Error executing tool: {str(e)}"
-                    
-                    # Przygotowanie odpowiedzi dla modelu
-                    parts_to_send.append(
-                        types.Part.from_function_response(
-                            name=f_name,
-                            response={"result": result_data}
-                        )
-                    )
-
-                # Odesłanie wyników do modelu -> model wygeneruje kolejną odpowiedź
-                try:
-                    response = chat.send_message(parts_to_send)
-                except Exception as e:
-                    return f"Błąd podczas odsyłania wyników: {str(e)}"
-                
-                turn += 1
-                continue # Wracamy na początek pętli
-
-            # SCENARIUSZ B: Zwykły Tekst (Koniec)
-            else:
-                return guardrails.validate_output(response.text)
+            for call in executable_calls:
+                logger.info("AI requested tool: %s with args: %.200s", call.name, call.args)
 
+            # --- DISPATCHER (Wykonanie + Bezpieczeństwo) ---
+            # Niezależne wywołania z jednej tury idą do puli równolegle: tura trwa tyle, co najwolniejsze narzędzie
+            # (wyniki pobrane już w tej sesji są brane z niej)
+            calls = [(call.name, call.args) for call in executable_calls]  # args to już słownik (dict)
+            results = self._run_tools(calls, session)
+            tool_calls.extend(calls)
+            tool_results.extend(results)
+            
+            parts_to_send = [
+                self._function_response_part(f_name, result_data)
+                for (f_name, _), result_data in zip(calls, results)
+            ]
+
+            # Odesłanie wyników do modelu -> model wygeneruje kolejną odpowiedź
+            try:
+                response = self._send(chat, parts_to_send)
+            except Exception as e:
+                return f"Błąd podczas odsyłania wyników: {str(e)}"
+            
+            turn += 1
+
+        LLM_TURNS.observe(turn + 1)
+        return "Przekroczono limit pętli wywołań."
+
+    async def aprocess_query(self, user_query: str, session_id: Optional[str] = None) -> str:
+        """
+        Asynchroniczna wersja process_query: nie blokuje pętli zdarzeń.
+        Embedding idzie do wątku, Gemini przez klienta `client.aio`, narzędzia przez registry.aexecute.
+        """
+        logger.info("Processing query (async): %.200s", user_query)
+        
+        blocked = self._check_input(user_query)
+        if blocked:
+            return blocked
+        
+        rag_results = self._select_context(user_query, await self.rag.asearch(user_query, k=self._retrieval_k()))
+        session = self._open_session(session_id)
+        history, message, new_context = self._session_turn(user_query, rag_results, session)
+
+        cache_key = None
+        if self.answer_cache is not None and (session is None or session.empty):
+            cache_key = self._answer_cache_key(user_query, rag_results)
+            cached = self._cached_answer(user_query, cache_key)
+            if cached is not None:
+                self._finish_turn(session, user_query, new_context, cached)
+                return cached
+
+        generate_config = await self._arequest_config()
+
+        chat = self.client.aio.chats.create(
+            model=Config.GEMINI_MODEL,
+            config=generate_config,
+            history=history
+        )
+
+        try:
+            response = await self._asend(chat, message)
+        except Exception as e:
+            return f"Błąd API Gemini: {str(e)}"
+
+        max_turns = 5
+        turn = 0
+        tool_calls, tool_results = [], []
+
+        while turn < max_turns:
+            executable_calls, final_text, answered = self._extract_function_calls(response)
+            if not executable_calls:
+                LLM_TURNS.observe(turn + 1)
+                if answered:
+                    self._remember_answer(user_query, cache_key, tool_calls, tool_results, final_text)
+                    self._finish_turn(session, user_query, new_context, final_text)
+                return final_text
+
+            for call in executable_calls:
+                logger.info("AI requested tool: %s with args: %.200s", call.name, call.args)
+
+            calls = [(call.name, call.args) for call in executable_calls]
+            results = await self._arun_tools(calls, session)
+            tool_calls.extend(calls)
+            tool_results.extend(results)
+
+            parts_to_send = [
+                self._function_response_part(f_name, result_data)
+                for (f_name, _), result_data in zip(calls, results)
+            ]
+
+            try:
+                response = await self._asend(chat, parts_to_send)
+            except Exception as e:
+                return f"Błąd podczas odsyłania wyników: {str(e)}"
+            
+            turn += 1
+
+        LLM_TURNS.observe(turn + 1)
         return "Przekroczono limit pętli wywołań."
 
+    async def astream_query(self, user_query: str, session_id: Optional[str] = None) -> AsyncIterator[Dict]:
+        """
+        Strumieniowa wersja aprocess_query (dla SSE). Zdarzenia w kolejności wykonania:
+        retrieval -> tool_start/tool_end -> token ... -> done (albo blocked/error).
+        Guardrails wyjścia są sprawdzane przyrostowo na każdym fragmencie tekstu.
+        """
+        logger.info("Processing query (stream): %.200s", user_query)
+
+        blocked = self._check_input(user_query)
+        if blocked:
+            yield stream_event("error", message=blocked)
+            return
+
+        rag_results = self._select_context(user_query, await self.rag.asearch(user_query, k=self._retrieval_k()))
+        yield stream_event("retrieval", chunks=len(rag_results), sources=sorted({r["source"] for r in rag_results}))
+        session = self._open_session(session_id)
+        history, message, new_context = self._session_turn(user_query, rag_results, session)
+
+        cache_key = None
+        if self.answer_cache is not None and (session is None or session.empty):
+            cache_key = self._answer_cache_key(user_query, rag_results)
+            cached = self._cached_answer(user_query, cache_key)
+            if cached is not None:
+                self._finish_turn(session, user_query, new_context, cached)
+                yield stream_event("token", text=cached)
+                yield stream_event("done", response=cached)
+                return
+
+        chat = self.client.aio.chats.create(
+            model=Config.GEMINI_MODEL,
+            config=await self._arequest_config(),
+            history=history
+        )
+
+        guard = guardrails.output_stream()
+        answer = []
+        max_turns = 5
+        tool_calls, tool_results = [], []
+
+        for turn in range(max_turns + 1):
+            executable_calls = []
+            usage = None
+            started = time.perf_counter()
+            try:
+                async for chunk in await chat.send_message_stream(message):
+                    # Pełne usage_metadata niesie ostatni fragment tury
+                    usage = chunk.usage_metadata or usage
+                    if not chunk.candidates or not chunk.candidates[0].content:
+                        continue
+                    for part in chunk.candidates[0].content.parts or []:
+                        if part.function_call:
+                            executable_calls.append(part.function_call)
+                        elif part.text and not part.thought:
+                            safe = guard.push(part.text)
+                            if guard.blocked:
+                                logger.warning(f"Streamed answer blocked by guardrails: '{guard.match.pattern}'")
+                                yield stream_event("blocked", message=OUTPUT_BLOCKED_MESSAGE)
+                                return
+                            if safe:
+                                answer.append(safe)
+                                yield stream_event("token", text=safe)
+            except Exception as e:
+                GEMINI_ERRORS.labels("stream").inc()
+                prefix = "Błąd API Gemini" if turn == 0 else "Błąd podczas odsyłania wyników"
+                yield stream_event("error", message=f"{prefix}: {str(e)}")
+                return
+            finally:
+                # Cała tura strumienia (do ostatniego fragmentu), razem z wysyłaniem tokenów do klienta
+                GEMINI_SECONDS.labels("stream").observe(time.perf_counter() - started)
+                self._count_tokens(usage)
+
+            if not executable_calls:
+                LLM_TURNS.observe(turn + 1)
+                rest = guard.flush()
+                if rest:
+                    answer.append(rest)
+                    yield stream_event("token", text=rest)
+                self._remember_answer(user_query, cache_key, tool_calls, tool_results, "".join(answer))
+                self._finish_turn(session, user_query, new_context, "".join(answer))
+                yield stream_event("done", response="".join(answer))
+                return
+
+            if turn == max_turns:
+                LLM_TURNS.observe(turn + 1)
+                break
+
+            calls = [(call.name, call.args) for call in executable_calls]
+            for name, args in calls:
+                logger.info("AI requested tool: %s with args: %.200s", name, args)
+                yield stream_event("tool_start", name=name, args=args)
+
+            # Narzędzia równolegle; tool_end wysyłamy w kolejności zakończenia (wyniki z sesji od razu)
+            results, missing = self._split_cached_tools(calls, session)
+            for index, result_data in enumerate(results):
+                if result_data is not None:
+                    yield stream_event("tool_end", name=calls[index][0], ok=True)
+            pending = [_execute_indexed(i, *calls[i]) for i in missing]
+            for finished in asyncio.as_completed(pending):
+                index, result_data = await finished
+                self._merge_tool_results(calls, results, [index], [result_data], session)
+                yield stream_event("tool_end", name=calls[index][0], ok=_tool_succeeded(result_data))
+            tool_calls.extend(calls)
+            tool_results.extend(results)
+
+            message = [
+                self._function_response_part(f_name, result_data)
+                for (f_name, _), result_data in zip(calls, results)
+            ]
+
+        yield stream_event("error", message="Przekroczono limit pętli wywołań.")
+
+    async def aprocess_batch(self, queries: List[str], max_concurrency: Optional[int] = None) -> Dict:
+        """Wiele niezależnych pytań naraz (bez sesji) - patrz _process_batch."""
+        return await _process_batch(self, queries, self._retrieval_k(), max_concurrency)
 
 # --- PLAN B: LOCAL STUB (GWARANCJA DZIAŁANIA) ---
 # src/core/llm_engine.py (tylko klasa LocalLLMStub na dole pliku)
@@ -162,12 +715,13 @@ class LocalLLMStub:
         logger.info("Odpalam Local Stub LLM (tryb offline)")
         self.rag = get_rag_engine()
 
-    def process_query(self, user_query: str) -> str:
-        logger.info(f"[STUB] Przetwarzam: {user_query}")
-
-        # RAG – niby po coś jest
-        _ = self.rag.search(user_query, k=2)
+    _FALLBACK = (
+        "[offline] Nie kumam. "
+        "Napisz normalnie typu 'co na siebie w krakowie jutro' albo 'pogoda w warszawie i co ubrać'"
+    )
 
+    def _plan(self, user_query: str):
+        """Wybiera narzędzie (nazwa, argumenty) na podstawie słów kluczowych. (None, {}) = brak."""
         q = user_query.lower()
 
         weather_keywords = {"pogoda", "ubrać", "ubrac", "jadę", "jade", "wyjazd", "zimno", "ciepło", "w co", "co na siebie"}
@@ -181,76 +735,133 @@ class LocalLLMStub:
             elif any(x in q for x in ["kraków", "krakow"]):     city = "Kraków"
             elif any(x in q for x in ["londyn", "london"]):     city = "London"
             elif any(x in q for x in ["paryż", "paris"]):       city = "Paris"
+            return "get_current_weather", {"city": city}
 
-            try:
-                weather_json = registry.execute("get_current_weather", {"city": city})
-                # registry.execute zwraca string JSON, musimy go sparsować
-                if isinstance(weather_json, str):
-                    weather = json.loads(weather_json)
-                else:
-                    weather = weather_json
-
-                if not isinstance(weather, dict):
-                    return f"[offline] Pogoda się obraziła i nie chce przyjść: {weather}"
-
-                # Fix: mapowanie kluczy z narzędzia (temperature_c) na zmienne
-                temp = weather.get('temperature_c', 15)
-                
-                # Budujemy opis tekstowy dla logiki poniżej
-                desc_parts = []
-                if weather.get('is_raining'): desc_parts.append("deszcz")
-                if weather.get('is_snowing'): desc_parts.append("śnieg")
-                desc = ", ".join(desc_parts).lower()
-
-                # Do wyświetlania
-                wind_speed = weather.get('wind_speed_kmh', 0)
-                rain_status = "pada" if weather.get('is_raining') else "nie pada"
-
-                if temp <= 0:
-                    advice = "antarktyda na sterydach. Gruba puchówka, czapka na uszy, szalik do pasa i rękawice – inaczej zamarzniesz."
-                elif temp <= 10:
-                    advice = "zimno jak w lodówce. Kurtka zimowa albo gruba przejściówka + coś na szyję, bo gardło od razu cię zaboli."
-                elif temp <= 18:
-                    advice = "typowa polska „nie wiem w co się ubrać”. Lżejsza kurtka albo bomberka, pod spód bluza albo hoodie. Jak pada to biadolenie, że mokro."
-                elif temp < 25:
-                    advice = "w sam raz na życie. Bluza, t-shirt, jeansy, trampki albo sneakersy. Słońce? Nawet bez bluzy dasz radę."
-                elif temp < 30:
-                    advice = "już robi się gorąco. Krótkie spodenki, t-shirt, japonki albo sandały. Len albo bawełna, syntetyki śmierdzą po 15 minutach."
-                else:
-                    advice = "piekło na ziemi. Najcieńsze, najjaśniejsze szmaty jakie masz. I serio – pij wodę, bo padniesz po 10 minutach na słońcu."
-
-                if "deszcz" in desc:
-                    advice += " Aha i leje. Parasol albo kurtka z kapturem, bo inaczej wrócisz jak zmokły pies."
-                elif "śnieg" in desc:
-                    advice += " Śnieg leci. Buty z membraną albo chociaż grubsze, bo mokre skarpety to dramat."
-
-                # Budujemy strukturę odpowiedzi JSON
-                response_data = {
-                    "type": "weather_advice",
-                    "weather": {
-                        "city": city,
-                        "temperature": f"{temp}°C",
-                        "rain_status": rain_status,
-                        "wind_speed": f"{wind_speed} km/h"
-                    },
-                    "advice": f"Stylista radzi: {advice}"
-                }
-                
-                return guardrails.validate_output(json.dumps(response_data, ensure_ascii=False))
+        elif any(kw in q for kw in profile_keywords):
+            return "get_user_style_profile", {"user_id": "jan"}
 
-            except Exception as e:
-                return f"[offline] Pogoda się zepsuła w API: {e}"
+        return None, {}
 
-        elif any(kw in q for kw in profile_keywords):
-            profile_json = registry.execute("get_user_style_profile", {"user_id": "jan"})
-            if isinstance(profile_json, str):
-                profile = json.loads(profile_json)
+    def _respond(self, tool_name: str, tool_args: dict, tool_output) -> str:
+        if tool_name == "get_current_weather":
+            return self._weather_advice(tool_args["city"], tool_output)
+        return self._profile_answer(tool_output)
+
+    def _weather_advice(self, city: str, weather_json) -> str:
+        try:
+            # registry.execute zwraca string JSON, musimy go sparsować
+            if isinstance(weather_json, str):
+                weather = json.loads(weather_json)
             else:
-                profile = profile_json
+                weather = weather_json
+
+            if not isinstance(weather, dict):
+                return f"[offline] Pogoda się obraziła i nie chce przyjść: {weather}"
+
+            # Fix: mapowanie kluczy z narzędzia (temperature_c) na zmienne
+            temp = weather.get('temperature_c', 15)
             
-            return guardrails.validate_output(f"[offline] Twój vibe to: {profile}. Jak będziesz w czymś totalnie nie w Twoim stylu, to ja nie ratuję reputacji.")
+            # Budujemy opis tekstowy dla logiki poniżej
+            desc_parts = []
+            if weather.get('is_raining'): desc_parts.append("deszcz")
+            if weather.get('is_snowing'): desc_parts.append("śnieg")
+            desc = ", ".join(desc_parts).lower()
+
+            # Do wyświetlania
+            wind_speed = weather.get('wind_speed_kmh', 0)
+            rain_status = "pada" if weather.get('is_raining') else "nie pada"
+
+            if temp <= 0:
+                advice = "antarktyda na sterydach. Gruba puchówka, czapka na uszy, szalik do pasa i rękawice – inaczej zamarzniesz."
+            elif temp <= 10:
+                advice = "zimno jak w lodówce. Kurtka zimowa albo gruba przejściówka + coś na szyję, bo gardło od razu cię zaboli."
+            elif temp <= 18:
+                advice = "typowa polska „nie wiem w co się ubrać”. Lżejsza kurtka albo bomberka, pod spód bluza albo hoodie. Jak pada to biadolenie, że mokro."
+            elif temp < 25:
+                advice = "w sam raz na życie. Bluza, t-shirt, jeansy, trampki albo sneakersy. Słońce? Nawet bez bluzy dasz radę."
+            elif temp < 30:
+                advice = "już robi się gorąco. Krótkie spodenki, t-shirt, japonki albo sandały. Len albo bawełna, syntetyki śmierdzą po 15 minutach."
+            else:
+                advice = "piekło na ziemi. Najcieńsze, najjaśniejsze szmaty jakie masz. I serio – pij wodę, bo padniesz po 10 minutach na słońcu."
+
+            if "deszcz" in desc:
+                advice += " Aha i leje. Parasol albo kurtka z kapturem, bo inaczej wrócisz jak zmokły pies."
+            elif "śnieg" in desc:
+                advice += " Śnieg leci. Buty z membraną albo chociaż grubsze, bo mokre skarpety to dramat."
+
+            # Budujemy strukturę odpowiedzi JSON
+            response_data = {
+                "type": "weather_advice",
+                "weather": {
+                    "city": city,
+                    "temperature": f"{temp}°C",
+                    "rain_status": rain_status,
+                    "wind_speed": f"{wind_speed} km/h"
+                },
+                "advice": f"Stylista radzi: {advice}"
+            }
+            
+            return guardrails.validate_output(json.dumps(response_data, ensure_ascii=False))
+
+        except Exception as e:
+            return f"[offline] Pogoda się zepsuła w API: {e}"
+
+    def _profile_answer(self, profile_json) -> str:
+        if isinstance(profile_json, str):
+            profile = json.loads(profile_json)
+        else:
+            profile = profile_json
+        
+        return guardrails.validate_output(f"[offline] Twój vibe to: {profile}. Jak będziesz w czymś totalnie nie w Twoim stylu, to ja nie ratuję reputacji.")
+
+    # session_id przyjmowany dla zgodności z LLMEngine - stub nie prowadzi rozmowy (brak historii)
+    def process_query(self, user_query: str, session_id: Optional[str] = None) -> str:
+        logger.info("[STUB] Przetwarzam: %.200s", user_query)
+
+        # RAG – niby po coś jest
+        _ = self.rag.search(user_query, k=2)
+
+        tool_name, tool_args = self._plan(user_query)
+        if tool_name is None:
+            return self._FALLBACK
+
+        tool_output = registry.execute(tool_name, tool_args)
+        return self._respond(tool_name, tool_args, tool_output)
+
+    async def aprocess_query(self, user_query: str, session_id: Optional[str] = None) -> str:
+        logger.info("[STUB] Przetwarzam (async): %.200s", user_query)
+
+        _ = await self.rag.asearch(user_query, k=2)
+
+        tool_name, tool_args = self._plan(user_query)
+        if tool_name is None:
+            return self._FALLBACK
+
+        tool_output = await registry.aexecute(tool_name, tool_args)
+        return self._respond(tool_name, tool_args, tool_output)
+
+    async def astream_query(self, user_query: str, session_id: Optional[str] = None) -> AsyncIterator[Dict]:
+        """Strumień zdarzeń jak w LLMEngine.astream_query (odpowiedź stuba przychodzi w jednym kawałku)."""
+        logger.info("[STUB] Przetwarzam (stream): %.200s", user_query)
+
+        rag_results = await self.rag.asearch(user_query, k=2)
+        yield stream_event("retrieval", chunks=len(rag_results), sources=sorted({r["source"] for r in rag_results}))
+
+        tool_name, tool_args = self._plan(user_query)
+        if tool_name is None:
+            answer = self._FALLBACK
+        else:
+            yield stream_event("tool_start", name=tool_name, args=tool_args)
+            tool_output = await registry.aexecute(tool_name, tool_args)
+            yield stream_event("tool_end", name=tool_name, ok=_tool_succeeded(tool_output))
+            answer = self._respond(tool_name, tool_args, tool_output)
+
+        if answer == OUTPUT_BLOCKED_MESSAGE:
+            yield stream_event("blocked", message=answer)
+            return
+        yield stream_event("token", text=answer)
+        yield stream_event("done", response=answer)
 
-        return (
-            "[offline] Nie kumam. "
-            "Napisz normalnie typu 'co na siebie w krakowie jutro' albo 'pogoda w warszawie i co ubrać'"
-        )
\ No newline at end of file
+    async def aprocess_batch(self, queries: List[str], max_concurrency: Optional[int] = None) -> Dict:
+        # k=2 jak w pojedynczych zapytaniach stuba - wtedy trafiają w cache wyników z search_batch
+        return await _process_batch(self, queries, 2, max_concurrency)
@@ -0,0 +1,200 @@
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class PatternMatch(NamedTuple):
+    start: int
+    end: int
+    pattern: str
+
+
+def _lower(text: str) -> Tuple[str, Optional[List[int]]]:
+    """
+    text.lower() i mapa pozycji: indeks znaku w małych literach -> indeks znaku w oryginale.
+    Mapa powstaje tylko, gdy któryś znak zmienia długość (np. "İ" -> "i̇"); inaczej pozycje są te same (None).
+    """
+    lower = text.lower()
+    if len(lower) == len(text):
+        return lower, None
+    parts, offsets = [], []
+    for i, ch in enumerate(text):
+        part = ch.lower()
+        parts.append(part)
+        offsets.extend([i] * len(part))
+    return "".join(parts), offsets
+
+
+def _match(offsets: Optional[List[int]], start: int, end: int, pattern: str) -> PatternMatch:
+    """Dopasowanie z pozycjami przeliczonymi na oryginalny tekst."""
+    if offsets is None:
+        return PatternMatch(start, end, pattern)
+    return PatternMatch(offsets[start], offsets[end - 1] + 1, pattern)
+
+
+class PatternMatcher:
+    """
+    Automat Aho-Corasick dla wielu fraz naraz.
+
+    Budowany raz (O(suma długości wzorców)), a skan tekstu to jedno przejście
+    O(długość tekstu + liczba dopasowań), niezależnie od liczby wzorców.
+    Dopasowanie jest niewrażliwe na wielkość liter (tekst i wzorce przez .lower()),
+    a pozycje w PatternMatch zawsze odnoszą się do oryginalnego tekstu.
+
+    Dla małych zbiorów (<= SMALL_SET_SIZE) C-owe str.find na każdym wzorcu jest szybsze niż
+    przejście automatu w Pythonie, więc skan idzie tą ścieżką (wynik jest identyczny).
+    """
+
+    SMALL_SET_SIZE = 64
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = list(dict.fromkeys(p.lower() for p in patterns if p and p.strip()))
+        self.max_length = max((len(p) for p in self.patterns), default=0)
+
+        # Węzeł = indeks w listach; 0 to korzeń
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def _build(self):
+        for pattern_id, pattern in enumerate(self.patterns):
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][ch] = nxt
+                node = nxt
+            self._out[node].append(pattern_id)
+
+        # BFS: linki porażki + scalanie wyjść (wzorce będące sufiksami innych)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                if self._out[self._fail[child]]:
+                    self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def _step(self, state: int, ch: str) -> int:
+        goto = self._goto
+        while state and ch not in goto[state]:
+            state = self._fail[state]
+        return goto[state].get(ch, 0)
+
+    def find_all(self, text: str) -> List[PatternMatch]:
+        """Wszystkie (także nakładające się) dopasowania wraz z pozycjami w tekście."""
+        if not text or not self.patterns:
+            return []
+        lower, offsets = _lower(text)
+        if len(self.patterns) <= self.SMALL_SET_SIZE:
+            matches = self._find_small(lower)
+            return matches if offsets is None else [_match(offsets, *m) for m in matches]
+
+        matches = []
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(lower):
+            # _step() wpisane w pętlę - to najgorętszy fragment skanu
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern_id in out[state]:
+                pattern = self.patterns[pattern_id]
+                matches.append(_match(offsets, i - len(pattern) + 1, i + 1, pattern))
+        return matches
+
+    def search(self, text: str) -> Optional[PatternMatch]:
+        """Pierwsze (kończące się najwcześniej) dopasowanie albo None - przerywa skan od razu."""
+        if not text or not self.patterns:
+            return None
+        lower, offsets = _lower(text)
+        if len(self.patterns) <= self.SMALL_SET_SIZE:
+            best = self._search_small(lower)
+            return best if best is None or offsets is None else _match(offsets, *best)
+
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(lower):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                pattern = self.patterns[out[state][0]]
+                return _match(offsets, i - len(pattern) + 1, i + 1, pattern)
+        return None
+
+    def scanner(self) -> "StreamScanner":
+        """Skaner strumieniowy: stan automatu przechodzi między kolejnymi fragmentami tekstu."""
+        return StreamScanner(self)
+
+    def _find_small(self, lower: str) -> List[PatternMatch]:
+        matches = []
+        for pattern in self.patterns:
+            i = lower.find(pattern)
+            while i != -1:
+                matches.append(PatternMatch(i, i + len(pattern), pattern))
+                i = lower.find(pattern, i + 1)
+        # Ta sama kolejność co w automacie: po końcu dopasowania, dłuższe pierwsze
+        return sorted(matches, key=lambda m: (m.end, m.start))
+
+    def _search_small(self, lower: str) -> Optional[PatternMatch]:
+        best = None
+        for pattern in self.patterns:
+            i = lower.find(pattern)
+            if i != -1 and (best is None or (i + len(pattern), i) < (best.end, best.start)):
+                best = PatternMatch(i, i + len(pattern), pattern)
+        return best
+
+
+class StreamScanner:
+    """
+    Przyrostowy skan tekstu podawanego kawałkami (np. tokeny z modelu).
+    Wykrywa także frazy rozcięte między fragmentami; pozycje są liczone względem całego
+    (oryginalnego) strumienia.
+    """
+
+    def __init__(self, matcher: PatternMatcher):
+        self._matcher = matcher
+        self._state = 0
+        self.position = 0
+        # Pozycje w oryginale ostatnich znaków po .lower() - tyle, ile ma najdłuższy wzorzec
+        self._origins = deque(maxlen=max(matcher.max_length, 1))
+
+    def feed(self, chunk: str) -> List[PatternMatch]:
+        matcher = self._matcher
+        matches = []
+        state = self._state
+        for ch in chunk:
+            for lower in ch.lower():
+                state = matcher._step(state, lower)
+                self._origins.append(self.position)
+                for pattern_id in matcher._out[state]:
+                    pattern = matcher.patterns[pattern_id]
+                    matches.append(PatternMatch(self._origins[-len(pattern)], self.position + 1, pattern))
+            self.position += 1
+        self._state = state
+        return matches
+
+
+def load_patterns(paths: Iterable[str]) -> List[str]:
+    """Wczytuje wzorce z plików tekstowych: jedna fraza na linię, '#' to komentarz."""
+    patterns = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    patterns.append(line)
+    return patterns
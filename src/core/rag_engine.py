@@ -1,70 +1,486 @@
 # src/core/rag_engine.py
+import asyncio
+import itertools
 import os
 import pickle
-from typing import List, Dict
+import threading
+import time
+import unicodedata
+from typing import Any, List, Dict, NamedTuple, Optional
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import faiss
 from src.config import Config
+from src.core.batching import QueryBatcher
+from src.core import doc_store, lexical
+from src.core.generations import LEGACY, current_generation, generation_path
+from src.core.vector_index import enable_reconstruction, index_type_of, set_search_params
+from src.utils.cache import LRUCache
 from src.utils.logger import logger
+from src.utils.metrics import STAGE_SECONDS
+
+# Tryby wyszukiwania (Config.RAG_SEARCH_MODE albo parametr mode)
+VECTOR = "vector"    # FAISS na embeddingu zapytania
+LEXICAL = "lexical"  # tylko odwrócony indeks BM25 - bez wywołania modelu embeddingów
+HYBRID = "hybrid"    # obie listy kandydatów połączone reciprocal-rank fusion
+AUTO = "auto"        # lexical dla krótkich zapytań ze znanymi termami, w pozostałych przypadkach hybrid
+
+SEARCH_MODES = (VECTOR, LEXICAL, HYBRID, AUTO)
+
+
+def normalize_query(query: str) -> str:
+    """Klucz cache: NFC, małe litery, pojedyncze spacje."""
+    return " ".join(unicodedata.normalize("NFC", query).casefold().split())
+
+
+def load_embedding_model():
+    """Backend embeddingów z Config.EMBEDDING_BACKEND (ciężkie importy dopiero tutaj)."""
+    from src.core.embeddings import create_embedding_backend
+    return create_embedding_backend()
+
+
+class IndexSnapshot(NamedTuple):
+    """Spójna wersja bazy wiedzy: indeks + dokumenty jednej generacji, podmieniana jednym przypisaniem."""
+    index: Any
+    documents: Any
+    generation: Optional[str]
+    version: int
+    lexical: Any = None  # BM25Index generacji (None = starsza generacja bez indeksu BM25)
+
 
 class RagEngine:
-    def __init__(self):
-        # Ładowanie modelu embeddingów
-        logger.info("Loading embedding model...")
-        self.model = SentenceTransformer(Config.EMBEDDING_MODEL)
+    def __init__(self, model=None, vector_store_path: Optional[str] = None):
+        # Ładowanie modelu embeddingów (model można wstrzyknąć np. w testach/benchmarkach)
+        if model is None:
+            logger.info("Loading embedding model...")
+            model = load_embedding_model()
+        self.model = model
+        self.vector_store_path = vector_store_path or Config.VECTOR_STORE_PATH
         
         # Wymiar wektora dla all-MiniLM-L6-v2 to 384
-        self.dimension = 384 
-        self.index = faiss.IndexFlatL2(self.dimension)
-        
-        self.documents: List[Dict] = []
+        self.dimension = getattr(model, "dimension", 384)
+
+        # Wyszukiwanie bierze snapshot raz, więc trwające zapytania kończą na starej wersji po podmianie
+        self._versions = itertools.count(1)
+        self._snapshot = IndexSnapshot(faiss.IndexFlatL2(self.dimension), [], None, 0)
+        self._reload_lock = threading.Lock()
+        self._reload_stats = {
+            "reloads": 0,
+            "failed_reloads": 0,
+            "loaded_at": None,
+            "last_load_ms": None,
+            "last_swap_ms": None,
+            "last_error": None,
+        }
+
+        # Cache: embedding zależy tylko od tekstu, wyniki także od k i indeksu
+        cache_bytes = int(Config.RAG_CACHE_MAX_MB * 1024 * 1024) // 2
+        self.embedding_cache = LRUCache(
+            max_entries=Config.RAG_CACHE_MAX_ENTRIES,
+            max_bytes=cache_bytes,
+            ttl_seconds=Config.RAG_CACHE_TTL_SECONDS
+        )
+        self.results_cache = LRUCache(
+            max_entries=Config.RAG_CACHE_MAX_ENTRIES,
+            max_bytes=cache_bytes,
+            ttl_seconds=Config.RAG_CACHE_TTL_SECONDS
+        )
+
         self._load_knowledge_base()
 
-    def _load_knowledge_base(self):
-        """Ładuje indeks FAISS i metadane z folderu data/vector_store."""
-        index_path = os.path.join(Config.VECTOR_STORE_PATH, "index.faiss")
-        meta_path = os.path.join(Config.VECTOR_STORE_PATH, "index.pkl")
+        # Micro-batching zapytań przy równoległym ruchu (0 = wyłączone)
+        self.batcher: Optional[QueryBatcher] = None
+        if Config.RAG_BATCH_WINDOW_MS > 0:
+            self.batcher = QueryBatcher(
+                self._search_uncached,
+                window_ms=Config.RAG_BATCH_WINDOW_MS,
+                max_batch_size=Config.RAG_MAX_BATCH_SIZE
+            )
 
-        if not os.path.exists(index_path) or not os.path.exists(meta_path):
-             logger.warning(f"RAG Index not found at {Config.VECTOR_STORE_PATH}. Initializing empty index.")
-             return
+        # Wykrywanie nowej generacji indeksu na dysku (0 = tylko ręczny reload)
+        self._stop_watching = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        if Config.RAG_RELOAD_POLL_SECONDS > 0:
+            self._watcher = threading.Thread(target=self._watch_generations, name="rag-index-watcher", daemon=True)
+            self._watcher.start()
 
-        try:
-            self.index = faiss.read_index(index_path)
+    # Indeks i dokumenty aktywnej wersji. Przypisanie (np. w testach) tworzy nową wersję.
+    @property
+    def index(self):
+        return self._snapshot.index
+
+    @index.setter
+    def index(self, index):
+        self._swap(self._snapshot._replace(index=index, lexical=None))
+
+    @property
+    def documents(self):
+        return self._snapshot.documents
+
+    @documents.setter
+    def documents(self, documents):
+        self._swap(self._snapshot._replace(documents=documents, lexical=None))
+
+    # Ręczna podmiana indeksu/dokumentów odłącza BM25 (opisywał inne dokumenty) - można go przypisać osobno
+    @property
+    def lexical(self):
+        return self._snapshot.lexical
+
+    @lexical.setter
+    def lexical(self, lexical_index):
+        self._swap(self._snapshot._replace(lexical=lexical_index))
+
+    @property
+    def generation(self) -> Optional[str]:
+        return self._snapshot.generation
+
+    def _swap(self, snapshot: IndexSnapshot) -> float:
+        """Atomowa podmiana aktywnej wersji; zwraca czas podmiany w ms."""
+        start = time.perf_counter()
+        self._snapshot = snapshot._replace(version=next(self._versions))
+        # Wyniki starej wersji i tak nie trafią (wersja jest w kluczu) - zwalniamy pamięć
+        self.results_cache.clear()
+        return (time.perf_counter() - start) * 1000
+
+    def _read_store(self, path: str):
+        """
+        Wczytuje indeks FAISS i metadane z katalogu generacji (albo None, gdy ich nie ma).
+        Metadane: magazyn kolumnowy mapowany w pamięć (docs.*), a dla starszych indeksów index.pkl.
+        Indeks BM25 (bm25.*) jest opcjonalny - bez niego wyszukiwanie leksykalne i hybrydowe przechodzi na wektorowe.
+        """
+        index_path = os.path.join(path, "index.faiss")
+        meta_path = os.path.join(path, "index.pkl")
+        has_doc_store = doc_store.exists(path)
+
+        if not os.path.exists(index_path) or not (has_doc_store or os.path.exists(meta_path)):
+            return None
+
+        index = faiss.read_index(index_path)
+        if has_doc_store:
+            documents = doc_store.DocStore(path)
+        else:
             with open(meta_path, "rb") as f:
-                self.documents = pickle.load(f)
-            logger.info(f"Loaded RAG index with {self.index.ntotal} vectors.")
-        except Exception as e:
-             logger.error(f"Failed to load RAG index: {e}")
+                documents = pickle.load(f)
+        set_search_params(index)
+        enable_reconstruction(index)
+
+        lexical_index = None
+        if lexical.exists(path):
+            lexical_index = lexical.BM25Index(path)
+            if lexical_index.version != lexical.VERSION:
+                logger.warning(f"BM25 index at {path} uses tokenizer v{lexical_index.version} "
+                               f"(expected v{lexical.VERSION}) - ignoring it until the next ingestion.")
+                lexical_index = None
+        return index, documents, lexical_index
+
+    def _load_knowledge_base(self):
+        """Ładuje aktywną generację indeksu z folderu data/vector_store."""
+        self.reload()
 
-    def search(self, query: str, k: int = 3) -> List[Dict]:
+    def reload(self, if_changed: bool = False) -> Dict:
+        """
+        Wczytuje aktywną generację z dysku i podmienia ją atomowo.
+        Ładowanie trwa poza jakąkolwiek blokadą wyszukiwania - zapytania w tym czasie
+        (i te, które już trwają) korzystają ze starej wersji.
+        """
+        with self._reload_lock:
+            generation = current_generation(self.vector_store_path) or LEGACY
+            if if_changed and generation == self.generation:
+                return {"reloaded": False, "generation": self.generation}
+
+            start = time.perf_counter()
+            try:
+                loaded = self._read_store(generation_path(self.vector_store_path, generation))
+            except Exception as e:
+                logger.error(f"Failed to load RAG index: {e}")
+                self._reload_stats["failed_reloads"] += 1
+                self._reload_stats["last_error"] = str(e)
+                return {"reloaded": False, "generation": self.generation, "error": str(e)}
+
+            if loaded is None:
+                logger.warning(f"RAG Index not found at {self.vector_store_path}. Initializing empty index.")
+                return {"reloaded": False, "generation": self.generation}
+
+            index, documents, lexical_index = loaded
+            load_ms = (time.perf_counter() - start) * 1000
+            swap_ms = self._swap(IndexSnapshot(index, documents, generation, 0, lexical_index))
+            self._reload_stats.update({
+                "reloads": self._reload_stats["reloads"] + 1,
+                "loaded_at": time.time(),
+                "last_load_ms": load_ms,
+                "last_swap_ms": swap_ms,
+                "last_error": None,
+            })
+
+        logger.info(f"Loaded RAG index generation {generation} ({index_type_of(index)}) with {index.ntotal} vectors "
+                    f"in {load_ms:.0f} ms (swap {swap_ms:.3f} ms).")
+        if lexical_index is None:
+            logger.warning(f"Generation {generation} has no BM25 index - lexical/hybrid search falls back to vector "
+                           f"until the knowledge base is re-ingested.")
+        return {"reloaded": True, "generation": generation, "load_ms": load_ms, "swap_ms": swap_ms}
+
+    def _watch_generations(self):
+        while not self._stop_watching.wait(Config.RAG_RELOAD_POLL_SECONDS):
+            try:
+                self.reload(if_changed=True)
+            except Exception as e:
+                logger.error(f"RAG index watcher failed: {e}")
+
+    def warm_up(self):
+        """
+        Rozgrzewka przed przyjęciem ruchu: pierwsze encode (leniwa inicjalizacja modelu)
+        i pierwsze przeszukanie indeksu (strony mmap w pamięci). Nie zapisuje nic w cache.
+        """
+        vector = np.asarray(self.model.encode(["warm-up"]), dtype='float32')
+        snapshot = self._snapshot
+        if snapshot.index.ntotal > 0:
+            _, indices = snapshot.index.search(vector, 1)
+            if indices[0][0] != -1:
+                snapshot.documents[indices[0][0]]
+
+    def index_status(self) -> Dict:
+        """Aktywna generacja, rozmiar indeksu i statystyki przeładowań."""
+        snapshot = self._snapshot
+        return {
+            "generation": snapshot.generation,
+            "index_type": index_type_of(snapshot.index),
+            "vectors": snapshot.index.ntotal,
+            "lexical_documents": len(snapshot.lexical) if snapshot.lexical is not None else None,
+            **self._reload_stats,
+        }
+
+    def close(self):
+        self._stop_watching.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+        if self.batcher is not None:
+            self.batcher.close()
+
+    def search(self, query: str, k: int = 3, mode: Optional[str] = None) -> List[Dict]:
         """
         Wyszukuje k najbardziej podobnych fragmentów.
+        mode: vector | lexical | hybrid | auto (domyślnie Config.RAG_SEARCH_MODE).
         """
-        if self.index.ntotal == 0:
+        snapshot = self._snapshot
+        if snapshot.index.ntotal == 0:
             return []
 
-        query_vector = self.model.encode([query]).astype('float32')
-        distances, indices = self.index.search(query_vector, k)
-        
+        mode = self._resolve_mode(snapshot, query, mode)
+        cached = self.results_cache.get(self._results_key(snapshot, query, k, mode))
+        if cached is not None:
+            return [dict(r) for r in cached]
+
+        if mode == LEXICAL:
+            results = self._lexical_search(snapshot, query, k)
+        elif mode == HYBRID:
+            results = self._fuse(snapshot, query, k, self._vector_search(snapshot, query, self._candidates(k)))
+        else:
+            results = self._vector_search(snapshot, query, k)
+        return [dict(r) for r in results]
+
+    async def asearch(self, query: str, k: int = 3, mode: Optional[str] = None) -> List[Dict]:
+        """
+        Asynchroniczna wersja search: trafienie w cache i wyszukiwanie leksykalne (samo BM25)
+        obsługujemy od razu, a kodowanie zapytania (CPU-bound) wykonujemy w wątku,
+        żeby nie blokować pętli zdarzeń.
+        """
+        snapshot = self._snapshot
+        if snapshot.index.ntotal == 0:
+            return []
+
+        mode = self._resolve_mode(snapshot, query, mode)
+        cached = self.results_cache.get(self._results_key(snapshot, query, k, mode))
+        if cached is not None:
+            return [dict(r) for r in cached]
+
+        if mode == LEXICAL:
+            results = self._lexical_search(snapshot, query, k)
+        elif mode == HYBRID:
+            vector_results = await asyncio.to_thread(self._vector_search, snapshot, query, self._candidates(k))
+            results = self._fuse(snapshot, query, k, vector_results)
+        else:
+            results = await asyncio.to_thread(self._vector_search, snapshot, query, k)
+        return [dict(r) for r in results]
+
+    def search_batch(self, queries: List[str], k: int = 3, mode: Optional[str] = None) -> List[List[Dict]]:
+        """
+        Wyszukuje k fragmentów dla wielu zapytań naraz:
+        jedno wywołanie `encode` i jedno `index.search` na całej macierzy
+        (zapytania w trybie lexical w ogóle nie trafiają do modelu).
+        """
+        if not queries:
+            return []
+        snapshot = self._snapshot
+        if snapshot.index.ntotal == 0:
+            return [[] for _ in queries]
+
+        modes = [self._resolve_mode(snapshot, q, mode) for q in queries]
+        results: List[Optional[List[Dict]]] = [
+            self.results_cache.get(self._results_key(snapshot, q, k, m)) for q, m in zip(queries, modes)
+        ]
+        pending = [i for i, r in enumerate(results) if r is None]
+
+        vector_rows = [i for i in pending if modes[i] != LEXICAL]
+        depth = self._candidates(k) if any(modes[i] == HYBRID for i in vector_rows) else k
+        vector_results = {}
+        if vector_rows:
+            vector_results = dict(zip(vector_rows, self._search_uncached([queries[i] for i in vector_rows], depth, snapshot)))
+
+        for i in pending:
+            if modes[i] == LEXICAL:
+                results[i] = self._lexical_search(snapshot, queries[i], k)
+            elif modes[i] == HYBRID:
+                results[i] = self._fuse(snapshot, queries[i], k, vector_results[i])
+            else:
+                results[i] = vector_results[i][:k]
+                if depth != k:
+                    self.results_cache.put(self._results_key(snapshot, queries[i], k, VECTOR), results[i])
+
+        # Kopie, żeby wywołujący nie modyfikował wpisów w cache
+        return [[dict(r) for r in item] for item in results]
+
+    def _resolve_mode(self, snapshot: IndexSnapshot, query: str, mode: Optional[str]) -> str:
+        """Faktyczny tryb dla zapytania: auto rozstrzygane per zapytanie, bez indeksu BM25 zawsze vector."""
+        mode = (mode or Config.RAG_SEARCH_MODE).lower()
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {', '.join(SEARCH_MODES)}")
+        if mode == VECTOR or snapshot.lexical is None:
+            return VECTOR
+        if mode == AUTO:
+            terms, known = snapshot.lexical.known_terms(query)
+            return LEXICAL if 0 < terms <= Config.RAG_LEXICAL_MAX_TERMS and known == terms else HYBRID
+        return mode
+
+    @staticmethod
+    def _results_key(snapshot: IndexSnapshot, query: str, k: int, mode: str):
+        return (snapshot.version, mode, normalize_query(query), k)
+
+    @staticmethod
+    def _candidates(k: int) -> int:
+        return max(k, Config.RAG_HYBRID_CANDIDATES)
+
+    def _vector_search(self, snapshot: IndexSnapshot, query: str, k: int) -> List[Dict]:
+        # Migawka wywołującego - w hybrid wektor i BM25 muszą pochodzić z tej samej generacji
+        if self.batcher is not None:
+            return self.batcher.submit(query, k, snapshot)
+        return self._search_uncached([query], k, snapshot)[0]
+
+    def _lexical_search(self, snapshot: IndexSnapshot, query: str, k: int) -> List[Dict]:
+        """Top-k z samego BM25; "score" (odległość L2) nie istnieje dla tych wyników."""
+        results = []
+        with STAGE_SECONDS.labels("bm25_search").time():
+            hits = snapshot.lexical.search(query, k)
+        for doc_id, bm25 in hits:
+            doc = snapshot.documents[doc_id]
+            results.append({
+                "id": doc_id, "content": doc["content"], "source": doc["source"], "score": None, "bm25": bm25,
+                "snapshot": snapshot.version
+            })
+        self.results_cache.put(self._results_key(snapshot, query, k, LEXICAL), results)
+        return results
+
+    def _fuse(self, snapshot: IndexSnapshot, query: str, k: int, vector_results: List[Dict]) -> List[Dict]:
+        """
+        Reciprocal-rank fusion: każdy fragment dostaje sumę 1 / (RAG_RRF_K + pozycja) z obu list.
+        Liczą się tylko pozycje, więc nie trzeba skalować odległości L2 względem wyników BM25.
+        """
+        rrf_k = Config.RAG_RRF_K
+        fused: Dict[tuple, Dict] = {}
+        for rank, r in enumerate(vector_results, 1):
+            entry = fused.setdefault((r["source"], r["content"]), {
+                "id": r["id"], "content": r["content"], "source": r["source"], "score": r["score"],
+                "bm25": None, "rrf": 0.0, "snapshot": snapshot.version
+            })
+            entry["rrf"] += 1.0 / (rrf_k + rank)
+
+        with STAGE_SECONDS.labels("bm25_search").time():
+            hits = snapshot.lexical.search(query, self._candidates(k))
+        for rank, (doc_id, bm25) in enumerate(hits, 1):
+            doc = snapshot.documents[doc_id]
+            entry = fused.setdefault((doc["source"], doc["content"]), {
+                "id": doc_id, "content": doc["content"], "source": doc["source"], "score": None,
+                "bm25": None, "rrf": 0.0, "snapshot": snapshot.version
+            })
+            entry["bm25"] = bm25
+            entry["rrf"] += 1.0 / (rrf_k + rank)
+
+        results = sorted(fused.values(), key=lambda r: r["rrf"], reverse=True)[:k]
+        self.results_cache.put(self._results_key(snapshot, query, k, HYBRID), results)
+        return results
+
+    def _search_uncached(self, queries: List[str], k: int, snapshot: IndexSnapshot) -> List[List[Dict]]:
+        """Jedno `encode` (dla brakujących embeddingów) i jedno `index.search` na migawce wywołującego; zapisuje wyniki w cache."""
+        query_vectors = self.encode_queries(queries)
+        with STAGE_SECONDS.labels("faiss_search").time():
+            distances, indices = snapshot.index.search(query_vectors, k)
+
+        results = []
+        for row, query in enumerate(queries):
+            item = self._to_results(distances[row], indices[row], snapshot)
+            self.results_cache.put(self._results_key(snapshot, query, k, VECTOR), item)
+            results.append(item)
+        return results
+
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Koduje zapytania jednym wywołaniem modelu, korzystając z cache embeddingów."""
+        keys = [normalize_query(q) for q in queries]
+        vectors: List[Optional[np.ndarray]] = [self.embedding_cache.get(key) for key in keys]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+
+        if missing:
+            with STAGE_SECONDS.labels("encode").time():
+                encoded = np.asarray(self.model.encode([queries[i] for i in missing]), dtype='float32')
+            for row, i in enumerate(missing):
+                vectors[i] = encoded[row]
+                self.embedding_cache.put(keys[i], encoded[row])
+
+        return np.vstack(vectors).astype('float32', copy=False)
+
+    def cached_query_vector(self, query: str) -> Optional[np.ndarray]:
+        """Embedding zapytania, jeśli policzyło go już wyszukiwanie (None np. po samym BM25) - bez wywołania modelu."""
+        return self.embedding_cache.peek(normalize_query(query))
+
+    def chunk_vectors(self, results: List[Dict], snapshot: Optional[IndexSnapshot] = None) -> Optional[np.ndarray]:
+        """
+        Wektory fragmentów z wyników wyszukiwania odtworzone z indeksu FAISS (bez ponownego kodowania).
+        Dla kwantyzowanych indeksów (sq/ivfpq) to przybliżenia. None, gdy nie da się ich odtworzyć
+        albo wyniki pochodzą z innej migawki niż ta (domyślnie bieżąca) - id z innej generacji
+        wskazywałyby inne wektory.
+        """
+        snapshot = snapshot or self._snapshot
+        if not results or any(r.get("id") is None or r.get("snapshot") != snapshot.version for r in results):
+            return None
+        try:
+            return snapshot.index.reconstruct_batch(np.asarray([r["id"] for r in results], dtype="int64"))
+        except RuntimeError as e:
+            logger.debug(f"Cannot reconstruct chunk vectors: {e}")
+            return None
+
+    def cache_stats(self) -> Dict:
+        return {
+            "embeddings": self.embedding_cache.stats(),
+            "results": self.results_cache.stats(),
+        }
+
+    def _to_results(self, distances, indices, snapshot: IndexSnapshot) -> List[Dict]:
         results = []
-        for i, idx in enumerate(indices[0]):
+        for i, idx in enumerate(indices):
             if idx == -1: continue
             
-            doc = self.documents[idx]
+            doc = snapshot.documents[idx]
             results.append({
+                "id": int(idx),
                 "content": doc["content"],
                 "source": doc["source"],
-                "score": float(distances[0][i])
+                "score": float(distances[i]),
+                "snapshot": snapshot.version
             })
             
         return results
 
 rag_engine = None
 
-def get_rag_engine():
+def get_rag_engine(model=None):
     global rag_engine
     if rag_engine is None:
-        rag_engine = RagEngine()
-    return rag_engine
\ No newline at end of file
+        rag_engine = RagEngine(model=model)
+    return rag_engine
@@ -0,0 +1,160 @@
+# src/core/sessions.py
+import json
+import secrets
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from src.config import Config
+from src.utils.cache import LRUCache
+
+# Backendy magazynu sesji (Config.SESSION_BACKEND)
+MEMORY = "memory"  # w procesie: LRU + TTL (sesje giną przy restarcie, nie są dzielone między workerami)
+
+SESSION_BACKENDS = (MEMORY,)
+
+
+def estimate_tokens(text: str) -> int:
+    """Przybliżona liczba tokenów (~4 znaki na token) - wystarcza do pilnowania budżetu historii."""
+    return len(text) // 4 + 1 if text else 0
+
+
+class SessionNotFoundError(LookupError):
+    """session_id nieznany serwerowi albo sesja wygasła - sesje zakłada tylko serwer (create_session)."""
+
+
+def new_session_id() -> str:
+    # Identyfikator jest jedynym dowodem dostępu do rozmowy - losowy, nie do odgadnięcia
+    return secrets.token_urlsafe(24)
+
+
+def _tool_key(name: str, args: Dict[str, Any]) -> str:
+    return f"{name}:{json.dumps(args or {}, sort_keys=True, ensure_ascii=False, default=str)}"
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+@dataclass
+class Turn:
+    question: str
+    context: List[str]  # fragmenty RAG wysłane do modelu po raz pierwszy w tej turze
+    answer: str
+
+    def tokens(self) -> int:
+        return estimate_tokens(self.question) + sum(estimate_tokens(c) for c in self.context) + estimate_tokens(self.answer)
+
+
+@dataclass
+class Session:
+    """
+    Rozmowa po stronie serwera: ostatnie tury w budżecie tokenów, podsumowanie starszych
+    i wyniki narzędzi pobrane w tej rozmowie (klucz wywołania -> (czas pobrania, wynik)).
+    """
+
+    session_id: str
+    turns: List[Turn] = field(default_factory=list)
+    summary: List[str] = field(default_factory=list)
+    tool_results: Dict[str, Tuple[float, Any]] = field(default_factory=dict)
+
+    @property
+    def empty(self) -> bool:
+        return not self.turns and not self.summary
+
+    def seen_context(self) -> Set[str]:
+        """Fragmenty RAG obecne w historii wysyłanej modelowi - nie trzeba ich powtarzać."""
+        return {chunk for turn in self.turns for chunk in turn.context}
+
+    def add_turn(self, turn: Turn, history_tokens: int, summary_tokens: int):
+        """
+        Dopisuje turę i przycina historię do budżetu: najstarsze tury wypadają z historii,
+        a zostaje po nich jedna linia w podsumowaniu (pytanie -> początek odpowiedzi).
+        Ostatnia tura zostaje zawsze, nawet jeśli sama przekracza budżet.
+        """
+        self.turns.append(turn)
+        while len(self.turns) > 1 and sum(t.tokens() for t in self.turns) > history_tokens:
+            dropped = self.turns.pop(0)
+            self.summary.append(f"- {_shorten(dropped.question, 120)} -> {_shorten(dropped.answer, 160)}")
+        while self.summary and sum(estimate_tokens(line) for line in self.summary) > summary_tokens:
+            self.summary.pop(0)
+
+    def cached_tool_result(self, name: str, args: Dict[str, Any], max_age_seconds: float) -> Optional[Any]:
+        entry = self.tool_results.get(_tool_key(name, args))
+        if entry is None or time.time() - entry[0] > max_age_seconds:
+            return None
+        return entry[1]
+
+    def remember_tool_result(self, name: str, args: Dict[str, Any], result: Any):
+        self.tool_results[_tool_key(name, args)] = (time.time(), result)
+
+    def merge_tool_results(self, other: "Session"):
+        """Dopisuje wyniki narzędzi z innej kopii tej sesji (z dwóch kopii zostaje świeższy wynik)."""
+        for key, entry in other.tool_results.items():
+            current = self.tool_results.get(key)
+            if current is None or current[0] < entry[0]:
+                self.tool_results[key] = entry
+
+
+class SessionStore(ABC):
+    """
+    Interfejs magazynu sesji - backend zapisuje sesję w save(), więc może ją serializować.
+    Równoległe tury tej samej sesji kończą się pod lock(session_id): odczyt - dopisanie tury - zapis.
+    """
+
+    LOCK_STRIPES = 64
+
+    def __init__(self):
+        # Pula blokad wybieranych po id (stała pamięć niezależnie od liczby sesji)
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+
+    def lock(self, session_id: str) -> threading.Lock:
+        """Blokada read-modify-write sesji w tym procesie (backend dzielony między procesami może ją nadpisać)."""
+        return self._locks[zlib.crc32(session_id.encode("utf-8")) % self.LOCK_STRIPES]
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Session]:
+        ...
+
+    @abstractmethod
+    def save(self, session: Session):
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class InMemorySessionStore(SessionStore):
+    """Sesje w pamięci procesu: najdawniej używane wypadają po max_sessions, nieaktywne po ttl_seconds."""
+
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: Optional[float] = 1800):
+        super().__init__()
+        self._sessions = LRUCache(max_entries=max_sessions, ttl_seconds=ttl_seconds, sizeof=lambda _: 0)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        return self._sessions.get(session_id)
+
+    def save(self, session: Session):
+        # Ponowny zapis odświeża TTL - sesja wygasa po czasie bezczynności
+        self._sessions.put(session.session_id, session)
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        return self._sessions.stats()
+
+
+def create_session_store(backend: Optional[str] = None) -> SessionStore:
+    backend = (backend or Config.SESSION_BACKEND).lower()
+    if backend == MEMORY:
+        return InMemorySessionStore(max_sessions=Config.SESSION_MAX_SESSIONS, ttl_seconds=Config.SESSION_TTL_SECONDS)
+    raise ValueError(f"Unknown session backend '{backend}', expected one of {', '.join(SESSION_BACKENDS)}")
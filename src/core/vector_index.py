@@ -0,0 +1,141 @@
+# src/core/vector_index.py
+import math
+from typing import Optional, Tuple
+
+import faiss
+import numpy as np
+
+from src.config import Config
+from src.utils.logger import logger
+
+# Obsługiwane typy indeksu (Config.RAG_INDEX_TYPE)
+FLAT = "flat"     # dokładny brute-force (baseline)
+IVF = "ivf"       # IVF z dokładnymi wektorami w listach; zapytanie skanuje nprobe list
+HNSW = "hnsw"     # graf HNSW; jakość/szybkość zapytania sterowana efSearch
+SQ = "sq"         # skalarna kwantyzacja 8-bit (4x mniej pamięci niż flat, dalej brute-force)
+IVFPQ = "ivfpq"   # IVF + kwantyzacja produktowa (najmniejsza pamięć, przybliżone odległości)
+
+INDEX_TYPES = (FLAT, IVF, HNSW, SQ, IVFPQ)
+
+# Ile wektorów treningowych na centroid/kod jest potrzebne, żeby k-means miał sens (zalecenie FAISS: >= 39)
+MIN_POINTS_PER_CENTROID = 39
+MAX_TRAINING_POINTS = 256 * 1024
+
+
+def ivf_nlist(n_vectors: int) -> int:
+    """Liczba list IVF: Config.RAG_IVF_NLIST albo ~4*sqrt(n), ograniczona rozmiarem zbioru treningowego."""
+    nlist = Config.RAG_IVF_NLIST or int(4 * math.sqrt(max(n_vectors, 1)))
+    return max(1, min(nlist, n_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def resolve_index_type(index_type: str, n_vectors: int) -> str:
+    """
+    Typ indeksu, który faktycznie da się zbudować dla n_vectors wektorów.
+    Indeksy trenowane (IVF/PQ) potrzebują odpowiednio dużo danych - dla małej bazy wiedzy
+    brute-force i tak jest najszybszy, więc wtedy wracamy do flat.
+    """
+    index_type = (index_type or FLAT).lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown RAG index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+
+    needed = 0
+    if index_type in (IVF, IVFPQ):
+        needed = MIN_POINTS_PER_CENTROID * 2
+    if index_type == IVFPQ:
+        needed = max(needed, 2 ** Config.RAG_PQ_NBITS * 4)
+
+    if n_vectors < needed:
+        logger.warning(f"Only {n_vectors} vectors - too few to train '{index_type}', using '{FLAT}' index.")
+        return FLAT
+    return index_type
+
+
+def create_index(index_type: str, dimension: int, n_vectors: int) -> Tuple[faiss.Index, str]:
+    """
+    Tworzy pusty (jeszcze nie wytrenowany) indeks z mapowaniem ID.
+    Zwraca (indeks, faktyczny typ) - patrz resolve_index_type.
+    """
+    index_type = resolve_index_type(index_type, n_vectors)
+
+    if index_type == FLAT:
+        base = faiss.IndexFlatL2(dimension)
+    elif index_type == IVF:
+        base = faiss.IndexIVFFlat(faiss.IndexFlatL2(dimension), dimension, ivf_nlist(n_vectors))
+    elif index_type == HNSW:
+        base = faiss.IndexHNSWFlat(dimension, Config.RAG_HNSW_M)
+        base.hnsw.efConstruction = Config.RAG_HNSW_EF_CONSTRUCTION
+    elif index_type == SQ:
+        base = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit)
+    else:
+        pq_m = Config.RAG_PQ_M
+        if dimension % pq_m:
+            raise ValueError(f"RAG_PQ_M={pq_m} must divide the embedding dimension {dimension}")
+        base = faiss.IndexIVFPQ(
+            faiss.IndexFlatL2(dimension), dimension, ivf_nlist(n_vectors), pq_m, Config.RAG_PQ_NBITS
+        )
+
+    return faiss.IndexIDMap2(base), index_type
+
+
+def train_index(index: faiss.Index, vectors: np.ndarray, seed: int = 0):
+    """Trenuje indeks (IVF/PQ/SQ) na próbce wektorów; dla flat/HNSW nic nie robi."""
+    if index.is_trained:
+        return
+    if len(vectors) > MAX_TRAINING_POINTS:
+        rng = np.random.default_rng(seed)
+        vectors = vectors[rng.choice(len(vectors), MAX_TRAINING_POINTS, replace=False)]
+    index.train(np.ascontiguousarray(vectors, dtype='float32'))
+
+
+def requires_training(index_type: str) -> bool:
+    """Czy indeks tego typu trzeba wytrenować na próbce wektorów przed dodaniem danych."""
+    return (index_type or FLAT).lower() in (IVF, SQ, IVFPQ)
+
+
+def base_index(index: faiss.Index) -> faiss.Index:
+    """Indeks pod spodem IndexIDMap/IndexIDMap2 (z właściwą podklasą)."""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def index_type_of(index: faiss.Index) -> str:
+    base = base_index(index)
+    if isinstance(base, faiss.IndexIVFPQ):
+        return IVFPQ
+    if isinstance(base, faiss.IndexIVF):
+        return IVF
+    if isinstance(base, faiss.IndexHNSW):
+        return HNSW
+    if isinstance(base, faiss.IndexScalarQuantizer):
+        return SQ
+    return FLAT
+
+
+def supports_removal(index: faiss.Index) -> bool:
+    """HNSW nie pozwala usuwać wektorów - przy zmianach indeks trzeba przebudować."""
+    return index_type_of(index) != HNSW
+
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Ustawia parametry zapytania: nprobe dla IVF, efSearch dla HNSW (pozostałe typy ignorują)."""
+    base = base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        base.nprobe = max(1, min(nprobe or Config.RAG_NPROBE, base.nlist))
+    elif isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = max(1, ef_search or Config.RAG_HNSW_EF_SEARCH)
+
+
+def enable_reconstruction(index: faiss.Index):
+    """
+    IVF odtwarza wektory po ID dopiero z mapą bezpośrednią - reszta typów od razu.
+    Hashtable, bo po usuwaniu wektorów wewnętrzne ID nie są już kolejne.
+    """
+    base = base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        base.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """Rozmiar zserializowanego indeksu - dobre przybliżenie pamięci zajmowanej w RAM."""
+    return int(faiss.serialize_index(index).nbytes)
@@ -1,16 +1,309 @@
 import os
 import glob
+import json
 import pickle
+import hashlib
+import itertools
+import argparse
+import multiprocessing
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
 from src.config import Config
+from src.core.chunking import iter_chunks, validate_settings
+from src.core.doc_store import ALL_FILES, DocStore, DocStoreWriter, exists as doc_store_exists
+from src.core.embeddings import SENTENCE_TRANSFORMERS
+from src.core.generations import current_generation, generation_path, new_generation, prune, publish
+from src.core.lexical import VERSION as LEXICAL_VERSION, BM25Writer
+from src.core.rag_engine import load_embedding_model
+from src.core.vector_index import FLAT, create_index, requires_training, supports_removal, train_index
+from src.utils.files import atomic_write
 from src.utils.logger import logger
 
-def main():
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MANIFEST_VERSION = 1
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_hash(source: str, content: str) -> str:
+    """Tożsamość fragmentu = plik źródłowy + treść (ta sama linia w dwóch plikach to dwa fragmenty)."""
+    return hashlib.sha256(f"{source}\0{content}".encode("utf-8")).hexdigest()
+
+def chunking_settings() -> dict:
+    return {"mode": Config.INGEST_CHUNK_MODE, "size": Config.INGEST_CHUNK_SIZE, "overlap": Config.INGEST_CHUNK_OVERLAP}
+
+def peak_rss_mb():
+    """
+    Szczytowe RSS procesu głównego i najbardziej zachłannego procesu potomnego (MB).
+    ru_maxrss jest w KB na Linuksie i w bajtach na macOS; None, gdy brak modułu resource (Windows).
+    """
+    if resource is None:
+        return None
+    unit = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "main": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit,
+        "workers": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit,
+    }
+
+# --- Kodowanie w puli procesów ---
+
+class EmbeddingError(RuntimeError):
+    """Błąd kodowania batcha - przerywa ingestion (w odróżnieniu od błędu odczytu pojedynczego pliku)."""
+
+_worker_model = None
+
+def _init_worker(threads: int, settings: dict):
+    """
+    Inicjalizacja procesu roboczego: jeden model na proces, wątki podzielone między procesy.
+    Ustawienia modelu przychodzą z procesu głównego (spawn nie dziedziczy zmian w Config).
+    """
+    global _worker_model
+    for name, value in settings.items():
+        setattr(Config, name, value)
+    Config.EMBEDDING_THREADS = Config.EMBEDDING_THREADS or threads
+    if Config.EMBEDDING_BACKEND.lower() == SENTENCE_TRANSFORMERS:
+        import torch
+        torch.set_num_threads(threads)
+    _worker_model = load_embedding_model()
+
+def _encode_in_worker(texts):
+    return np.asarray(_worker_model.encode(texts), dtype='float32')
+
+class BatchEncoder:
+    """
+    Koduje batche fragmentów: w tym procesie (workers <= 1) albo w puli procesów.
+    Model ładowany leniwie - przebieg bez nowych fragmentów w ogóle go nie dotyka.
+    """
+
+    WORKER_SETTINGS = ("EMBEDDING_MODEL", "EMBEDDING_BACKEND", "EMBEDDING_ONNX_FILE", "EMBEDDING_THREADS")
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.max_in_flight = max(1, workers) * 2
+        self._model = None
+        self._pool = None
+
+    def submit(self, texts) -> Future:
+        if self.workers <= 1:
+            if self._model is None:
+                self._model = load_embedding_model()
+            future = Future()
+            future.set_result(np.asarray(self._model.encode(texts), dtype='float32'))
+            return future
+
+        if self._pool is None:
+            # spawn: bez dziedziczenia stanu OpenMP/wątków (faiss, torch) po forku
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(threads, {name: getattr(Config, name) for name in self.WORKER_SETTINGS}),
+            )
+        return self._pool.submit(_encode_in_worker, texts)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+class IndexAppender:
+    """
+    Dodaje wektory do indeksu w miarę kończenia batchy.
+    Nowy indeks wymagający treningu (IVF/SQ/PQ) potrzebuje najpierw wszystkich danych - wtedy wektory
+    idą do pliku tymczasowego na dysku i są dodawane blokami po treningu (pamięć pozostaje ograniczona).
+    """
+
+    ADD_BLOCK = 65536
+
+    def __init__(self, index, spool_dir: str):
+        self.index = index
+        self.spool_dir = spool_dir
+        self.added = 0
+        self._spool = None
+        self._spool_ids = None
+        self._dimension = None
+
+    def add(self, ids, vectors: np.ndarray):
+        ids = np.asarray(ids, dtype='int64')
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        self._dimension = vectors.shape[1]
+        self.added += len(ids)
+
+        if self.index is None and not requires_training(Config.RAG_INDEX_TYPE):
+            self.index, built_type = create_index(Config.RAG_INDEX_TYPE, self._dimension, 0)
+            print(f"Building '{built_type}' index...")
+        if self.index is not None:
+            self.index.add_with_ids(vectors, ids)
+            return
+
+        if self._spool is None:
+            self._spool = open(os.path.join(self.spool_dir, "vectors.f32"), "wb")
+            self._spool_ids = open(os.path.join(self.spool_dir, "ids.i64"), "wb")
+        self._spool.write(vectors.tobytes())
+        self._spool_ids.write(ids.tobytes())
+
+    def finish(self):
+        if self._spool is None:
+            return self.index
+
+        self._spool.close()
+        self._spool_ids.close()
+        ids = np.fromfile(os.path.join(self.spool_dir, "ids.i64"), dtype='int64')
+        vectors = np.memmap(os.path.join(self.spool_dir, "vectors.f32"), dtype='float32', mode='r',
+                            shape=(len(ids), self._dimension))
+
+        self.index, built_type = create_index(Config.RAG_INDEX_TYPE, self._dimension, len(ids))
+        print(f"Building '{built_type}' index (training on up to {min(len(ids), 256 * 1024)} vectors)...")
+        train_index(self.index, vectors)
+        for start in range(0, len(ids), self.ADD_BLOCK):
+            end = start + self.ADD_BLOCK
+            self.index.add_with_ids(np.ascontiguousarray(vectors[start:end]), ids[start:end])
+        del vectors
+        return self.index
+
+def atomic_write_index(path: str, index):
+    """Jak atomic_write, ale faiss.write_index pisze prosto do pliku - bez kopii całego indeksu w pamięci."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def load_previous_store(store_path: str):
+    """
+    Wczytuje manifest, indeks i metadane z poprzedniego przebiegu.
+    Zwraca (manifest, index, documents) albo (None, None, {}) gdy trzeba zbudować wszystko od zera.
+    """
+    store_path = generation_path(store_path)
+    manifest_path = os.path.join(store_path, "manifest.json")
+    index_path = os.path.join(store_path, "index.faiss")
+    meta_path = os.path.join(store_path, "index.pkl")
+
+    if not os.path.exists(manifest_path) or not os.path.exists(index_path):
+        return None, None, {}
+    if not (doc_store_exists(store_path) or os.path.exists(meta_path)):
+        return None, None, {}
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        index = faiss.read_index(index_path)
+        if doc_store_exists(store_path):
+            documents = DocStore(store_path)
+        else:
+            # Starszy format metadanych (pickle) - przepisujemy go do magazynu kolumnowego
+            with open(meta_path, "rb") as f:
+                documents = pickle.load(f)
+    except Exception as e:
+        logger.warning(f"Previous vector store unreadable, rebuilding from scratch: {e}")
+        return None, None, {}
+
+    # Zmiana modelu albo formatu = stare wektory są bezużyteczne
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("embedding_model") != Config.EMBEDDING_MODEL:
+        print("Embedding model or manifest format changed - full rebuild.")
+        return None, None, {}
+    if manifest.get("embedding_backend", SENTENCE_TRANSFORMERS) != Config.EMBEDDING_BACKEND.lower():
+        print(f"Embedding backend changed to '{Config.EMBEDDING_BACKEND}' - full rebuild.")
+        return None, None, {}
+    if manifest.get("index_type", FLAT) != Config.RAG_INDEX_TYPE.lower():
+        print(f"Index type changed to '{Config.RAG_INDEX_TYPE}' - full rebuild.")
+        return None, None, {}
+    if not isinstance(index, faiss.IndexIDMap) or not isinstance(documents, (dict, DocStore)):
+        return None, None, {}
+
+    return manifest, index, documents
+
+def rebuild_without(index, removed_ids):
+    """
+    Indeks bez wskazanych wektorów dla typów, które nie wspierają remove_ids (HNSW):
+    graf budujemy od nowa z zachowanych wektorów, bez ponownego liczenia embeddingów.
+    """
+    removed = set(removed_ids)
+    keep = np.asarray([i for i in faiss.vector_to_array(index.id_map) if i not in removed], dtype='int64')
+    rebuilt, _ = create_index(Config.RAG_INDEX_TYPE, index.d, len(keep))
+    if len(keep):
+        vectors = np.vstack([index.reconstruct(int(i)) for i in keep]).astype('float32')
+        train_index(rebuilt, vectors)
+        rebuilt.add_with_ids(vectors, keep)
+    return rebuilt
+
+def write_generation(store_path: str, index, doc_rows, manifest) -> str:
+    """
+    Zapisuje komplet plików (indeks, magazyn dokumentów, indeks BM25, manifest) do nowego katalogu generacji
+    i dopiero na końcu atomowo przełącza CURRENT. Serwer API w tym czasie czyta poprzednią generację.
+    Magazyn dokumentów i indeks BM25 powstają w jednym przebiegu po doc_rows.
+    """
+    generation = new_generation(store_path)
+    path = os.path.join(store_path, generation)
+    try:
+        writer = DocStoreWriter(path)
+        bm25 = BM25Writer(path)
+        try:
+            for doc_id, content, source in doc_rows:
+                writer.add(doc_id, content, source)
+                bm25.add(doc_id, content)
+        except BaseException:
+            writer.abort()
+            bm25.abort()
+            raise
+        atomic_write_index(os.path.join(path, "index.faiss"), index)
+        writer.commit()
+        bm25.commit()
+        atomic_write(os.path.join(path, "manifest.json"),
+                     lambda f: json.dump(manifest, f, ensure_ascii=False, indent=1), mode="w")
+    except BaseException:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+
+    publish(store_path, generation)
+    prune(store_path)
+    return generation
+
+def remove_legacy_files(store_path: str):
+    """
+    Usuwa pliki starszego układu (bezpośrednio w vector_store) - po publikacji generacji nikt ich nie czyta.
+    data/vector_store/index.faiss i index.pkl są w repozytorium, więc bez --remove-legacy zostają na miejscu.
+    """
+    for name in ("index.faiss", "index.pkl", "manifest.json") + ALL_FILES:
+        path = os.path.join(store_path, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indeksuje data/knowledge_base do data/vector_store.")
+    parser.add_argument("--full", action="store_true", help="Ignoruj manifest i przebuduj indeks od zera")
+    parser.add_argument("--workers", type=int, default=Config.INGEST_WORKERS,
+                        help="Procesy kodujące embeddingi (1 = w tym procesie)")
+    parser.add_argument("--remove-legacy", action="store_true",
+                        help="Usuń pliki starszego układu (index.faiss, index.pkl) z katalogu vector_store")
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+
+    # Błędne ustawienia cięcia zatrzymują ingestion od razu (inaczej każdy plik byłby "nieczytelny"
+    # i opublikowalibyśmy pustą albo niepełną generację)
+    chunking = chunking_settings()
+    validate_settings(chunking["mode"], chunking["size"], chunking["overlap"])
+
     # 1. Przeskanuj folder data/knowledge_base
     kb_path = os.path.join(Config.DATA_DIR, "knowledge_base")
-    txt_files = glob.glob(os.path.join(kb_path, "*.txt"))
+    txt_files = sorted(glob.glob(os.path.join(kb_path, "*.txt")))
 
     if not txt_files:
         print(f"No .txt files found in {kb_path}")
@@ -18,58 +311,209 @@ def main():
 
     print(f"Found {len(txt_files)} files to process.")
 
-    documents = []
-    all_sentences = []
-    
-    # 2. & 3. Wczytaj treść i podziel na fragmenty
-    for file_path in txt_files:
-        filename = os.path.basename(file_path)
-        print(f"Processing: {filename}")
-        
+    store_path = Config.VECTOR_STORE_PATH
+    os.makedirs(store_path, exist_ok=True)
+
+    manifest, index, documents = (None, None, {}) if args.full else load_previous_store(store_path)
+    old_files = manifest["files"] if manifest else {}
+    old_chunks = manifest["chunks"] if manifest else {}
+    next_id = manifest["next_id"] if manifest else 0
+    if manifest and manifest.get("chunking", chunking) != chunking:
+        # Inne cięcie = inne fragmenty; pliki dzielimy od nowa, ale identyczne fragmenty nadal odzyskujemy
+        print("Chunking settings changed - re-chunking all files.")
+        old_files = {name: dict(entry, sha256=None) for name, entry in old_files.items()}
+
+    files = {}
+    chunk_ids = {}          # hash -> id fragmentów obecnych po tym przebiegu
+    discarded = set()       # id nowych fragmentów z plików przeczytanych tylko częściowo
+    stats = {"unchanged_files": 0, "changed_files": 0, "reused_chunks": 0, "embedded": 0}
+
+    with tempfile.TemporaryDirectory(dir=store_path, prefix=".ingest-") as spool_dir:
+        # Nowe fragmenty trafiają od razu do tymczasowego magazynu (ID rosnąco), a nie do listy w pamięci
+        new_docs = DocStoreWriter(os.path.join(spool_dir, "docs"))
+        appender = IndexAppender(index, spool_dir)
+        encoder = BatchEncoder(args.workers)
+        pending = {}        # future -> ids fragmentów w batchu
+        batch = []          # (id, content)
+        embed_started = None
+
+        def collect(wait_for_all=False):
+            """Dodaje do indeksu gotowe batche; czeka, gdy w locie jest za dużo (ograniczona pamięć)."""
+            while pending:
+                done = [f for f in pending if f.done()]
+                if not done:
+                    if not wait_for_all and len(pending) < encoder.max_in_flight:
+                        return
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    ids = pending.pop(future)
+                    try:
+                        vectors = future.result()
+                    except Exception as e:
+                        raise EmbeddingError(f"Embedding batch failed: {e}") from e
+                    appender.add(ids, vectors)
+
+        def flush_batch():
+            nonlocal batch, embed_started
+            if not batch:
+                return
+            if embed_started is None:
+                embed_started = time.perf_counter()
+            try:
+                future = encoder.submit([content for _, content in batch])
+            except Exception as e:
+                raise EmbeddingError(f"Embedding batch failed: {e}") from e
+            pending[future] = [i for i, _ in batch]
+            stats["embedded"] += len(batch)
+            batch = []
+            collect()
+
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = [line.strip() for line in f.readlines() if line.strip()]
-                
-                for line in lines:
-                    documents.append({
-                        "content": line,
-                        "source": filename
-                    })
-                    all_sentences.append(line)
-        except Exception as e:
-            print(f"Error reading {filename}: {e}")
-
-    if not all_sentences:
-        print("No content to index.")
-        return
+            # 2. & 3. Czytaj pliki leniwie i dziel na fragmenty - tylko pliki, których hash się zmienił
+            for file_path in txt_files:
+                filename = os.path.basename(file_path)
+                hashes = []
+
+                try:
+                    sha = file_sha256(file_path)
+                    previous = old_files.get(filename)
+
+                    if previous and previous["sha256"] == sha:
+                        stats["unchanged_files"] += 1
+                        files[filename] = previous
+                        for h in previous["chunks"]:
+                            chunk_ids[h] = old_chunks[h]
+                        stats["reused_chunks"] += len(previous["chunks"])
+                        continue
+
+                    print(f"Processing: {filename}")
+                    stats["changed_files"] += 1
+                    for chunk in iter_chunks(file_path, chunking["mode"], chunking["size"], chunking["overlap"]):
+                        h = chunk_hash(filename, chunk)
+                        if h in chunk_ids:
+                            continue  # duplikat fragmentu w tym samym pliku
+                        hashes.append(h)
+                        if h in old_chunks:
+                            chunk_ids[h] = old_chunks[h]
+                            stats["reused_chunks"] += 1
+                        else:
+                            chunk_ids[h] = next_id
+                            new_docs.add(next_id, chunk, filename)
+                            batch.append((next_id, chunk))
+                            next_id += 1
+                            if len(batch) >= Config.INGEST_BATCH_SIZE:
+                                flush_batch()
+                    files[filename] = {"sha256": sha, "chunks": hashes}
+                except EmbeddingError:
+                    raise
+                except Exception as e:
+                    print(f"Error reading {filename}: {e}")
+                    # Wycofujemy fragmenty przeczytane przed błędem: nowe id nie trafią do generacji
+                    # (jeszcze niewysłane wypadają z batcha, już zakodowane usuwamy z indeksu niżej)
+                    for h in hashes:
+                        if h in old_chunks:
+                            stats["reused_chunks"] -= 1
+                        else:
+                            discarded.add(chunk_ids[h])
+                        del chunk_ids[h]
+                    batch = [(i, content) for i, content in batch if i not in discarded]
+                    # Nie tracimy fragmentów pliku, którego nie dało się przeczytać
+                    if filename in old_files:
+                        files[filename] = old_files[filename]
+                        for h in old_files[filename]["chunks"]:
+                            chunk_ids[h] = old_chunks[h]
+
+            # 4. Embeddingi ostatnich batchy; wektory dodawane do indeksu w kolejności ukończenia
+            flush_batch()
+            collect(wait_for_all=True)
+        except BaseException:
+            new_docs.abort()
+            raise
+        finally:
+            encoder.close()
+        embed_seconds = (time.perf_counter() - embed_started) if embed_started else 0.0
 
-    # 4. Stwórz embeddingi
-    print(f"Generating embeddings for {len(all_sentences)} chunks...")
-    model = SentenceTransformer(Config.EMBEDDING_MODEL)
-    embeddings = model.encode(all_sentences)
-    embeddings = np.array(embeddings).astype('float32')
-
-    # 5. Zapisz/Zaktualizuj indeks FAISS
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings)
-    
-    # Ensure vector store directory exists
-    os.makedirs(Config.VECTOR_STORE_PATH, exist_ok=True)
-    
-    index_path = os.path.join(Config.VECTOR_STORE_PATH, "index.faiss")
-    meta_path = os.path.join(Config.VECTOR_STORE_PATH, "index.pkl")
-    
-    faiss.write_index(index, index_path)
-    with open(meta_path, "wb") as f:
-        pickle.dump(documents, f)
+        removed_ids = [i for h, i in old_chunks.items() if h not in chunk_ids] + sorted(discarded)
+
+        if not chunk_ids:
+            new_docs.abort()
+            print("No content to index.")
+            return
+
+        # 5. Indeks: nowe wektory już dodane (albo, dla indeksów trenowanych, teraz trening + dodanie).
+        #    Przyrostowo indeksy IVF/PQ/SQ tylko dopisują wektory do istniejących centroidów
+        #    (po dużych zmianach w bazie warto przebudować z --full).
+        index = appender.finish()
+        if index is None:
+            new_docs.abort()
+            print("Nothing to embed and no previous index - nothing to do.")
+            return
+
+        if removed_ids:
+            if supports_removal(index):
+                index.remove_ids(np.asarray(removed_ids, dtype='int64'))
+            else:
+                index = rebuild_without(index, removed_ids)
+
+        new_manifest = {
+            "version": MANIFEST_VERSION,
+            "embedding_model": Config.EMBEDDING_MODEL,
+            "embedding_backend": Config.EMBEDDING_BACKEND.lower(),
+            "dimension": index.d,
+            "index_type": Config.RAG_INDEX_TYPE.lower(),
+            "chunking": chunking,
+            "lexical": LEXICAL_VERSION,
+            "next_id": next_id,
+            "files": files,
+            "chunks": {h: i for h, i in chunk_ids.items()},
+        }
+
+        # Bez zmian w bazie wiedzy nie publikujemy nowej generacji (serwer nie musi niczego przeładowywać)
+        # (starszy układ bez generacji albo generacja bez aktualnego indeksu BM25 są wtedy przepisywane)
+        active = current_generation(store_path)
+        unchanged = (active is not None and manifest is not None and not stats["embedded"]
+                     and not removed_ids and files == old_files and manifest.get("lexical") == LEXICAL_VERSION)
+        new_docs.commit()
+        if unchanged:
+            generation = active
+        else:
+            # Magazyn dokumentów: stare fragmenty (bez usuniętych) + nowe, ID rosnąco (strumieniowo)
+            removed = set(removed_ids)
+            old_docs = documents.items() if isinstance(documents, DocStore) else sorted(documents.items(), key=lambda item: item[0])
+            kept = ((i, doc["content"], doc["source"]) for i, doc in old_docs if i not in removed)
+            added = ((i, doc["content"], doc["source"])
+                     for i, doc in DocStore(os.path.join(spool_dir, "docs")).items() if i not in discarded)
+            generation = write_generation(store_path, index, itertools.chain(kept, added), new_manifest)
+
+    if args.remove_legacy:
+        remove_legacy_files(store_path)
 
     # 6. Wyświetl raport
+    total = len(chunk_ids)
+    skipped_pct = (stats["reused_chunks"] / total * 100) if total else 0.0
+    deleted_files = sorted(set(old_files) - set(files))
+    elapsed = time.perf_counter() - started
+    rss = peak_rss_mb()
+
     print("\n--- Ingestion Report ---")
-    print(f"Files processed: {len(txt_files)}")
-    print(f"Chunks indexed: {len(all_sentences)}")
-    print(f"Index saved to: {index_path}")
-    print(f"Metadata saved to: {meta_path}")
+    print(f"Files processed: {len(txt_files)} ({stats['changed_files']} new/changed, "
+          f"{stats['unchanged_files']} unchanged, {len(deleted_files)} deleted)")
+    print(f"Chunks indexed: {total}")
+    print(f"Chunks embedded: {stats['embedded']}")
+    print(f"Chunks reused: {stats['reused_chunks']} ({skipped_pct:.1f}% of re-embedding skipped)")
+    print(f"Chunks removed: {len(removed_ids) - len(discarded)}")
+    if stats["embedded"]:
+        print(f"Embedding throughput: {stats['embedded'] / max(embed_seconds, 1e-9):.1f} chunks/s "
+              f"({args.workers} worker{'s' if args.workers != 1 else ''}, batch {Config.INGEST_BATCH_SIZE})")
+    print(f"Total time: {elapsed:.2f} s ({total / max(elapsed, 1e-9):.1f} chunks/s overall)")
+    if rss is None:
+        print("Peak RSS: n/a")
+    else:
+        print(f"Peak RSS: {rss['main']:.0f} MB main process" + (f", {rss['workers']:.0f} MB largest worker" if args.workers > 1 else ""))
+    if unchanged:
+        print(f"Vector store unchanged, active generation: {generation}")
+    else:
+        print(f"Generation published: {generation} ({os.path.join(store_path, generation)})")
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,10 @@
 import warnings
 import logging
+import json
+import asyncio
+import hmac
+import re
+import time
 import src.tools.definitions
 
 # --- BLOKOWANIE WARNINGÓW ---
@@ -8,13 +13,17 @@ warnings.filterwarnings("ignore", category=UserWarning)
 warnings.filterwarnings("ignore", module="google.auth")
 # -----------------------------
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Path, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from src.core.llm_engine import LLMEngine
-from src.utils.logger import logger
+from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, Response
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from src.utils.logger import logger, new_request_id, reset_request_id, set_request_id
+from src.utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, HTTP_SECONDS, metrics
+from src.utils.readiness import Readiness
+from src.core.sessions import SessionNotFoundError
 from src.config import Config
-from src.core.llm_engine import LLMEngine, LocalLLMStub
 
 app = FastAPI(
     title="AI Stylist API",
@@ -31,29 +40,106 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_time(request: Request, call_next):
+    """Czas obsługi żądania per trasa (szablon ścieżki, nie konkretny URL - np. /session/{session_id})."""
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    if Config.METRICS_ENABLED and route is not None:
+        # Dla /ask/stream to czas do rozpoczęcia strumienia; tury Gemini mierzy ai_stylist_gemini_request_seconds
+        HTTP_SECONDS.labels(request.method, route.path, response.status_code).observe(time.perf_counter() - start)
+    return response
+
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    """ID żądania w każdej linii logu: z nagłówka X-Request-ID (jeśli poprawny) albo nowe; wraca w odpowiedzi."""
+    request_id = request.headers.get("x-request-id", "")
+    if not _REQUEST_ID.match(request_id):
+        request_id = new_request_id()
+    token = set_request_id(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        reset_request_id(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+SESSION_ID_PATTERN = r"^[A-Za-z0-9_-]+$"
+
 # Model zapytania
 class AskRequest(BaseModel):
     query: str
+    # Rozmowa po stronie serwera: session_id kontynuuje sesję, new_session=true otwiera nową (id wraca w odpowiedzi);
+    # bez obu pytanie jest jednorazowe i nie zajmuje miejsca w magazynie sesji
+    session_id: Optional[str] = Field(default=None, max_length=64, pattern=SESSION_ID_PATTERN)
+    new_session: bool = False
+
+class AskBatchRequest(BaseModel):
+    # Niezależne pytania (bez sesji); identyczne są przetwarzane raz
+    queries: List[str] = Field(min_length=1, max_length=Config.ASK_BATCH_MAX_QUERIES)
+    # Limit równoległych pętli LLM/narzędzi dla tego batcha (brak = Config.ASK_BATCH_CONCURRENCY)
+    max_concurrency: Optional[int] = Field(default=None, ge=1, le=Config.ASK_BATCH_CONCURRENCY)
 
-# Inicjalizacja silnika (Lazy loading)
+# Inicjalizacja silnika (Lazy loading) - w tle, serwer od razu odpowiada na /health i /ready
 llm_engine = None
+readiness = Readiness(["embedding_model", "rag_index", "warmup", "llm_engine"])
+_init_task = None
 
-@app.on_event("startup")
-async def startup_event():
+def _initialize_engine():
+    """
+    Ciężkie importy (sentence-transformers/torch, google-genai) i ładowanie modelu dzieją się
+    dopiero tutaj, w wątku - pętla zdarzeń obsługuje w tym czasie /health i /ready.
+    """
     global llm_engine
-    logger.info("Starting up API...")
-    try:
+    from src.core import rag_engine as rag_module
+
+    with readiness.component("embedding_model"):
+        model = rag_module.load_embedding_model()
+    with readiness.component("rag_index"):
+        rag = rag_module.get_rag_engine(model=model)
+    with readiness.component("warmup"):
+        rag.warm_up()
+    with readiness.component("llm_engine"):
+        from src.core.llm_engine import LLMEngine, LocalLLMStub
         if Config.LLM_PROVIDER == "local_stub":
             logger.info("Using LOCAL STUB Engine (Offline mode)")
-            llm_engine = LocalLLMStub()
+            engine = LocalLLMStub()
         else:
             logger.info(f"Using Google Gemini Engine (Model: {Config.GEMINI_MODEL})")
-            llm_engine = LLMEngine()
-            
-        logger.info("LLM Engine initialized.")
+            engine = LLMEngine()
+    llm_engine = engine
+    logger.info("LLM Engine initialized.")
+
+async def _initialize_in_background():
+    try:
+        await asyncio.to_thread(_initialize_engine)
     except Exception as e:
         logger.error(f"Failed to initialize LLM Engine: {e}")
 
+@app.on_event("startup")
+async def startup_event():
+    global _init_task
+    logger.info("Starting up API...")
+    _init_task = asyncio.create_task(_initialize_in_background())
+
+def _resolve_session(request: AskRequest) -> Optional[str]:
+    """
+    session_id musi należeć do sesji założonej przez serwer (404 dla nieznanej albo wygasłej);
+    new_session=true zakłada nową. Silnik bez sesji (stub) odpowiada jednorazowo.
+    """
+    if request.session_id:
+        has_session = getattr(llm_engine, "has_session", None)
+        if has_session is None or not has_session(request.session_id):
+            raise HTTPException(status_code=404, detail="Session not found")
+        return request.session_id
+    if request.new_session:
+        create_session = getattr(llm_engine, "create_session", None)
+        return create_session() if create_session is not None else None
+    return None
+
 @app.post("/ask")
 async def ask_endpoint(request: AskRequest):
     """
@@ -62,20 +148,140 @@ async def ask_endpoint(request: AskRequest):
     if not llm_engine:
         raise HTTPException(status_code=503, detail="System not initialized")
     
+    session_id = _resolve_session(request)
     try:
-        response_text = llm_engine.process_query(request.query)
+        response_text = await llm_engine.aprocess_query(request.query, session_id=session_id)
         return {
             "query": request.query,
             "response": response_text,
+            "session_id": session_id,
             "status": "success"
         }
+    except SessionNotFoundError:
+        # Sesja wygasła w trakcie (między sprawdzeniem a turą)
+        raise HTTPException(status_code=404, detail="Session not found")
     except Exception as e:
         logger.error(f"Error processing request: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ask/batch")
+async def ask_batch_endpoint(request: AskBatchRequest):
+    """
+    Wiele pytań w jednym żądaniu: wspólny retrieval (jedno encode + jedno przeszukanie FAISS),
+    odpowiedzi równolegle z limitem; wynik i czas osobno dla każdego pytania, w kolejności żądania.
+    """
+    if not llm_engine:
+        raise HTTPException(status_code=503, detail="System not initialized")
+
+    batch = await llm_engine.aprocess_batch(request.queries, max_concurrency=request.max_concurrency)
+    return {
+        "results": batch["results"],
+        "timings": {
+            "total_ms": batch["total_ms"],
+            "retrieval_ms": batch["retrieval_ms"],
+        },
+        "unique_queries": batch["unique_queries"],
+        "status": "success"
+    }
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/ask/stream")
+async def ask_stream_endpoint(request: AskRequest):
+    """
+    Strumieniowa wersja /ask (Server-Sent Events).
+    Zdarzenia: start, retrieval, tool_start, tool_end, token, done / blocked / error.
+    """
+    if not llm_engine:
+        raise HTTPException(status_code=503, detail="System not initialized")
+
+    session_id = _resolve_session(request)
+
+    async def events():
+        # Pierwszy bajt od razu - klient wie, że zapytanie jest przetwarzane
+        yield _sse("start", {"query": request.query, "session_id": session_id})
+        try:
+            async for item in llm_engine.astream_query(request.query, session_id=session_id):
+                yield _sse(item["event"], item["data"])
+        except Exception as e:
+            logger.error(f"Error streaming request: {e}")
+            yield _sse("error", {"message": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/session/{session_id}")
+async def end_session_endpoint(session_id: str = Path(max_length=64, pattern=SESSION_ID_PATTERN)):
+    """Kończy rozmowę: usuwa historię i zapamiętane wyniki narzędzi sesji (tylko sesji założonej przez serwer)."""
+    if not llm_engine:
+        raise HTTPException(status_code=503, detail="System not initialized")
+    end_session = getattr(llm_engine, "end_session", None)
+    if end_session is None or not end_session(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"session_id": session_id, "status": "deleted"}
+
+def _require_admin(token: str):
+    # Bez ADMIN_TOKEN endpointy /admin/* są wyłączone (CORS * - inaczej mógłby je wołać każdy, także z przeglądarki)
+    if not Config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints disabled: set ADMIN_TOKEN")
+    if not hmac.compare_digest(token.encode("utf-8"), Config.ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if not llm_engine:
+        raise HTTPException(status_code=503, detail="System not initialized")
+
+@app.get("/admin/rag")
+async def rag_status_endpoint(x_admin_token: str = Header(default="")):
+    """Aktywna generacja indeksu RAG i statystyki przeładowań (czas ładowania i podmiany)."""
+    _require_admin(x_admin_token)
+    return llm_engine.rag.index_status()
+
+@app.get("/admin/cache")
+async def cache_stats_endpoint(x_admin_token: str = Header(default="")):
+    """Statystyki cache: embeddingi i wyniki RAG oraz cache odpowiedzi LLM (hit rate, wygaśnięcia)."""
+    _require_admin(x_admin_token)
+    answer_cache = getattr(llm_engine, "answer_cache", None)
+    sessions = getattr(llm_engine, "sessions", None)
+    return {
+        **llm_engine.rag.cache_stats(),
+        "answers": answer_cache.stats() if answer_cache is not None else None,
+        "sessions": sessions.stats() if sessions is not None else None,
+    }
+
+@app.post("/admin/reload")
+async def rag_reload_endpoint(force: bool = False, x_admin_token: str = Header(default="")):
+    """
+    Przeładowuje indeks RAG bez restartu (np. po data_ingestion.py).
+    Ładowanie idzie w wątku - /ask obsługuje w tym czasie zapytania na starej wersji.
+    """
+    _require_admin(x_admin_token)
+    result = await asyncio.to_thread(llm_engine.rag.reload, not force)
+    if "error" in result:
+        raise HTTPException(status_code=500, detail=result["error"])
+    return {**result, "status": llm_engine.rag.index_status()}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Metryki w formacie Prometheusa: etapy zapytania, tury i czasy Gemini, narzędzia, żądania HTTP."""
+    if not Config.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
+    """Liveness: 503, gdy inicjalizacja się nie powiodła (proces do restartu)."""
+    if readiness.failed:
+        return JSONResponse(status_code=503, content={"status": "error", **readiness.snapshot()})
+    return {"status": "ok" if readiness.ready else "starting"}
+
+@app.get("/ready")
+async def ready_check():
+    """Readiness: 200 dopiero, gdy model, indeks, rozgrzewka i silnik LLM są gotowe; stan każdego komponentu."""
+    snapshot = readiness.snapshot()
+    return JSONResponse(status_code=200 if snapshot["ready"] else 503, content=snapshot)
 
 # Instrukcja uruchomienia (jeśli plik jest uruchamiany bezpośrednio)
 if __name__ == "__main__":
@@ -1,10 +1,15 @@
-import requests
 import re
 import os
+from typing import Dict, List
 from pydantic import BaseModel, Field, field_validator
 from src.tools.registry import registry, SecurityError
+from src.tools.gazetteer import gazetteer
+from src.tools.http_client import get_session
 from src.config import Config
 
+CITY_NAME_PATTERN = r"^[a-zA-Z\sąćęłńóśźżĄĆĘŁŃÓŚŹŻ]+$"
+MAX_TRIP_CITIES = 10
+
 # --- MODELE DANYCH (PYDANTIC) ---
 
 class WeatherArgs(BaseModel):
@@ -13,15 +18,80 @@ class WeatherArgs(BaseModel):
     @field_validator('city')
     def validate_city_name(cls, v):
         # Sanitacja inputu - tylko litery i spacje
-        if not re.match(r"^[a-zA-Z\sąćęłńóśźżĄĆĘŁŃÓŚŹŻ]+$", v):
+        if not re.match(CITY_NAME_PATTERN, v):
             raise ValueError("City name contains invalid characters.")
         return v
 
+class TripWeatherArgs(BaseModel):
+    cities: List[str] = Field(
+        ...,
+        description=f"City names visited on the trip (e.g. [Kraków, Zakopane]). Letters only, max {MAX_TRIP_CITIES}.",
+        min_length=1,
+        max_length=MAX_TRIP_CITIES
+    )
+
+    @field_validator('cities')
+    def validate_city_names(cls, v):
+        for city in v:
+            if not re.match(CITY_NAME_PATTERN, city):
+                raise ValueError(f"City name contains invalid characters: {city}")
+        return v
+
 class ProfileArgs(BaseModel):
     user_id: str = Field(..., description="User identifier (filename without extension).")
 
 # --- IMPLEMENTACJA FUNKCJI ---
 
+def _geocode(city: str):
+    """Współrzędne miasta: najpierw lokalny gazetteer, dopiero potem API geokodowania."""
+    place = gazetteer.lookup(city)
+    if place:
+        return place
+
+    geo_res = get_session().get(
+        Config.OPEN_METEO_GEOCODING_URL,
+        params={"name": city, "count": 1, "language": "en", "format": "json"},
+        timeout=Config.HTTP_TIMEOUT_SECONDS
+    ).json()
+
+    if not geo_res.get("results"):
+        return None
+
+    result = geo_res["results"][0]
+    gazetteer.add(city, result.get("name", city), result["latitude"], result["longitude"])
+    return gazetteer.lookup(city)
+
+def _fetch_current_weather(places: List[Dict]) -> List[Dict]:
+    """Jedno zapytanie o bieżącą pogodę dla wielu lokalizacji (Open-Meteo przyjmuje listy współrzędnych)."""
+    response = get_session().get(
+        Config.OPEN_METEO_FORECAST_URL,
+        params={
+            "latitude": ",".join(str(p["latitude"]) for p in places),
+            "longitude": ",".join(str(p["longitude"]) for p in places),
+            "current": "temperature_2m,rain,snowfall,wind_speed_10m"
+        },
+        timeout=Config.HTTP_TIMEOUT_SECONDS
+    )
+    response.raise_for_status()
+    data = response.json()
+
+    # Dla jednej lokalizacji API zwraca obiekt, dla wielu - listę
+    if isinstance(data, dict):
+        data = [data]
+    # Wyniki przypisujemy miastom po pozycji - krótsza lista przesunęłaby pogodę między miastami
+    if len(data) != len(places):
+        raise ValueError(f"Open-Meteo returned weather for {len(data)} of {len(places)} locations")
+    return [item["current"] for item in data]
+
+def _weather_summary(city: str, curr: Dict) -> Dict:
+    return {
+        "city": city,
+        "temperature_c": curr["temperature_2m"],
+        "is_raining": curr["rain"] > 0,
+        "is_snowing": curr["snowfall"] > 0,
+        "wind_speed_kmh": curr["wind_speed_10m"]
+    }
+
 @registry.register(
     name="get_current_weather",
     description="Gets current weather (temp, rain, wind) for a given city.",
@@ -32,28 +102,38 @@ def get_current_weather(city: str):
     WeatherArgs(city=city)
     
     try:
-        # 1. Geocoding
-        geo_url = f"https://geocoding-api.open-meteo.com/v1/search?name={city}&count=1&language=en&format=json"
-        geo_res = requests.get(geo_url, timeout=5).json()
-        
-        if not geo_res.get("results"):
+        # 1. Geocoding (gazetteer albo API)
+        place = _geocode(city)
+        if not place:
             return {"error": f"City '{city}' not found."}
-            
-        lat = geo_res["results"][0]["latitude"]
-        lon = geo_res["results"][0]["longitude"]
         
         # 2. Weather Data
-        weather_url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,rain,snowfall,wind_speed_10m"
-        weather_res = requests.get(weather_url, timeout=5).json()
-        
-        curr = weather_res["current"]
-        
+        curr = _fetch_current_weather([place])[0]
+        return _weather_summary(city, curr)
+    except Exception as e:
+        raise RuntimeError(f"API connection failed: {str(e)}")
+
+@registry.register(
+    name="get_trip_weather",
+    description="Gets current weather for several cities of a trip in one call. Use it when the user visits more than one city.",
+    args_schema=TripWeatherArgs
+)
+def get_trip_weather(cities: List[str]):
+    TripWeatherArgs(cities=cities)
+
+    try:
+        places = {city: _geocode(city) for city in dict.fromkeys(cities)}
+        found = [city for city, place in places.items() if place]
+
+        # Jedno zapytanie o prognozę dla wszystkich znalezionych miast
+        current = _fetch_current_weather([places[city] for city in found]) if found else []
+        by_city = {city: _weather_summary(city, curr) for city, curr in zip(found, current)}
+
         return {
-            "city": city,
-            "temperature_c": curr["temperature_2m"],
-            "is_raining": curr["rain"] > 0,
-            "is_snowing": curr["snowfall"] > 0,
-            "wind_speed_kmh": curr["wind_speed_10m"]
+            "cities": [
+                by_city.get(city) or {"city": city, "error": f"City '{city}' not found."}
+                for city in dict.fromkeys(cities)
+            ]
         }
     except Exception as e:
         raise RuntimeError(f"API connection failed: {str(e)}")
@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from src.config import Config
+from src.utils.files import atomic_write
+from src.utils.logger import logger
+
+
+def _key(city: str) -> str:
+    return " ".join(city.casefold().split())
+
+
+def _read(path: Optional[str]) -> Dict[str, Dict]:
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to read gazetteer {path}: {e}")
+        return {}
+
+
+class Gazetteer:
+    """
+    Lokalny, trwały cache geokodowania (miasto -> współrzędne).
+    Znane miasta omijają zapytanie do API geokodowania. Plik z repozytorium (path) jest tylko czytany,
+    a miasta znalezione po pierwszym wyszukaniu trafiają do osobnego pliku cache_path (None = tylko w pamięci).
+    """
+
+    def __init__(self, path: str, cache_path: Optional[str] = None):
+        self.path = path
+        self.cache_path = cache_path
+        self._lock = threading.RLock()
+        self._places: Optional[Dict[str, Dict]] = None
+        self._learned: Dict[str, Dict] = {}
+
+    def lookup(self, city: str) -> Optional[Dict]:
+        return self._load().get(_key(city))
+
+    def add(self, city: str, name: str, latitude: float, longitude: float):
+        entry = {"name": name, "latitude": latitude, "longitude": longitude}
+        with self._lock:
+            places = self._load()
+            new = {_key(city): entry}
+            new.setdefault(_key(name), entry)
+            for key, value in new.items():
+                places.setdefault(key, value)
+            self._learned.update(new)
+            self._save()
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._places is None:
+            with self._lock:
+                if self._places is not None:
+                    return self._places
+                self._learned = _read(self.cache_path)
+                # Dane z repozytorium mają pierwszeństwo przed wyuczonymi
+                self._places = {**self._learned, **_read(self.path)}
+        return self._places
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            # Scalenie z plikiem z dysku - inne procesy (workery) mogły dopisać swoje miasta
+            merged = {**_read(self.cache_path), **self._learned}
+            atomic_write(self.cache_path, lambda f: json.dump(merged, f, ensure_ascii=False, indent=2, sort_keys=True),
+                         mode="w")
+        except OSError as e:
+            logger.warning(f"Failed to persist gazetteer cache {self.cache_path}: {e}")
+
+
+gazetteer = Gazetteer(Config.GAZETTEER_PATH, Config.GAZETTEER_CACHE_PATH)
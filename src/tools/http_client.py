@@ -0,0 +1,29 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.config import Config
+
+_session = None
+_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Współdzielona sesja HTTP z pulą połączeń keep-alive.
+    Kolejne zapytania do tego samego hosta (np. Open-Meteo) nie otwierają nowego połączenia TCP/TLS.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=Config.HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=Config.HTTP_POOL_MAXSIZE
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
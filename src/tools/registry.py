@@ -1,10 +1,17 @@
+import asyncio
+import contextvars
 import json
 import functools
+import threading
+import time
 import traceback
-from typing import Callable, Dict, List, Type, Any, Union
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional, Set, Tuple, Type, Any, Union
 from pydantic import BaseModel, ValidationError
 
+from src.config import Config
 from src.utils.logger import logger
+from src.utils.metrics import TOOL_CALLS, TOOL_REJECTIONS, TOOL_SECONDS, TOOL_TIMEOUTS
 
 # Wyjątki
 class ToolError(Exception):
@@ -15,18 +22,153 @@ class SecurityError(ToolError):
     """Błąd bezpieczeństwa (np. path traversal)."""
     pass
 
+class ToolBusyError(ToolError):
+    """Limit równoległych wywołań narzędzia został wyczerpany."""
+    pass
+
+
+class ToolExecutor:
+    """
+    Współdzielona, ograniczona pula wątków dla narzędzi.
+
+    - jedna pula na proces zamiast nowego ThreadPoolExecutor na każde wywołanie,
+    - limit równoległych wywołań per narzędzie (semafor zwalniany dopiero, gdy wątek naprawdę skończy),
+    - liczniki wywołań, timeoutów i "zawieszonych" wątków, które przekroczyły timeout i nadal działają.
+    """
+
+    def __init__(self, max_workers: int, default_limit: int, timeout: float):
+        self.max_workers = max_workers
+        self.default_limit = default_limit
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool-worker")
+
+        self._lock = threading.Lock()
+        self._limits: Dict[str, int] = {}
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._hung: Set[Future] = set()
+        self._counters = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "timed_out": 0,
+            "rejected": 0,
+            "leaked_total": 0,
+        }
+
+    def set_limit(self, tool_name: str, limit: Optional[int] = None):
+        limit = limit or self.default_limit
+        with self._lock:
+            self._limits[tool_name] = limit
+            self._semaphores[tool_name] = threading.BoundedSemaphore(limit)
+            self._in_flight.setdefault(tool_name, 0)
+
+    def submit(self, tool_name: str, func: Callable, kwargs: Dict, wait_for_slot: bool = True) -> Future:
+        if tool_name not in self._semaphores:
+            self.set_limit(tool_name)
+        semaphore = self._semaphores[tool_name]
+
+        acquired = semaphore.acquire(timeout=self.timeout) if wait_for_slot else semaphore.acquire(blocking=False)
+        if not acquired:
+            if wait_for_slot:
+                self._count("rejected")
+                TOOL_REJECTIONS.labels(tool_name).inc()
+            raise ToolBusyError(f"Concurrency limit ({self._limits[tool_name]}) reached for tool '{tool_name}'.")
+
+        with self._lock:
+            self._counters["submitted"] += 1
+            self._in_flight[tool_name] += 1
+
+        started = time.perf_counter()
+        try:
+            # Kontekst wywołującego (m.in. request_id dla logów) także w wątku puli
+            future = self._pool.submit(contextvars.copy_context().run, func, **kwargs)
+        except BaseException:
+            # Zadanie nie trafiło do puli (np. argumenty nie są mapą) - _on_done nie zwolni slotu
+            with self._lock:
+                self._counters["submitted"] -= 1
+                self._in_flight[tool_name] -= 1
+            semaphore.release()
+            raise
+        future.add_done_callback(lambda f: self._on_done(tool_name, semaphore, f, started))
+        return future
+
+    def result(self, tool_name: str, future: Future, deadline: Optional[float] = None) -> Any:
+        # deadline (time.monotonic) pozwala czekać na kilka równoległych wywołań ze wspólnym limitem
+        timeout = self.timeout if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self._on_timeout(tool_name, future)
+            raise
+
+    async def aresult(self, tool_name: str, future: Future) -> Any:
+        try:
+            # shield: timeout po stronie asyncio nie może anulować Future z puli
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._on_timeout(tool_name, future)
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["pool_size"] = self.max_workers
+            stats["hung"] = len(self._hung)
+            stats["tools"] = {
+                name: {"in_flight": self._in_flight.get(name, 0), "limit": limit}
+                for name, limit in self._limits.items()
+            }
+            return stats
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _on_timeout(self, tool_name: str, future: Future):
+        self._count("timed_out")
+        TOOL_TIMEOUTS.labels(tool_name).inc()
+        # Jeśli zadanie jeszcze nie wystartowało (czeka w kolejce) - po prostu je anulujemy
+        if future.cancel():
+            return
+        with self._lock:
+            if not future.done():
+                self._hung.add(future)
+                self._counters["leaked_total"] += 1
+                logger.warning(f"Tool worker still running after timeout ({len(self._hung)} hung).")
+
+    def _on_done(self, tool_name: str, semaphore: threading.BoundedSemaphore, future: Future, started: float):
+        semaphore.release()
+        failed = future.cancelled() or future.exception() is not None
+        with self._lock:
+            self._in_flight[tool_name] -= 1
+            self._hung.discard(future)
+            self._counters["failed" if failed else "completed"] += 1
+        # Czas do zakończenia wątku - także dla wywołań, na które przestaliśmy czekać (timeout)
+        TOOL_SECONDS.labels(tool_name).observe(time.perf_counter() - started)
+        TOOL_CALLS.labels(tool_name, "error" if failed else "success").inc()
+
 class ToolRegistry:
     def __init__(self):
         self._tools: Dict[str, Callable] = {}
         self._schemas: Dict[str, Dict] = {}
+        self.executor = ToolExecutor(
+            max_workers=Config.TOOL_POOL_SIZE,
+            default_limit=Config.TOOL_MAX_CONCURRENCY,
+            timeout=Config.TOOL_TIMEOUT_SECONDS
+        )
 
-    def register(self, name: str, description: str, args_schema: Type[BaseModel]):
+    def register(self, name: str, description: str, args_schema: Type[BaseModel], max_concurrency: Optional[int] = None):
         def decorator(func: Callable):
             @functools.wraps(func)
             def wrapper(*args, **kwargs):
                 return func(*args, **kwargs)
             
             self._tools[name] = wrapper
+            self.executor.set_limit(name, max_concurrency)
             self._schemas[name] = {
                 "type": "function",
                 "function": {
@@ -48,8 +190,53 @@ class ToolRegistry:
         """
         Dispatcher wykonujący narzędzie.
         """
-        logger.info(f"Executing tool: {tool_name} with args: {arguments}")
-        
+        logger.info("Executing tool: %s with args: %.200s", tool_name, arguments)
+        return self._finish(tool_name, self._start(tool_name, arguments))
+
+    def execute_many(self, calls: List[Tuple[str, Union[dict, str]]]) -> List[str]:
+        """
+        Wykonuje kilka niezależnych wywołań naraz (np. kilka function_call z jednej tury modelu).
+        Wszystkie trafiają do puli przed czekaniem na wyniki, więc całość trwa tyle, co najwolniejsze.
+        """
+        started = []
+        for tool_name, arguments in calls:
+            logger.info("Executing tool: %s with args: %.200s", tool_name, arguments)
+            started.append((tool_name, self._start(tool_name, arguments)))
+
+        deadline = time.monotonic() + self.executor.timeout
+        return [self._finish(tool_name, pending, deadline) for tool_name, pending in started]
+
+    async def aexecute(self, tool_name: str, arguments: Union[dict, str]) -> str:
+        """
+        Asynchroniczny dispatcher: narzędzia są blokujące (HTTP, pliki),
+        więc wykonujemy je w puli, a pętla zdarzeń tylko czeka na Future.
+        """
+        logger.info("Executing tool: %s with args: %.200s", tool_name, arguments)
+        pending = self._start(tool_name, arguments, wait_for_slot=False)
+        if isinstance(pending, ToolBusyError):
+            # Limit równoległości narzędzia wyczerpany - czekamy na slot poza pętlą zdarzeń
+            pending = await asyncio.to_thread(self._start, tool_name, arguments)
+        if isinstance(pending, str):
+            return pending
+
+        try:
+            result = await self.executor.aresult(tool_name, pending)
+        except Exception as e:
+            return self._error_response(tool_name, e)
+        logger.info("Tool %s success.", tool_name)
+        return json.dumps(result, ensure_ascii=False)
+
+    async def aexecute_many(self, calls: List[Tuple[str, Union[dict, str]]]) -> List[str]:
+        return list(await asyncio.gather(*(self.aexecute(name, args) for name, args in calls)))
+
+    def stats(self) -> Dict[str, Any]:
+        return self.executor.stats()
+
+    def _start(self, tool_name: str, arguments: Union[dict, str], wait_for_slot: bool = True):
+        """
+        Waliduje wywołanie i wysyła je do puli.
+        Zwraca Future, gotowy JSON z błędem albo (gdy wait_for_slot=False) ToolBusyError.
+        """
         if tool_name not in self._tools:
             logger.warning(f"Tool not found: {tool_name}")
             return json.dumps({"error": f"Tool '{tool_name}' not found or not allowed."})
@@ -59,26 +246,44 @@ class ToolRegistry:
                 args_dict = json.loads(arguments)
             else:
                 args_dict = arguments
+            # Gemini podaje args=None dla wywołania bez argumentów; JSON musi być obiektem
+            if args_dict is None:
+                args_dict = {}
+            if not isinstance(args_dict, dict):
+                raise TypeError(f"arguments must be a JSON object, got {type(args_dict).__name__}")
 
             tool_func = self._tools[tool_name]
-            
-            # Switch to ThreadPoolExecutor for thread-safe timeouts without signals
-            from concurrent.futures import ThreadPoolExecutor, TimeoutError
-            
-            # Nie używamy 'with', bo domyślnie czeka na zakończenie wątku (shutdown wait=True)
-            executor = ThreadPoolExecutor(max_workers=1)
-            future = executor.submit(tool_func, **args_dict)
-            
-            try:
-                result = future.result(timeout=5)
-                executor.shutdown(wait=False)
-            except TimeoutError:
-                logger.error(f"Tool {tool_name} timed out.")
-                executor.shutdown(wait=False)
-                return json.dumps({"error": "Tool execution timed out"})
-            
-            logger.info(f"Tool {tool_name} success.")
-            return json.dumps(result, ensure_ascii=False)
+            return self.executor.submit(tool_name, tool_func, args_dict, wait_for_slot=wait_for_slot)
+        except ToolBusyError as e:
+            if not wait_for_slot:
+                return e
+            return self._error_response(tool_name, e)
+        except Exception as e:
+            return self._error_response(tool_name, e)
+
+    def _finish(self, tool_name: str, pending, deadline: Optional[float] = None) -> str:
+        if isinstance(pending, str):
+            return pending
+
+        try:
+            result = self.executor.result(tool_name, pending, deadline)
+        except Exception as e:
+            return self._error_response(tool_name, e)
+
+        logger.info("Tool %s success.", tool_name)
+        return json.dumps(result, ensure_ascii=False)
+
+    def _error_response(self, tool_name: str, error: Exception) -> str:
+        try:
+            raise error
+
+        except (FutureTimeoutError, asyncio.TimeoutError):
+            logger.error(f"Tool {tool_name} timed out.")
+            return json.dumps({"error": "Tool execution timed out"})
+
+        except ToolBusyError:
+            logger.error(f"Tool {tool_name} rejected: concurrency limit reached.")
+            return json.dumps({"error": "Tool is busy, try again later."})
 
         except json.JSONDecodeError:
             msg = "Invalid JSON arguments format."
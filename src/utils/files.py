@@ -0,0 +1,16 @@
+import os
+import tempfile
+
+
+def atomic_write(path: str, write_fn, mode: str = "wb"):
+    """Zapis przez plik tymczasowy + os.replace: czytelnik nigdy nie zobaczy pół pliku."""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+            write_fn(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
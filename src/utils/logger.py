@@ -1,29 +1,220 @@
+import atexit
+import contextvars
+import json
 import logging
-import sys
 import os
+import queue
+import random
+import sys
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+
 from src.config import Config
+from src.utils.files import atomic_write
+from src.utils.metrics import LOG_RECORDS_DROPPED
 
-def setup_logger(name="AI_Stylist"):
-    # Tworzymy folder logs jeśli nie istnieje
-    log_dir = os.path.join(Config.BASE_DIR, "logs")
-    os.makedirs(log_dir, exist_ok=True)
-    
+# ID żądania HTTP (ustawiane w middleware main_api), dołączane do każdego rekordu z tego żądania
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Atrybuty każdego LogRecord - wszystko poza nimi pochodzi z extra={...} i trafia do JSON-a jako pole
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listeners: Dict[str, QueueListener] = {}
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def set_request_id(request_id: Optional[str]) -> contextvars.Token:
+    return request_id_var.set(request_id)
+
+
+def reset_request_id(token: contextvars.Token):
+    request_id_var.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    """Jeden rekord = jedna linia JSON (ts, level, logger, request_id, message, pola z extra, exc)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", None),
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler, który rotuje także co rotate_seconds (liczone od założenia bieżącego pliku),
+    cokolwiek nastąpi pierwsze. Kopie jak w RotatingFileHandler: app.log.1 ... app.log.<backup_count>.
+    Czas założenia pliku jest zapisany obok (app.log.rollover), więc restart procesu go nie zeruje.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 0, rotate_seconds: float = 0, backup_count: int = 0):
+        # delay=False: plik od razu istnieje, a przy pustym pliku czas rotacji liczymy od teraz
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.rotate_seconds = rotate_seconds
+        self.rollover_path = self.baseFilename + ".rollover"
+        self._opened_at = self._load_opened_at() if self.rotate_seconds > 0 else time.time()
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.rotate_seconds > 0 and record.created - self._opened_at >= self.rotate_seconds:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        self._opened_at = time.time()
+        if self.rotate_seconds > 0:
+            self._save_opened_at()
+
+    def _load_opened_at(self) -> float:
+        if os.path.getsize(self.baseFilename) == 0:
+            self._opened_at = time.time()
+        else:
+            try:
+                with open(self.rollover_path, encoding="utf-8") as f:
+                    return float(f.read())
+            except (OSError, ValueError):
+                # Plik bez zapisanego czasu (np. sprzed tej wersji) - najlepsze przybliżenie to mtime,
+                # jak w TimedRotatingFileHandler
+                self._opened_at = os.path.getmtime(self.baseFilename)
+        self._save_opened_at()
+        return self._opened_at
+
+    def _save_opened_at(self):
+        try:
+            atomic_write(self.rollover_path, lambda f: f.write(repr(self._opened_at)), mode="w")
+        except OSError:
+            pass  # bez zapisu rotacja po czasie i tak działa do końca procesu
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Dodaje request_id i próbkuje INFO/DEBUG (sample_rate < 1); WARNING i wyżej przechodzą zawsze.
+    Decyzja zależy od ID żądania, więc z próbkowanego żądania zostają wszystkie jego linie.
+    """
+
+    def __init__(self, sample_rate: float = 1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = request_id_var.get()
+        record.request_id = request_id
+        if self.sample_rate >= 1.0 or record.levelno >= logging.WARNING:
+            return True
+        if request_id is None:
+            return random.random() < self.sample_rate
+        return zlib.crc32(request_id.encode()) / 0xFFFFFFFF < self.sample_rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Wątek żądania tylko wkłada rekord do ograniczonej kolejki; formatowanie i zapis robi QueueListener.
+    Pełna kolejka (dysk nie nadąża) = rekord odrzucony i policzony, zamiast blokować żądanie.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Tylko to, czego nie da się odtworzyć w innym wątku: treść (args mogą być mutowalne) i traceback
+        # Płytka kopia (bez __init__ LogRecord) - rekord widzą jeszcze inne handlery, np. root
+        message = record.getMessage()
+        copy = object.__new__(type(record))
+        copy.__dict__ = record.__dict__.copy()
+        record = copy
+        record.msg = message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+def _file_formatter() -> logging.Formatter:
+    if Config.LOG_FORMAT == "json":
+        return JsonFormatter()
+    if Config.LOG_FORMAT == "text":
+        return logging.Formatter(TEXT_FORMAT)
+    raise ValueError(f"Unknown LOG_FORMAT: {Config.LOG_FORMAT}")
+
+
+def setup_logger(name="AI_Stylist", log_dir: Optional[str] = None, stream=None):
+    """
+    Logger zapisujący przez kolejkę w tle: plik (JSON lines, rotacja wg rozmiaru i czasu) i konsola (tekst).
+    Kolejne wywołanie dla tej samej nazwy zwraca skonfigurowany logger bez dokładania handlerów.
+    """
     logger = logging.getLogger(name)
+    if name in _listeners:
+        return logger
     logger.setLevel(Config.LOG_LEVEL)
-    
-    # Format logowania: Czas - Poziom - Wiadomość
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    
-    # Handler plikowy (do pliku app.log)
-    file_handler = logging.FileHandler(os.path.join(log_dir, "app.log"))
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    
+
+    # Tworzymy folder logs jeśli nie istnieje
+    log_dir = log_dir or os.path.join(Config.BASE_DIR, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+
+    file_handler = SizeAndTimeRotatingFileHandler(
+        os.path.join(log_dir, "app.log"),
+        max_bytes=Config.LOG_MAX_BYTES,
+        rotate_seconds=Config.LOG_ROTATE_SECONDS,
+        backup_count=Config.LOG_BACKUP_COUNT,
+    )
+    file_handler.setFormatter(_file_formatter())
+
     # Handler konsolowy (żebyś widział w terminalu co się dzieje)
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    
+    console_handler = logging.StreamHandler(stream or sys.stdout)
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    queue_handler = DroppingQueueHandler(queue.Queue(Config.LOG_QUEUE_SIZE))
+    queue_handler.addFilter(RequestContextFilter(Config.LOG_INFO_SAMPLE_RATE))
+    listener = QueueListener(queue_handler.queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    _listeners[name] = listener
+
+    logger.addHandler(queue_handler)
     return logger
 
-logger = setup_logger()
\ No newline at end of file
+
+def shutdown_logger(name="AI_Stylist"):
+    """Zapisuje zaległe rekordy z kolejki i zamyka pliki (przy wyjściu procesu dla wszystkich loggerów)."""
+    listener = _listeners.pop(name, None)
+    if listener is None:
+        return
+    listener.stop()
+    logger = logging.getLogger(name)
+    for handler in [h for h in logger.handlers if isinstance(h, DroppingQueueHandler)]:
+        logger.removeHandler(handler)
+    for handler in listener.handlers:
+        handler.close()
+
+
+@atexit.register
+def _shutdown_all():
+    for name in list(_listeners):
+        shutdown_logger(name)
+
+
+logger = setup_logger()
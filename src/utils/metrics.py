@@ -0,0 +1,235 @@
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Sequence, Tuple
+
+from src.config import Config
+
+# Format tekstowy Prometheusa (GET /metrics)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Progi histogramów czasu (sekundy): od guardrails (~µs) po Gemini i narzędzia HTTP (sekundy)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TURN_BUCKETS = (1, 2, 3, 4, 5, 6)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        if not Config.METRICS_ENABLED:
+            return
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(buckets) + 1)  # ostatni kubełek = +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        if not Config.METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> "_Timer":
+        """Mierzy czas bloku `with` (także zakończonego wyjątkiem)."""
+        return _Timer(self)
+
+
+class _Timer:
+    # Zwykła klasa zamiast @contextmanager - kilka razy tańsza na gorącej ścieżce
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child: _HistogramChild):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values: str):
+        """Seria dla konkretnych wartości etykiet (tworzona przy pierwszym użyciu, potem z dict)."""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        ...
+
+    @abstractmethod
+    def _render_child(self, values: Tuple[str, ...], child) -> List[str]:
+        ...
+
+    def series(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return sorted(self._children.items())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self.series():
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _number(bound)
+            bucket_labels = _labels(self.labelnames, values, 'le="' + le + '"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metryki procesu w pamięci. Zapis to inkrementacja pod blokadą jednej serii,
+    a tekst dla Prometheusa powstaje dopiero przy scrape'ie (render) - bez scrape'owania koszt jest pomijalny.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# Etapy obsługi zapytania (etykieta stage):
+# guardrails_input, guardrails_output, encode, faiss_search, bm25_search, context
+STAGE_SECONDS = metrics.histogram(
+    "ai_stylist_stage_seconds", "Czas etapu obsługi zapytania.", ["stage"]
+)
+GEMINI_SECONDS = metrics.histogram(
+    "ai_stylist_gemini_request_seconds", "Czas jednego wywołania Gemini (tura rozmowy).", ["mode"]
+)
+GEMINI_ERRORS = metrics.counter(
+    "ai_stylist_gemini_errors_total", "Wywołania Gemini zakończone błędem.", ["mode"]
+)
+GEMINI_TOKENS = metrics.counter(
+    "ai_stylist_gemini_tokens_total", "Tokeny z usage_metadata odpowiedzi Gemini (kind: prompt/cached/output).", ["kind"]
+)
+LLM_TURNS = metrics.histogram(
+    "ai_stylist_llm_turns", "Liczba wywołań Gemini na zapytanie (1 = odpowiedź bez narzędzi).", buckets=TURN_BUCKETS
+)
+TOOL_SECONDS = metrics.histogram(
+    "ai_stylist_tool_seconds", "Czas wykonania narzędzia w puli (od zlecenia do zakończenia wątku).", ["tool"]
+)
+TOOL_CALLS = metrics.counter(
+    "ai_stylist_tool_calls_total", "Zakończone wywołania narzędzi według wyniku (success/error).", ["tool", "outcome"]
+)
+TOOL_TIMEOUTS = metrics.counter(
+    "ai_stylist_tool_timeouts_total", "Wywołania narzędzi, na które przestaliśmy czekać po TOOL_TIMEOUT_SECONDS.", ["tool"]
+)
+TOOL_REJECTIONS = metrics.counter(
+    "ai_stylist_tool_rejections_total", "Wywołania odrzucone przez limit równoległości narzędzia.", ["tool"]
+)
+HTTP_SECONDS = metrics.histogram(
+    "ai_stylist_http_request_seconds", "Czas obsługi żądania HTTP.", ["method", "route", "status"]
+)
+LOG_RECORDS_DROPPED = metrics.counter(
+    "ai_stylist_log_records_dropped_total", "Rekordy logów odrzucone, bo kolejka do wątku zapisu była pełna."
+)
@@ -0,0 +1,67 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+from src.utils.logger import logger
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class Readiness:
+    """
+    Stan komponentów ładowanych w tle przy starcie (model, indeks, silnik LLM...).
+    Każdy komponent: pending -> loading -> ready/failed, z czasem ładowania i ewentualnym błędem.
+    """
+
+    def __init__(self, components: Iterable[str]):
+        self._lock = threading.Lock()
+        self._components: Dict[str, Dict] = {
+            name: {"state": PENDING, "duration_ms": None, "error": None} for name in components
+        }
+        self.started_at = time.time()
+        self.ready_at: Optional[float] = None
+
+    def set_state(self, name: str, state: str, duration_ms: Optional[float] = None, error: Optional[str] = None):
+        with self._lock:
+            self._components[name] = {"state": state, "duration_ms": duration_ms, "error": error}
+            if self.ready_at is None and all(c["state"] == READY for c in self._components.values()):
+                self.ready_at = time.time()
+
+    @contextmanager
+    def component(self, name: str):
+        """Oznacza komponent jako ładowany; po wyjściu ready (z czasem) albo failed (z błędem)."""
+        self.set_state(name, LOADING)
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            duration_ms = (time.perf_counter() - start) * 1000
+            logger.error(f"Startup component '{name}' failed after {duration_ms:.0f} ms: {e}")
+            self.set_state(name, FAILED, duration_ms, str(e))
+            raise
+        duration_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"Startup component '{name}' ready in {duration_ms:.0f} ms")
+        self.set_state(name, READY, duration_ms)
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return all(c["state"] == READY for c in self._components.values())
+
+    @property
+    def failed(self) -> bool:
+        with self._lock:
+            return any(c["state"] == FAILED for c in self._components.values())
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            components = {name: dict(c) for name, c in self._components.items()}
+        return {
+            "ready": all(c["state"] == READY for c in components.values()),
+            "components": components,
+            "startup_seconds": (self.ready_at - self.started_at) if self.ready_at else None,
+        }
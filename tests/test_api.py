@@ -0,0 +1,257 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import src.main_api as api
+from src.utils.readiness import Readiness
+
+
+@pytest.fixture
+def fresh_api(monkeypatch):
+    monkeypatch.setattr(api, "readiness", Readiness(["embedding_model", "llm_engine"]))
+    monkeypatch.setattr(api, "llm_engine", None)
+    return api
+
+
+async def _get(path):
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get(path)
+        return response.status_code, response.json()
+
+
+def test_ready_reports_components_while_loading_in_background(fresh_api, monkeypatch):
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_initialize():
+        with api.readiness.component("embedding_model"):
+            entered.set()
+            release.wait(5)
+        with api.readiness.component("llm_engine"):
+            api.llm_engine = object()
+
+    monkeypatch.setattr(api, "_initialize_engine", slow_initialize)
+
+    async def scenario():
+        await api.startup_event()
+        await asyncio.to_thread(entered.wait, 5)
+        # Serwer odpowiada od razu, choć model się jeszcze ładuje
+        health = await _get("/health")
+        ready = await _get("/ready")
+        release.set()
+        await api._init_task
+        return health, ready, await _get("/ready")
+
+    health, (loading_status, loading), (ready_status, ready) = asyncio.run(scenario())
+
+    assert health == (200, {"status": "starting"})
+    assert loading_status == 503 and loading["ready"] is False
+    assert loading["components"]["embedding_model"]["state"] == "loading"
+    assert loading["components"]["llm_engine"]["state"] == "pending"
+    assert ready_status == 200 and ready["ready"] is True
+    assert ready["components"]["embedding_model"]["duration_ms"] is not None
+
+
+def test_health_fails_when_initialisation_fails(fresh_api, monkeypatch):
+    def broken_initialize():
+        with api.readiness.component("embedding_model"):
+            raise OSError("model files missing")
+
+    monkeypatch.setattr(api, "_initialize_engine", broken_initialize)
+
+    async def scenario():
+        await api.startup_event()
+        await api._init_task
+        return await _get("/health"), await _get("/ready")
+
+    (health_status, health), (ready_status, ready) = asyncio.run(scenario())
+
+    assert health_status == 503 and health["status"] == "error"
+    assert ready_status == 503
+    component = ready["components"]["embedding_model"]
+    assert component["state"] == "failed" and component["error"] == "model files missing"
+
+
+def test_ask_assigns_and_keeps_session_id(fresh_api, monkeypatch):
+    class RecordingEngine:
+        def __init__(self):
+            self.sessions = []
+            self.issued = set()
+
+        def create_session(self):
+            self.issued.add(f"issued-{len(self.issued)}")
+            return f"issued-{len(self.issued) - 1}"
+
+        def has_session(self, session_id):
+            return session_id in self.issued
+
+        def end_session(self, session_id):
+            if session_id not in self.issued:
+                return False
+            self.issued.discard(session_id)
+            return True
+
+        async def aprocess_query(self, query, session_id=None):
+            self.sessions.append(session_id)
+            return "ok"
+
+    engine = RecordingEngine()
+    monkeypatch.setattr(api, "llm_engine", engine)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            one_shot = (await client.post("/ask", json={"query": "Jaka pogoda?"})).json()
+            first = (await client.post("/ask", json={"query": "Co na wesele?", "new_session": True})).json()
+            second = await client.post("/ask", json={"query": "A buty?", "session_id": first["session_id"]})
+            invalid = await client.post("/ask", json={"query": "x", "session_id": "../etc"})
+            # Id, którego serwer nie wydał, nie otwiera sesji; to samo przy usuwaniu i strumieniu
+            unknown = await client.post("/ask", json={"query": "x", "session_id": "guessed-id"})
+            unknown_stream = await client.post("/ask/stream", json={"query": "x", "session_id": "guessed-id"})
+            unknown_delete = await client.delete("/session/guessed-id")
+            deleted = await client.delete(f"/session/{first['session_id']}")
+            after_delete = await client.post("/ask", json={"query": "x", "session_id": first["session_id"]})
+            statuses = [unknown.status_code, unknown_stream.status_code, unknown_delete.status_code,
+                        deleted.status_code, after_delete.status_code]
+            return one_shot, first, second.json(), invalid.status_code, statuses
+
+    one_shot, first, second, invalid_status, statuses = asyncio.run(scenario())
+    assert statuses == [404, 404, 404, 200, 404]
+    # Pytanie bez session_id / new_session nie otwiera sesji
+    assert one_shot["session_id"] is None
+    assert first["session_id"] and second["session_id"] == first["session_id"]
+    assert engine.sessions == [None] + [first["session_id"]] * 2
+    assert invalid_status == 422
+
+
+def test_ask_batch_returns_per_item_results(fresh_api, monkeypatch):
+    class BatchEngine:
+        async def aprocess_batch(self, queries, max_concurrency=None):
+            self.max_concurrency = max_concurrency
+            return {"results": [{"query": q, "response": q.upper(), "status": "success", "duration_ms": 1.0,
+                                 "deduplicated": False} for q in queries],
+                    "unique_queries": len(queries), "retrieval_ms": 2.0, "total_ms": 3.0}
+
+    engine = BatchEngine()
+    monkeypatch.setattr(api, "llm_engine", engine)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            ok = await client.post("/ask/batch", json={"queries": ["a", "b"], "max_concurrency": 2})
+            empty = await client.post("/ask/batch", json={"queries": []})
+            return ok.json(), empty.status_code
+
+    body, empty_status = asyncio.run(scenario())
+    assert [r["response"] for r in body["results"]] == ["A", "B"]
+    assert body["timings"] == {"total_ms": 3.0, "retrieval_ms": 2.0} and engine.max_concurrency == 2
+    assert empty_status == 422
+
+
+def test_metrics_endpoint_exposes_stage_and_request_histograms(fresh_api, monkeypatch):
+    from src.core.guardrails import guardrails
+
+    class Engine:
+        async def aprocess_query(self, query, session_id=None):
+            guardrails.validate_input(query)
+            return "ok"
+
+    monkeypatch.setattr(api, "llm_engine", Engine())
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.post("/ask", json={"query": "Co na wesele?"})
+            return await client.get("/metrics")
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    assert "# TYPE ai_stylist_stage_seconds histogram" in lines
+    assert any(l.startswith('ai_stylist_stage_seconds_count{stage="guardrails_input"} ') for l in lines)
+    assert any(l.startswith('ai_stylist_http_request_seconds_bucket{method="POST",route="/ask",status="200",le="+Inf"} ')
+               for l in lines)
+
+
+def test_request_id_reaches_engine_and_response_header(fresh_api, monkeypatch):
+    from src.utils.logger import request_id_var
+
+    seen = []
+
+    class Engine:
+        async def aprocess_query(self, query, session_id=None):
+            seen.append(request_id_var.get())
+            return "ok"
+
+    monkeypatch.setattr(api, "llm_engine", Engine())
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            given = await client.post("/ask", json={"query": "a"}, headers={"X-Request-ID": "trace-42"})
+            invalid = await client.post("/ask", json={"query": "a"}, headers={"X-Request-ID": "bad id\n"})
+            return given.headers["X-Request-ID"], invalid.headers["X-Request-ID"]
+
+    given, generated = asyncio.run(scenario())
+    assert given == "trace-42" and seen[0] == "trace-42"
+    assert generated == seen[1] and len(generated) == 16
+    assert request_id_var.get() is None
+
+
+def test_load_harness_reports_latency_percentiles_and_errors(fresh_api, monkeypatch):
+    from benchmarks.bench_load import closed_loop, open_loop, summarize
+
+    class Engine:
+        async def aprocess_query(self, query, session_id=None):
+            await asyncio.sleep(0.001)
+            if "upał" in query:
+                raise RuntimeError("boom")
+            if "poliester" in query:
+                return "Błąd API Gemini: 503 UNAVAILABLE"
+            return "ok"
+
+    monkeypatch.setattr(api, "llm_engine", Engine())
+    queries = ["Co na wesele?", "Jest upał", "Czy poliester?", "Co na spacer?"]
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            closed = await closed_loop(client, "/ask", concurrency=3, requests=8, queries=queries)
+            opened = await open_loop(client, "/ask", rate=500, requests=4, queries=queries)
+            return closed, opened
+
+    closed, opened = asyncio.run(scenario())
+    report = summarize(closed, elapsed_s=0.5)
+    assert report["requests"] == 8 and report["errors"] == 4 and report["error_rate"] == 0.5
+    assert report["status_codes"] == {"200": 6, "500": 2}
+    assert report["throughput_rps"] == 16.0
+    lat = report["latency_ms"]
+    assert 0 < lat["p50"] <= lat["p95"] <= lat["p99"] <= lat["max"]
+    assert len(opened) == 4 and sorted(s["start_s"] for s in opened) == [s["start_s"] for s in opened]
+
+
+def test_admin_endpoints_require_configured_token(fresh_api, monkeypatch):
+    class StatsRag:
+        def cache_stats(self):
+            return {"embeddings": {}, "results": {}}
+
+    class Engine:
+        rag = StatsRag()
+
+    monkeypatch.setattr(api, "llm_engine", Engine())
+
+    async def get(token=None):
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = {"X-Admin-Token": token} if token is not None else {}
+            return (await client.get("/admin/cache", headers=headers)).status_code
+
+    monkeypatch.setattr(api.Config, "ADMIN_TOKEN", "")
+    assert asyncio.run(get()) == 403
+    assert asyncio.run(get("")) == 403
+
+    monkeypatch.setattr(api.Config, "ADMIN_TOKEN", "s3cret")
+    assert asyncio.run(get("wrong")) == 403
+    assert asyncio.run(get("s3cret")) == 200
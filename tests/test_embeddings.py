@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from src.core.embeddings import BACKENDS, EmbeddingBackend, create_embedding_backend
+
+ort = pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+
+TEXTS = [
+    "ala ma kota",
+    "zimą wełna",
+    "a",
+    "długi tekst o kolorach ubrań i tkaninach na lato, który nie mieści się w limicie tokenów modelu",
+]
+
+
+@pytest.fixture(scope="module")
+def tiny_model(tmp_path_factory):
+    """
+    Mały losowy BERT zapisany jako model sentence-transformers + eksport ONNX (fp32 i int8),
+    w takim samym układzie plików jak repozytoria sentence-transformers na HF Hub.
+    """
+    torch = pytest.importorskip("torch")
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    root = tmp_path_factory.mktemp("tiny_model")
+    letters = "abcdefghijklmnopqrstuvwxyząćęłńóśźż"
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + list(letters) + ["##" + c for c in letters]
+    (root / "vocab.txt").write_text("\n".join(vocab), encoding="utf-8")
+    tokenizer = BertTokenizerFast(str(root / "vocab.txt"))
+
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=64, max_position_embeddings=64)
+    bert = BertModel(config).eval()
+    bert.save_pretrained(root / "bert")
+    tokenizer.save_pretrained(root / "bert")
+
+    model_dir = root / "st"
+    transformer = models.Transformer(str(root / "bert"), max_seq_length=32)
+    SentenceTransformer(modules=[transformer, models.Pooling(32), models.Normalize()]).save(str(model_dir))
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids).last_hidden_state
+
+    (model_dir / "onnx").mkdir()
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    sample = tokenizer(["ala ma kota"], return_tensors="pt")
+    torch.onnx.export(
+        LastHiddenState(bert), tuple(sample[n] for n in names), str(model_dir / "onnx" / "model.onnx"),
+        input_names=names, output_names=["last_hidden_state"],
+        dynamic_axes={n: {0: "batch", 1: "sequence"} for n in names + ["last_hidden_state"]},
+        dynamo=False,
+    )
+    quantize_dynamic(str(model_dir / "onnx" / "model.onnx"), str(model_dir / "onnx" / "model_quint8_avx2.onnx"),
+                     weight_type=QuantType.QUInt8)
+    return str(model_dir)
+
+
+def _cosine(a, b):
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+@pytest.mark.parametrize("backend, min_cosine", [("onnx", 0.9999), ("onnx_int8", 0.99)])
+def test_onnx_backend_matches_pytorch(tiny_model, backend, min_cosine):
+    reference = create_embedding_backend("sentence_transformers", tiny_model).encode(TEXTS)
+    onnx_backend = create_embedding_backend(backend, tiny_model)
+    embeddings = onnx_backend.encode(TEXTS)
+
+    assert embeddings.dtype == np.float32 and embeddings.shape == reference.shape
+    assert onnx_backend.dimension == reference.shape[1]
+    assert _cosine(embeddings, reference).min() >= min_cosine
+    # Batchowanie i sortowanie po długości nie zmienia kolejności wyników
+    assert np.allclose(onnx_backend.encode(TEXTS[::-1]), embeddings[::-1], atol=1e-5)
+
+
+def test_unknown_backend_is_rejected():
+    assert "onnx_int8" in BACKENDS
+    with pytest.raises(ValueError):
+        create_embedding_backend("tensorrt")
+    # Backend bez encode() nie da się utworzyć
+    with pytest.raises(TypeError):
+        type("NoEncode", (EmbeddingBackend,), {})()
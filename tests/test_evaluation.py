@@ -0,0 +1,74 @@
+import json
+import time
+
+import run_evaluation
+from src.utils.metrics import GEMINI_TOKENS, STAGE_SECONDS
+
+
+class TimedEngine:
+    """Silnik, który zapisuje etapy i tokeny w metrykach jak LLMEngine."""
+
+    def __init__(self, delay: float, prompt_tokens: int):
+        self.delay = delay
+        self.prompt_tokens = prompt_tokens
+        self.calls = 0
+
+    def process_query(self, query):
+        self.calls += 1
+        STAGE_SECONDS.labels("encode").observe(0.002)
+        time.sleep(self.delay)
+        GEMINI_TOKENS.labels("prompt").inc(self.prompt_tokens)
+        GEMINI_TOKENS.labels("output").inc(10)
+        return "len i lniana koszula"
+
+
+CASES = [{"name": "Len", "query": "upał, co ubrać?", "expected": ["len"]}]
+
+
+def _run(engine, repeat=6):
+    runner = run_evaluation.EvaluationRunner(engine=engine)
+    runner.run_tests(repeat=repeat, warmup=1, test_cases=CASES)
+    return runner
+
+
+def test_repeats_with_warmup_and_stage_breakdown(tmp_path):
+    engine = TimedEngine(delay=0.001, prompt_tokens=100)
+    runner = _run(engine, repeat=3)
+
+    assert engine.calls == 4
+    result = runner.results[0]
+    assert result["status"] == "PASS"
+    assert len(result["latencies"]) == 3
+    assert result["tokens"] == [110, 110, 110]
+    assert abs(result["stages"]["encode"] - 0.002) < 1e-9
+    assert "faiss_search" not in result["stages"]
+
+    runner.save_baseline(str(tmp_path / "baseline.json"))
+    runner.append_history(str(tmp_path / "history.jsonl"))
+    runner.append_history(str(tmp_path / "history.jsonl"))
+    runner.generate_report(str(tmp_path / "report.md"))
+    baseline = json.loads((tmp_path / "baseline.json").read_text(encoding="utf-8"))
+    assert baseline["tests"]["Len"]["tokens"] == [110, 110, 110]
+    assert len((tmp_path / "history.jsonl").read_text(encoding="utf-8").splitlines()) == 2
+    assert "Stage breakdown" in (tmp_path / "report.md").read_text(encoding="utf-8")
+
+
+def test_gate_fails_on_latency_and_token_regressions_only():
+    baseline = _run(TimedEngine(delay=0.001, prompt_tokens=100)).to_json()
+
+    same = _run(TimedEngine(delay=0.001, prompt_tokens=100))
+    assert same.compare_with(baseline)
+
+    slower = _run(TimedEngine(delay=0.03, prompt_tokens=100))
+    assert not slower.compare_with(baseline)
+    assert slower.comparison[0]["regression"] == ["latency"]
+
+    bigger = _run(TimedEngine(delay=0.001, prompt_tokens=150))
+    assert not bigger.compare_with(baseline)
+    assert bigger.comparison[0]["regression"] == ["tokens"]
+
+
+def test_mann_whitney_detects_shift_but_not_noise():
+    base = [1.0, 1.1, 0.9, 1.05, 0.95, 1.02]
+    assert run_evaluation.mann_whitney_greater(base, [x + 0.5 for x in base]) < 0.01
+    assert run_evaluation.mann_whitney_greater(base, list(reversed(base))) > 0.4
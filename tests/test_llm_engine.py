@@ -0,0 +1,433 @@
+import asyncio
+import copy
+import json
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from google.genai import types
+
+import src.core.answer_cache as answer_cache
+import src.core.llm_engine as llm_module
+from benchmarks.fake_servers import FakeGenAIServer
+from src.core.answer_cache import SemanticAnswerCache
+from src.core.context_builder import ContextBuilder, chunk_tokens
+from src.core.guardrails import OUTPUT_BLOCKED_MESSAGE
+from src.core.sessions import InMemorySessionStore, Session, SessionNotFoundError, SessionStore, Turn, create_session_store, estimate_tokens
+from src.core.llm_engine import LocalLLMStub
+from src.tools.registry import registry
+from src.utils.metrics import GEMINI_TOKENS
+
+
+class FakeRag:
+    def __init__(self):
+        self.queries = []
+        self.batches = []
+
+    def search(self, query, k=3):
+        self.queries.append(query)
+        return [{"content": "Len: Najlepszy materiał na upały", "source": "fabrics_guide.txt", "score": 0.1}]
+
+    def search_batch(self, queries, k=3):
+        self.batches.append(list(queries))
+        return [self.search(q, k) for q in queries]
+
+    async def asearch(self, query, k=3):
+        return self.search(query, k)
+
+    def chunk_vectors(self, results):
+        return None
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    def fake_weather(city: str):
+        return {"city": city, "temperature_c": 27.0, "is_raining": True,
+                "is_snowing": False, "wind_speed_kmh": 12.0}
+
+    monkeypatch.setitem(registry._tools, "get_current_weather", fake_weather)
+    monkeypatch.setattr(llm_module, "get_rag_engine", FakeRag)
+    return LocalLLMStub()
+
+
+def test_stub_async_matches_sync(stub):
+    query = "Co ubrać w Krakowie?"
+    sync_answer = stub.process_query(query)
+    async_answer = asyncio.run(stub.aprocess_query(query))
+
+    assert sync_answer == async_answer
+    data = json.loads(async_answer)
+    assert data["weather"]["city"] == "Kraków"
+    assert "Parasol" in data["advice"]
+    assert stub.rag.queries == [query, query]
+
+
+def test_stub_async_fallback_without_tool(stub):
+    assert asyncio.run(stub.aprocess_query("asdfghjkl")).startswith("[offline] Nie kumam.")
+
+
+def test_stub_batch_dedupes_queries_and_caps_concurrency(stub, monkeypatch):
+    active = {"now": 0, "max": 0}
+    answer_one = stub.aprocess_query
+
+    async def tracked(query, session_id=None):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.01)
+        try:
+            return await answer_one(query)
+        finally:
+            active["now"] -= 1
+
+    monkeypatch.setattr(stub, "aprocess_query", tracked)
+    queries = ["Co ubrać w Krakowie?", "asdfghjkl", "co ubrać w  krakowie?", "qwerty", "zxcv"]
+    batch = asyncio.run(stub.aprocess_batch(queries, max_concurrency=2))
+
+    # Retrieval jednym search_batch dla unikalnych pytań, najwyżej 2 pętle naraz
+    assert stub.rag.batches == [["Co ubrać w Krakowie?", "asdfghjkl", "qwerty", "zxcv"]]
+    assert batch["unique_queries"] == 4 and active["max"] == 2
+    results = batch["results"]
+    assert [r["query"] for r in results] == queries
+    assert [r["deduplicated"] for r in results] == [False, False, True, False, False]
+    assert results[2]["response"] == results[0]["response"] and "Kraków" in results[0]["response"]
+    assert all(r["status"] == "success" and r["duration_ms"] >= 10 for r in results)
+
+
+async def _collect(stream):
+    return [item async for item in stream]
+
+
+def test_stub_stream_emits_progress_then_answer(stub):
+    events = asyncio.run(_collect(stub.astream_query("Co ubrać w Krakowie?")))
+    names = [e["event"] for e in events]
+
+    assert names == ["retrieval", "tool_start", "tool_end", "token", "done"]
+    assert events[1]["data"] == {"name": "get_current_weather", "args": {"city": "Kraków"}}
+    assert events[2]["data"]["ok"] is True
+    assert events[-1]["data"]["response"] == stub.process_query("Co ubrać w Krakowie?")
+
+
+class VectorRag(FakeRag):
+    """FakeRag z embeddingiem 'bag of words' - pytania różniące się interpunkcją/wielkością liter są identyczne."""
+
+    def encode_queries(self, queries):
+        vectors = np.zeros((len(queries), 64), dtype="float32")
+        for row, query in enumerate(queries):
+            for word in query.lower().replace("?", "").split():
+                vectors[row, sum(word.encode("utf-8")) % 64] += 1
+        return vectors
+
+    def cached_query_vector(self, query):
+        return self.encode_queries([query])[0]
+
+
+class FakeChat:
+    def __init__(self, calls, history=None):
+        self.calls = calls
+        self.history = history or []
+
+    def send_message(self, message):
+        self.calls.append(message)
+        if isinstance(message, str):
+            part = types.Part(function_call=types.FunctionCall(name="get_current_weather", args={"city": "Kraków"}))
+        else:
+            weather = message[0].function_response.response["result"]
+            part = types.Part(text=f"Stylista radzi: len, bo {json.loads(weather)['temperature_c']}°C")
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=[part]))],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(prompt_token_count=100, candidates_token_count=10)
+        )
+
+
+class AsyncFakeChat(FakeChat):
+    async def send_message(self, message):
+        return FakeChat.send_message(self, message)
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    weather = {"temperature_c": 27.0, "fetches": 0}
+    sent = []
+    histories = []
+
+    def fake_weather(city: str):
+        weather["fetches"] += 1
+        return {"city": city, "temperature_c": weather["temperature_c"]}
+
+    def create_chat(chat_class):
+        def create(model, config, history=None):
+            histories.append(history)
+            return chat_class(sent, history)
+        return create
+
+    class FakeClient:
+        def __init__(self, api_key=None, http_options=None):
+            self.chats = SimpleNamespace(create=create_chat(FakeChat))
+            self.aio = SimpleNamespace(chats=SimpleNamespace(create=create_chat(AsyncFakeChat)))
+
+    monkeypatch.setitem(registry._tools, "get_current_weather", fake_weather)
+    monkeypatch.setattr(llm_module, "get_rag_engine", VectorRag)
+    monkeypatch.setattr(llm_module.genai, "Client", FakeClient)
+    engine = llm_module.LLMEngine()
+    engine.histories = histories
+    return engine, sent, weather
+
+
+def test_answer_cache_skips_gemini_for_same_question_and_weather(gemini):
+    engine, sent, weather = gemini
+    prompt_tokens = GEMINI_TOKENS.labels("prompt")
+    before = prompt_tokens.value
+    first = engine.process_query("Co ubrać w Krakowie?")
+    assert first == "Stylista radzi: len, bo 27.0°C" and len(sent) == 2
+    assert prompt_tokens.value - before == 200
+
+    # To samo pytanie inaczej zapisane: ani Gemini (ani tokenów), ani ponownego pobrania pogody
+    assert engine.process_query("co ubrać w krakowie") == first
+    assert len(sent) == 2 and weather["fetches"] == 1
+    assert prompt_tokens.value - before == 200
+    assert engine.answer_cache.stats()["hits"] == 1
+
+    # Dane pogodowe starsze niż weather_ttl -> wpis wygasa, pełna ścieżka przez Gemini
+    weather["temperature_c"] = 12.0
+    engine.answer_cache.clear()
+    engine.answer_cache.weather_ttl = 0.01
+    assert asyncio.run(engine.aprocess_query("Co ubrać w Krakowie?")) == "Stylista radzi: len, bo 12.0°C"
+    time.sleep(0.02)
+    assert asyncio.run(engine.aprocess_query("Co ubrać w Krakowie?")) == "Stylista radzi: len, bo 12.0°C"
+    stats = engine.answer_cache.stats()
+    assert stats["expirations"] == 1 and stats["entries"] == 1 and len(sent) == 6 and weather["fetches"] == 3
+
+
+def test_answer_cache_after_lexical_search_never_encodes(gemini, monkeypatch):
+    engine, sent, _ = gemini
+    # Wyszukiwanie tylko BM25: w cache RagEngine nie ma embeddingu pytania, a model nie może być wołany
+    monkeypatch.setattr(engine.rag, "cached_query_vector", lambda query: None, raising=False)
+    monkeypatch.setattr(engine.rag, "encode_queries", lambda queries: pytest.fail("model encode"), raising=False)
+
+    first = asyncio.run(engine.aprocess_query("Co ubrać w Krakowie?"))
+    assert asyncio.run(engine.aprocess_query("co ubrać w krakowie")) == first
+    assert len(sent) == 2
+    # Bez embeddingu tylko te same słowa pytania
+    engine.process_query("Co założyć w Krakowie?")
+    assert len(sent) == 4 and engine.answer_cache.stats()["hits"] == 1
+
+
+def test_gemini_batch_answers_each_unique_question_once(gemini):
+    engine, sent, _ = gemini
+    batch = asyncio.run(engine.aprocess_batch(["Co ubrać w Krakowie?", "Co ubrać w Krakowie?"]))
+
+    assert [r["response"] for r in batch["results"]] == ["Stylista radzi: len, bo 27.0°C"] * 2
+    assert len(sent) == 2 and engine.rag.batches == [["Co ubrać w Krakowie?"]]
+
+
+def test_semantic_cache_requires_mentioned_city_and_respects_ttl(monkeypatch):
+    cache = SemanticAnswerCache(max_entries=2, similarity=0.9, ttl_seconds=60, weather_ttl_seconds=0.05)
+    vector = np.ones(8, dtype="float32")
+    calls = [("get_current_weather", {"city": "Kraków"})]
+    cache.store("Co ubrać w Krakowie?", vector, "ctx", calls, "Len")
+
+    # Embedding prawie identyczny, ale inne miasto albo inny kontekst RAG -> chybienie
+    assert cache.match("Co ubrać w Gdańsku?", vector * 0.99, "ctx") is None
+    assert cache.match("Co ubrać w Krakowie?", vector, "other") is None
+    entry = cache.match("A w Krakowie co ubrać?", vector * 0.99, "ctx")
+    assert cache.confirm(entry) == "Len"
+
+    # Odpowiedź, której guardrails już nie przepuszczają, wypada z cache
+    monkeypatch.setattr(answer_cache.guardrails, "validate_output", lambda text: OUTPUT_BLOCKED_MESSAGE)
+    assert cache.confirm(cache.match("Co ubrać w Krakowie?", vector, "ctx")) is None
+    assert len(cache) == 0
+    monkeypatch.undo()
+
+    # Odpowiedzi z pogodą wygasają szybciej; limit wpisów usuwa najdawniej używane
+    cache.store("Co ubrać w Krakowie?", vector, "ctx", calls, "Len")
+    time.sleep(0.06)
+    assert cache.match("Co ubrać w Krakowie?", vector, "ctx") is None
+    for i in range(3):
+        cache.store(f"pytanie {i}", np.eye(8, dtype="float32")[i], "ctx", [], f"odpowiedź {i}")
+    assert len(cache) == 2 and cache.stats()["evictions"] == 1 and cache.stats()["expirations"] == 1
+
+
+def test_semantic_cache_picks_most_similar_entry_of_the_same_context():
+    cache = SemanticAnswerCache(max_entries=8, similarity=0.5)
+    basis = np.eye(4, dtype="float32")
+    cache.store("pytanie a", basis[0], "ctx", [], "A")
+    cache.store("pytanie b", basis[0] + basis[1], "ctx", [], "B")
+    cache.store("pytanie c", basis[0], "other", [], "C")
+
+    assert cache.match("inne pytanie", basis[0] + 0.9 * basis[1], "ctx").answer == "B"
+    assert cache.match("inne pytanie", basis[0], "ctx").answer == "A"
+    # Te same słowa pytania bez embeddingu; ponowny zapis zastępuje starszą odpowiedź
+    cache.store("Pytanie A!", None, "ctx", [], "A2")
+    assert cache.match("pytanie a", None, "ctx").answer == "A2"
+    assert len(cache) == 3 and cache.match("pytanie d", None, "ctx") is None
+
+
+def test_static_prefix_is_reused_and_context_cache_replaces_it(monkeypatch):
+    class RotatingRag(VectorRag):
+        def search(self, query, k=3):
+            return [{"content": f"Fragment bazy dla: {query}", "source": "fabrics_guide.txt", "score": 0.1}]
+
+    monkeypatch.setattr(llm_module, "get_rag_engine", RotatingRag)
+    monkeypatch.setattr(llm_module.Config, "GOOGLE_API_KEY", "test-key")
+    monkeypatch.setattr(llm_module.Config, "ANSWER_CACHE_MAX_ENTRIES", 0)
+
+    with FakeGenAIServer() as server:
+        monkeypatch.setattr(llm_module.Config, "GEMINI_BASE_URL", server.base_url)
+        engine = llm_module.LLMEngine()
+        assert "Fragment bazy" not in engine.system_prompt
+
+        engine.process_query("Co na wesele?")
+        engine.process_query("Co na rozmowę o pracę?")
+        first, second = server.prompts
+        # Instrukcje i narzędzia identyczne - różni się tylko końcówka z kontekstem i pytaniem
+        assert second["prefix_tokens"] >= 0.9 * second["prompt_tokens"]
+
+        monkeypatch.setattr(llm_module.Config, "GEMINI_CONTEXT_CACHE", True)
+        engine.process_query("Co na spacer?")
+        engine.process_query("Co na randkę?")
+        assert server.requests["cachedContents"] == 1
+        cached = server.prompts[-1]
+        assert cached["cached_tokens"] > 0 and cached["sent_tokens"] < first["sent_tokens"] / 2
+
+    # Provider bez context cache: zostaje pełny (stały) prefiks
+    def unsupported(**kwargs):
+        raise RuntimeError("caching not supported for this model")
+
+    engine._context_cache_renew_at = 0.0
+    monkeypatch.setattr(engine.client.caches, "create", unsupported)
+    assert engine._request_config() is engine.generate_config
+
+
+def test_fake_genai_script_drives_tool_turns_and_injects_errors(monkeypatch):
+    calls = []
+    monkeypatch.setitem(registry._tools, "get_current_weather", lambda city: calls.append(city) or {"city": city})
+    monkeypatch.setattr(llm_module, "get_rag_engine", VectorRag)
+    monkeypatch.setattr(llm_module.Config, "GOOGLE_API_KEY", "test-key")
+    monkeypatch.setattr(llm_module.Config, "ANSWER_CACHE_MAX_ENTRIES", 0)
+    script = [
+        [{"name": "get_current_weather", "args": {"city": "Gdańsk"}},
+         {"name": "get_current_weather", "args": {"city": "Toruń"}}],
+        [{"name": "get_current_weather", "args": {"city": "Kraków"}}],
+    ]
+
+    with FakeGenAIServer(script=script) as server:
+        monkeypatch.setattr(llm_module.Config, "GEMINI_BASE_URL", server.base_url)
+        answer = llm_module.LLMEngine().process_query("Co spakować na wyjazd?")
+        assert answer.startswith("Stylista radzi")
+        assert sorted(calls[:2]) == ["Gdańsk", "Toruń"] and calls[2:] == ["Kraków"]
+        assert server.requests["generateContent"] == 3
+
+    with FakeGenAIServer(error_rate=1.0) as server:
+        monkeypatch.setattr(llm_module.Config, "GEMINI_BASE_URL", server.base_url)
+        assert "503" in llm_module.LLMEngine().process_query("Co na wesele?")
+        assert server.requests["errors"] == 1
+
+
+def test_session_keeps_history_and_reuses_tool_results(gemini):
+    engine, sent, weather = gemini
+    s1, s2 = engine.create_session(), engine.create_session()
+    engine.process_query("Co ubrać w Krakowie?", session_id=s1)
+    answer = engine.process_query("A na wieczór w Krakowie?", session_id=s1)
+
+    assert answer == "Stylista radzi: len, bo 27.0°C"
+    # Druga tura: historia poprzedniej, pogoda z sesji, fragment RAG nie jest wysyłany drugi raz
+    assert engine.histories[-1][0].role == "user" and engine.histories[-1][1].parts[0].text == answer
+    assert weather["fetches"] == 1
+    assert "Len: Najlepszy materiał" not in sent[-2] and "bez nowych fragmentów" in sent[-2]
+
+    # Inna sesja (i brak sesji) zaczyna od zera
+    engine.process_query("Co ubrać w Krakowie jutro?", session_id=s2)
+    assert engine.histories[-1] == [] and weather["fetches"] == 2
+    assert engine.end_session(s1) and not engine.has_session(s1)
+
+    # Tylko id założone przez serwer: nieznane (albo zakończone) nie tworzy nowej sesji
+    for unknown in ("s1", s1):
+        with pytest.raises(SessionNotFoundError):
+            engine.process_query("A buty?", session_id=unknown)
+    assert engine.sessions.get("s1") is None
+
+
+def test_concurrent_turns_of_one_session_are_both_kept(gemini):
+    engine, _, _ = gemini
+
+    class SerializingStore(InMemorySessionStore):
+        """Jak backend zapisujący sesje poza procesem: get zwraca kopię."""
+
+        def get(self, session_id):
+            session = super().get(session_id)
+            return copy.deepcopy(session) if session is not None else None
+
+    engine.sessions = SerializingStore()
+    session_id = engine.create_session()
+    first, second = engine._open_session(session_id), engine._open_session(session_id)
+    first.remember_tool_result("get_current_weather", {"city": "Kraków"}, {"temperature_c": 20})
+    second.remember_tool_result("get_current_weather", {"city": "Gdańsk"}, {"temperature_c": 15})
+    engine._finish_turn(first, "Co w Krakowie?", [], "Len")
+    engine._finish_turn(second, "A w Gdańsku?", [], "Wełna")
+
+    stored = engine.sessions.get(session_id)
+    assert [turn.question for turn in stored.turns] == ["Co w Krakowie?", "A w Gdańsku?"]
+    assert len(stored.tool_results) == 2
+
+    # Tura kończąca się po usunięciu sesji jej nie wskrzesza
+    late = engine._open_session(session_id)
+    engine.end_session(session_id)
+    engine._finish_turn(late, "Jeszcze?", [], "Nie")
+    assert not engine.has_session(session_id)
+
+
+def test_session_history_is_truncated_to_token_budget():
+    session = Session("s")
+    for i in range(6):
+        session.add_turn(Turn(f"Pytanie {i}", [f"fragment {i}" * 10], "Odpowiedź " * 20), 200, 100)
+
+    assert sum(turn.tokens() for turn in session.turns) <= 200
+    assert session.turns[-1].question == "Pytanie 5"
+    # Z usuniętych tur zostaje krótkie podsumowanie, samo też w budżecie
+    assert session.summary and session.summary[-1].startswith(f"- Pytanie {5 - len(session.turns)} ->")
+    assert sum(estimate_tokens(line) for line in session.summary) <= 100
+
+    store = InMemorySessionStore(max_sessions=2, ttl_seconds=60)
+    for name in ("a", "b", "c"):
+        store.save(Session(name))
+    assert store.get("a") is None and store.get("c") is not None
+    with pytest.raises(ValueError):
+        create_session_store("redis")
+
+    # Niekompletny backend odpada już przy tworzeniu, a nie przy pierwszym żądaniu
+    class GetOnlyStore(SessionStore):
+        def get(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyStore()
+
+
+def test_context_builder_filters_dedupes_diversifies_and_respects_budget():
+    results = [
+        {"content": "Len na upały", "source": "a.txt", "score": 0.2},
+        {"content": "Len  na UPAŁY", "source": "b.txt", "score": 0.3},          # ten sam tekst
+        {"content": "Lniane koszule na upał", "source": "a.txt", "score": 0.4},  # prawie duplikat wektorowo
+        {"content": "Bawełna też oddycha", "source": "a.txt", "score": 0.5},
+        {"content": "Kapelusz chroni przed słońcem", "source": "a.txt", "score": 0.6},
+        {"content": "Wełna na mrozy", "source": "a.txt", "score": 3.0},          # za daleko
+    ]
+    vectors = np.array([[1, 0, 0], [1, 0, 0], [0.99, 0.1, 0], [0.8, 0.6, 0], [0, 0, 1], [0, 1, 0]], dtype="float32")
+
+    selection = ContextBuilder(max_chunks=3, max_distance=1.5, mmr_lambda=0.5, token_budget=0).build(results, vectors)
+    assert selection.too_far == 1 and selection.duplicates == 2
+    # MMR: kapelusz (inny temat) wyprzedza bawełnę mimo niższej pozycji z wyszukiwania
+    assert [r["content"] for r in selection.results] == [
+        "Len na upały", "Kapelusz chroni przed słońcem", "Bawełna też oddycha"
+    ]
+
+    budget = chunk_tokens("Len na upały") + chunk_tokens("Bawełna też oddycha")
+    selection = ContextBuilder(max_chunks=3, mmr_lambda=1.0, token_budget=budget).build(results, vectors)
+    assert [r["content"] for r in selection.results] == ["Len na upały", "Bawełna też oddycha"]
+    assert selection.over_budget == 2 and selection.tokens <= budget
+    assert selection.saved_tokens == selection.baseline_tokens - selection.tokens > 0
+
+    # Bez wektorów: tylko próg, identyczne teksty i kolejność wyszukiwania
+    selection = ContextBuilder(max_chunks=2, max_distance=1.5).build(results)
+    assert [r["content"] for r in selection.results] == ["Len na upały", "Lniane koszule na upał"]
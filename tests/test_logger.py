@@ -0,0 +1,109 @@
+import io
+import json
+import logging
+import os
+import time
+
+from src.config import Config
+from src.utils import logger as log_module
+
+
+def test_setup_twice_adds_no_handlers_and_writes_json_lines(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "LOG_FORMAT", "json")
+    monkeypatch.setattr(Config, "LOG_INFO_SAMPLE_RATE", 1.0)
+    stream = io.StringIO()
+    logger = log_module.setup_logger("test_json", log_dir=str(tmp_path), stream=stream)
+    try:
+        assert log_module.setup_logger("test_json", log_dir=str(tmp_path)) is logger
+        assert len(logger.handlers) == 1
+
+        token = log_module.set_request_id("req-1")
+        try:
+            logger.info("Processing query: %.5s", "bardzo długie pytanie", extra={"stage": "ask"})
+        finally:
+            log_module.reset_request_id(token)
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            logger.exception("Failed")
+    finally:
+        log_module.shutdown_logger("test_json")
+
+    assert logger.handlers == []
+    with open(os.path.join(tmp_path, "app.log"), encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[0]["message"] == "Processing query: bardz"
+    assert lines[0]["request_id"] == "req-1"
+    assert lines[0]["stage"] == "ask"
+    assert lines[0]["level"] == "INFO"
+    assert lines[1]["request_id"] is None
+    assert "RuntimeError: boom" in lines[1]["exc"]
+    # Konsola dalej w czytelnym formacie tekstowym
+    assert " - INFO - Processing query: bardz" in stream.getvalue()
+
+
+def test_file_rotates_by_time_and_by_size(tmp_path):
+    def record(created_offset=0.0):
+        r = logging.makeLogRecord({"msg": "x" * 50, "levelno": logging.INFO, "levelname": "INFO"})
+        r.created += created_offset
+        return r
+
+    path = os.path.join(tmp_path, "app.log")
+    handler = log_module.SizeAndTimeRotatingFileHandler(path, max_bytes=0, rotate_seconds=60, backup_count=2)
+    try:
+        handler.emit(record())
+        assert not os.path.exists(path + ".1")
+        handler.emit(record(created_offset=61))
+        assert os.path.exists(path + ".1")
+
+        handler.maxBytes = 100
+        for _ in range(3):
+            handler.emit(record(created_offset=61))
+        assert os.path.exists(path + ".2")
+        assert not os.path.exists(path + ".3")
+    finally:
+        handler.close()
+
+
+def test_time_rotation_survives_restart(tmp_path):
+    def emit(path):
+        handler = log_module.SizeAndTimeRotatingFileHandler(path, rotate_seconds=3600, backup_count=2)
+        try:
+            handler.emit(logging.makeLogRecord({"msg": "x", "levelno": logging.INFO, "levelname": "INFO"}))
+        finally:
+            handler.close()
+
+    # Restart w trakcie okresu: ten sam plik, czas założenia odczytany z app.log.rollover
+    path = os.path.join(tmp_path, "app.log")
+    emit(path)
+    emit(path)
+    assert not os.path.exists(path + ".1")
+
+    # Plik założony ponad godzinę temu rotuje przy pierwszym rekordzie po restarcie
+    with open(path + ".rollover", "w", encoding="utf-8") as f:
+        f.write(str(time.time() - 7200))
+    emit(path)
+    assert os.path.exists(path + ".1") and not os.path.exists(path + ".2")
+
+    # Bez zapisanego czasu (starszy plik) wiek liczony od mtime
+    os.remove(path + ".rollover")
+    os.utime(path, (time.time() - 7200, time.time() - 7200))
+    emit(path)
+    assert os.path.exists(path + ".2")
+
+
+def test_sampling_keeps_whole_requests_and_all_warnings():
+    sampler = log_module.RequestContextFilter(sample_rate=0.5)
+
+    def kept(request_id, level):
+        token = log_module.set_request_id(request_id)
+        try:
+            return sampler.filter(logging.makeLogRecord({"levelno": level}))
+        finally:
+            log_module.reset_request_id(token)
+
+    decisions = {f"req-{i}": kept(f"req-{i}", logging.INFO) for i in range(200)}
+    assert 50 < sum(decisions.values()) < 150
+    # Ta sama decyzja dla każdej linii danego żądania
+    assert all(kept(rid, logging.DEBUG) == keep for rid, keep in decisions.items())
+    assert all(kept(rid, logging.WARNING) for rid in decisions)
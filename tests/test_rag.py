@@ -0,0 +1,502 @@
+import pickle
+import shutil
+import threading
+import time
+
+import faiss
+import numpy as np
+import pytest
+
+from src.config import Config
+from src.core.batching import QueryBatcher
+from src.core.doc_store import DocStore, DocStoreWriter
+from src.core.rag_engine import RagEngine
+from src.core import chunking, generations, lexical, vector_index
+import src.data_ingestion as ingestion
+from src.utils.cache import LRUCache
+
+
+class FakeModel:
+    """Deterministyczny 'model' embeddingów: wektor zależy tylko od tekstu."""
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+        self.calls = []
+
+    def encode(self, sentences):
+        self.calls.append(list(sentences))
+        vectors = []
+        for sentence in sentences:
+            seed = sum(sentence.encode("utf-8"))
+            vectors.append(np.random.default_rng(seed).standard_normal(self.dimension))
+        return np.asarray(vectors, dtype="float32")
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "RAG_BATCH_WINDOW_MS", 0)
+    model = FakeModel()
+    rag = RagEngine(model=model, vector_store_path=str(tmp_path))
+    texts = ["Len na upały", "Wełna na mrozy", "Poliester słabo oddycha", "Jedwab na wieczór"]
+    rag.index = faiss.IndexFlatL2(rag.dimension)
+    rag.index.add(model.encode(texts))
+    rag.documents = [{"content": t, "source": "fabrics_guide.txt"} for t in texts]
+    model.calls.clear()
+    return rag
+
+
+def test_search_batch_matches_single_searches(engine):
+    queries = ["Len na upały", "Jedwab na wieczór"]
+    batched = engine.search_batch(queries, k=2)
+
+    assert engine.model.calls == [queries]
+    assert batched == [engine.search(q, k=2) for q in queries]
+    assert batched[0][0]["content"] == "Len na upały"
+    # Wektory fragmentów odtwarzane z indeksu, bez ponownego encode
+    np.testing.assert_allclose(engine.chunk_vectors(batched[0]), engine.encode_queries(queries[:1] + [batched[0][1]["content"]]))
+
+
+def test_chunk_vectors_refuses_results_from_another_snapshot(engine):
+    results = engine.search("Len na upały", k=2)
+    old_snapshot = engine._snapshot
+
+    # Nowa generacja: te same id wskazują teraz inne wektory
+    texts = ["Wełna na mrozy", "Len na upały"]
+    index = faiss.IndexFlatL2(engine.dimension)
+    index.add(engine.model.encode(texts))
+    engine.index = index
+
+    assert engine.chunk_vectors(results) is None
+    assert engine.chunk_vectors(results, old_snapshot).shape == (2, engine.dimension)
+
+
+def test_batcher_groups_concurrent_queries():
+    calls = []
+    release = threading.Event()
+
+    def batch_fn(queries, k, context):
+        calls.append((list(queries), k))
+        release.wait(timeout=5)
+        return [[{"content": q, "rank": i} for i in range(k)] for q in queries]
+
+    batcher = QueryBatcher(batch_fn, window_ms=200, max_batch_size=3)
+    results = {}
+
+    def client(name, k):
+        results[name] = batcher.submit(name, k)
+
+    threads = [threading.Thread(target=client, args=(f"q{i}", i + 1)) for i in range(3)]
+    for t in threads:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join(timeout=5)
+    batcher.close()
+
+    # max_batch_size=3 zamyka batch od razu, bez czekania na koniec okna
+    assert len(calls) == 1
+    assert sorted(calls[0][0]) == ["q0", "q1", "q2"]
+    assert calls[0][1] == 3
+    assert [len(results[f"q{i}"]) for i in range(3)] == [1, 2, 3]
+    assert batcher.stats()["largest_batch"] == 3
+
+
+def test_batcher_propagates_errors():
+    def batch_fn(queries, k, context):
+        raise RuntimeError("encode failed")
+
+    batcher = QueryBatcher(batch_fn, window_ms=1)
+    with pytest.raises(RuntimeError, match="encode failed"):
+        batcher.submit("len", 3)
+    batcher.close()
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "a" staje się najświeższy
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 1
+
+
+def test_lru_cache_respects_ttl_and_memory_bound():
+    cache = LRUCache(max_entries=10, ttl_seconds=0.05)
+    cache.put("pogoda", "Warszawa")
+    time.sleep(0.1)
+    assert cache.get("pogoda") is None
+    assert cache.stats()["expirations"] == 1
+
+    vector = np.zeros(256, dtype="float32")  # 1 KiB
+    bounded = LRUCache(max_entries=100, max_bytes=3 * vector.nbytes)
+    for i in range(5):
+        bounded.put(i, vector.copy())
+    assert len(bounded) == 3
+    assert bounded.stats()["bytes"] <= 3 * vector.nbytes
+
+
+def test_search_uses_cache_and_reload_invalidates_results(engine, tmp_path):
+    first = engine.search("Co ubrać w  Krakowie?", k=2)
+    second = engine.search("co ubrać w krakowie?", k=2)
+
+    assert first == second
+    assert len(engine.model.calls) == 1
+    assert engine.cache_stats()["results"]["hits"] == 1
+
+    # Zapis indeksu na dysk i przeładowanie -> wyniki z cache są unieważnione
+    faiss.write_index(engine.index, str(tmp_path / "index.faiss"))
+    with open(tmp_path / "index.pkl", "wb") as f:
+        pickle.dump(engine.documents, f)
+    engine.reload()
+    assert len(engine.results_cache) == 0
+
+    engine.search("co ubrać w krakowie?", k=2)
+    # Embedding zapytania nadal w cache - model nie jest wołany ponownie
+    assert len(engine.model.calls) == 1
+    assert engine.cache_stats()["results"]["misses"] == 2
+
+
+@pytest.fixture
+def knowledge_base(tmp_path, monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(Config, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(Config, "VECTOR_STORE_PATH", str(tmp_path / "vector_store"))
+    monkeypatch.setattr(ingestion, "load_embedding_model", lambda: model)
+    kb = tmp_path / "knowledge_base"
+    kb.mkdir()
+    (kb / "fabrics.txt").write_text("Len na upały\nWełna na mrozy\n", encoding="utf-8")
+    (kb / "rules.txt").write_text("Maksymalnie trzy kolory\n", encoding="utf-8")
+    return kb, model
+
+
+def test_ingestion_only_embeds_new_chunks_and_removes_deleted(knowledge_base, tmp_path, capsys):
+    kb, model = knowledge_base
+    ingestion.main([])
+    assert sum(len(batch) for batch in model.calls) == 3
+
+    # Bez zmian: model nie jest nawet wołany
+    model.calls.clear()
+    ingestion.main([])
+    assert model.calls == []
+    assert "100.0% of re-embedding skipped" in capsys.readouterr().out
+
+    # Jedna linia zmieniona, jedna dodana, jeden plik usunięty
+    (kb / "fabrics.txt").write_text("Len na upały\nWełna merynosowa na mrozy\nJedwab na wieczór\n", encoding="utf-8")
+    (kb / "rules.txt").unlink()
+    ingestion.main([])
+    assert model.calls == [["Wełna merynosowa na mrozy", "Jedwab na wieczór"]]
+    out = capsys.readouterr().out
+    assert "Chunks removed: 2" in out and "Chunks reused: 1" in out
+
+    rag = RagEngine(model=model, vector_store_path=str(tmp_path / "vector_store"))
+    assert rag.index.ntotal == 3
+    assert sorted(d["content"] for d in rag.documents.values()) == [
+        "Jedwab na wieczór", "Len na upały", "Wełna merynosowa na mrozy"
+    ]
+    assert rag.search("Jedwab na wieczór", k=1)[0]["content"] == "Jedwab na wieczór"
+    assert not (tmp_path / "vector_store" / "index.pkl").exists()
+
+
+def test_ingestion_fails_fast_on_invalid_chunking(knowledge_base, tmp_path, monkeypatch):
+    kb, model = knowledge_base
+    monkeypatch.setattr(Config, "INGEST_CHUNK_MODE", "paragraph")
+    with pytest.raises(ValueError, match="paragraph"):
+        ingestion.main([])
+    assert model.calls == [] and not (tmp_path / "vector_store" / "CURRENT").exists()
+
+
+def test_ingestion_rolls_back_file_failing_halfway(knowledge_base, tmp_path, monkeypatch, capsys):
+    kb, model = knowledge_base
+    monkeypatch.setattr(Config, "INGEST_BATCH_SIZE", 1)
+    ingestion.main([])
+
+    def failing_chunks(file_path, *args):
+        for i, chunk in enumerate(chunking.iter_chunks(file_path, *args)):
+            if i == 2 and file_path.endswith("fabrics.txt"):
+                raise OSError("disk error")
+            yield chunk
+
+    # Dwa nowe fragmenty zakodowane, zanim plik przestał się czytać
+    (kb / "fabrics.txt").write_text("Len na upały\nJedwab na wieczór\nKaszmir na jesień\n", encoding="utf-8")
+    monkeypatch.setattr(ingestion, "iter_chunks", failing_chunks)
+    model.calls.clear()
+    ingestion.main([])
+    assert model.calls == [["Jedwab na wieczór"]]
+    assert "Error reading fabrics.txt: disk error" in capsys.readouterr().out
+
+    # W indeksie poprzednia wersja pliku, bez fragmentów z przerwanego odczytu
+    rag = RagEngine(model=model, vector_store_path=str(tmp_path / "vector_store"))
+    assert rag.index.ntotal == len(rag.documents) == 3
+    assert sorted(d["content"] for d in rag.documents.values()) == [
+        "Len na upały", "Maksymalnie trzy kolory", "Wełna na mrozy"
+    ]
+
+
+def test_doc_store_round_trip_with_sparse_ids(tmp_path):
+    writer = DocStoreWriter(str(tmp_path))
+    writer.add(0, "Len na upały", "fabrics.txt")
+    writer.add(3, "Żółty płaszcz ☂", "colors.txt")
+    writer.add(7, "", "fabrics.txt")
+    writer.commit()
+
+    store = DocStore(str(tmp_path))
+    assert len(store) == 3
+    assert store[3] == {"content": "Żółty płaszcz ☂", "source": "colors.txt"}
+    assert store[7]["content"] == ""
+    assert 1 not in store and store.get(1) is None
+    with pytest.raises(KeyError):
+        store[8]
+    assert [i for i, _ in store.items()] == [0, 3, 7]
+    assert store.sources == ["fabrics.txt", "colors.txt"]
+
+    bad = DocStoreWriter(str(tmp_path / "bad"))
+    bad.add(5, "a", "x")
+    with pytest.raises(ValueError):
+        bad.add(5, "b", "x")
+    bad.abort()
+
+
+def test_ingestion_migrates_legacy_pickle(knowledge_base, tmp_path):
+    kb, model = knowledge_base
+    ingestion.main([])
+    store_path = tmp_path / "vector_store"
+
+    # Symulacja starego układu: pliki bezpośrednio w vector_store, metadane w index.pkl
+    generation = store_path / generations.current_generation(str(store_path))
+    documents = dict(DocStore(str(generation)).items())
+    for name in ("index.faiss", "manifest.json"):
+        (generation / name).rename(store_path / name)
+    shutil.rmtree(generation)
+    (store_path / generations.CURRENT_FILE).unlink()
+    with open(store_path / "index.pkl", "wb") as f:
+        pickle.dump(documents, f)
+    assert RagEngine(model=model, vector_store_path=str(store_path)).documents == documents
+
+    model.calls.clear()
+    ingestion.main([])
+    assert model.calls == []
+    # Stare pliki zostają (są w repozytorium), ale serwer czyta już generację
+    assert (store_path / "index.pkl").exists() and (store_path / "index.faiss").exists()
+    rag = RagEngine(model=model, vector_store_path=str(store_path))
+    assert isinstance(rag.documents, DocStore)
+    assert dict(rag.documents.items()) == documents
+
+    ingestion.main(["--remove-legacy"])
+    assert not (store_path / "index.pkl").exists() and not (store_path / "index.faiss").exists()
+    assert dict(RagEngine(model=model, vector_store_path=str(store_path)).documents.items()) == documents
+
+
+@pytest.mark.parametrize("index_type", vector_index.INDEX_TYPES)
+def test_index_types_find_true_neighbours(index_type):
+    rng = np.random.default_rng(0)
+    # Skupiska wektorów - jak embeddingi tekstów o podobnej tematyce
+    centers = rng.standard_normal((40, 384)).astype("float32")
+    vectors = (centers[rng.integers(0, 40, 4000)] + 0.3 * rng.standard_normal((4000, 384))).astype("float32")
+    queries = vectors[:50] + 0.05 * rng.standard_normal((50, 384)).astype("float32")
+
+    index, built = vector_index.create_index(index_type, 384, len(vectors))
+    assert built == index_type and vector_index.index_type_of(index) == index_type
+    vector_index.train_index(index, vectors)
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype="int64"))
+    vector_index.set_search_params(index, nprobe=8, ef_search=64)
+
+    _, found = index.search(queries, 1)
+    assert (found[:, 0] == np.arange(50)).mean() >= 0.9
+
+
+def test_trained_index_falls_back_to_flat_for_tiny_corpus():
+    index, built = vector_index.create_index("ivfpq", 384, 10)
+    assert built == vector_index.FLAT and index.is_trained
+    with pytest.raises(ValueError):
+        vector_index.create_index("annoy", 384, 10)
+
+
+def test_ingestion_rebuilds_hnsw_graph_on_removal(knowledge_base, tmp_path, monkeypatch):
+    kb, model = knowledge_base
+    monkeypatch.setattr(Config, "RAG_INDEX_TYPE", "hnsw")
+    ingestion.main([])
+
+    (kb / "rules.txt").unlink()
+    model.calls.clear()
+    ingestion.main([])
+    assert model.calls == []
+
+    rag = RagEngine(model=model, vector_store_path=str(tmp_path / "vector_store"))
+    assert vector_index.index_type_of(rag.index) == "hnsw"
+    assert rag.index.ntotal == 2
+    assert rag.search("Wełna na mrozy", k=1)[0]["content"] == "Wełna na mrozy"
+
+    # Zmiana typu indeksu w konfiguracji wymusza pełną przebudowę
+    monkeypatch.setattr(Config, "RAG_INDEX_TYPE", "flat")
+    model.calls.clear()
+    ingestion.main([])
+    assert sum(len(batch) for batch in model.calls) == 2
+
+
+def test_hot_reload_swaps_generation_while_search_is_in_flight(knowledge_base, tmp_path, monkeypatch):
+    kb, model = knowledge_base
+    monkeypatch.setattr(Config, "RAG_RELOAD_POLL_SECONDS", 0)
+    ingestion.main([])
+    rag = RagEngine(model=model, vector_store_path=str(tmp_path / "vector_store"))
+    first_generation = rag.generation
+    assert rag.reload(if_changed=True)["reloaded"] is False
+
+    # Zapytanie zablokowane w encode() - już ma snapshot starej generacji
+    entered, release = threading.Event(), threading.Event()
+    original_encode = model.encode
+
+    def blocking_encode(sentences):
+        entered.set()
+        release.wait(5)
+        return original_encode(sentences)
+
+    model.encode = blocking_encode
+    in_flight = {}
+    worker = threading.Thread(target=lambda: in_flight.update(results=rag.search("Wełna na mrozy", k=3)))
+    worker.start()
+    assert entered.wait(5)
+
+    (kb / "fabrics.txt").write_text("Len na upały\nJedwab na wieczór\n", encoding="utf-8")
+    model.encode = original_encode
+    ingestion.main([])
+    result = rag.reload(if_changed=True)
+    release.set()
+    worker.join(5)
+
+    assert result["reloaded"] and result["generation"] != first_generation
+    assert rag.index_status()["generation"] == result["generation"]
+    assert rag.index_status()["last_swap_ms"] is not None
+    # Trwające zapytanie skończyło się na starej wersji, nowe widzą nową
+    assert "Wełna na mrozy" in [r["content"] for r in in_flight["results"]]
+    assert "Wełna na mrozy" not in [r["content"] for r in rag.search("Wełna na mrozy", k=3)]
+
+
+def test_window_chunking_overlaps_on_word_boundaries(tmp_path):
+    words = [f"slowo{i}" for i in range(60)]
+    chunks = list(chunking.windows(words, size=50, overlap=15))
+    assert all(len(chunk) <= 50 for chunk in chunks)
+    # Każde okno zaczyna się od końcówki poprzedniego, a razem pokrywają cały tekst
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous.split()[-1] in current.split()[:3]
+    assert sorted({w for chunk in chunks for w in chunk.split()}, key=words.index) == words
+
+    path = tmp_path / "kb.txt"
+    path.write_text("Krótki fakt\n\n" + " ".join(words) + "\n", encoding="utf-8")
+    line_chunks = list(chunking.iter_chunks(str(path), chunking.LINE, size=50, overlap=15))
+    assert line_chunks[0] == "Krótki fakt" and line_chunks[1:] == chunks
+    with pytest.raises(ValueError):
+        list(chunking.iter_chunks(str(path), "paragraph"))
+
+
+def test_ingestion_streams_batches_into_trained_index(knowledge_base, tmp_path, monkeypatch, capsys):
+    kb, model = knowledge_base
+    monkeypatch.setattr(Config, "RAG_INDEX_TYPE", "ivf")
+    monkeypatch.setattr(Config, "INGEST_BATCH_SIZE", 16)
+    lines = [f"Fakt {i}: {'ab' * (i % 7)} kolor {i * 37}" for i in range(200)]
+    (kb / "facts.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+    ingestion.main([])
+
+    assert max(len(batch) for batch in model.calls) == 16
+    assert sum(len(batch) for batch in model.calls) == 203
+    out = capsys.readouterr().out
+    assert "Embedding throughput" in out and "Peak RSS" in out
+    rag = RagEngine(model=model, vector_store_path=str(tmp_path / "vector_store"))
+    assert vector_index.index_type_of(rag.index) == "ivf"
+    assert rag.chunk_vectors(rag.search("Fakt 7", k=3)).shape == (3, model.dimension)
+    assert rag.index.ntotal == len(rag.documents) == 203
+    # Po treningu nie zostają pliki tymczasowe
+    assert not list((tmp_path / "vector_store").glob(".ingest-*"))
+
+    # Zmiana sposobu dzielenia tekstu przetwarza pliki od nowa, ale identyczne fragmenty są reużywane
+    monkeypatch.setattr(Config, "INGEST_CHUNK_MODE", "window")
+    monkeypatch.setattr(Config, "INGEST_CHUNK_SIZE", 40)
+    model.calls.clear()
+    ingestion.main([])
+    rag = RagEngine(model=model, vector_store_path=str(tmp_path / "vector_store"))
+    contents = [d["content"] for d in rag.documents.values()]
+    assert "Len na upały Wełna na mrozy" in contents and "Maksymalnie trzy kolory" in contents
+    assert not any("Maksymalnie trzy kolory" in batch for batch in model.calls)
+    assert all(len(c) <= 40 for c in contents)
+
+
+def test_bm25_tokenizer_matches_polish_inflections(tmp_path):
+    assert lexical.tokenize("Wełna") == lexical.tokenize("wełnę") == lexical.tokenize("WEŁNY")
+    assert lexical.tokenize("Co ubrać na mróz?") == ["ubrac"] + lexical.tokenize("mrozy")
+
+    writer = lexical.BM25Writer(str(tmp_path))
+    for doc_id, text in [(3, "Wełna na mrozy"), (7, "Len na upały"), (9, "Wełna merynosowa i wełna owcza")]:
+        writer.add(doc_id, text)
+    writer.commit()
+
+    index = lexical.BM25Index(str(tmp_path))
+    assert len(index) == 3
+    hits = index.search("swetry z wełny", k=5)
+    # Dwa wystąpienia termu w krótkim fragmencie wygrywają z jednym
+    assert [doc_id for doc_id, _ in hits] == [9, 3]
+    assert index.search("upał", k=1)[0][0] == 7
+    assert index.search("jedwab", k=3) == []
+
+
+def test_lexical_and_hybrid_search_modes(knowledge_base, tmp_path, monkeypatch):
+    kb, model = knowledge_base
+    ingestion.main([])
+    rag = RagEngine(model=model, vector_store_path=str(tmp_path / "vector_store"))
+    assert rag.index_status()["lexical_documents"] == 3
+
+    # Tryb leksykalny (i auto dla krótkiego zapytania ze znanymi termami) nie woła modelu embeddingów
+    model.calls.clear()
+    lexical_results = rag.search("wełną", k=2, mode="lexical")
+    assert [r["content"] for r in lexical_results] == ["Wełna na mrozy"]
+    assert lexical_results[0]["score"] is None and lexical_results[0]["bm25"] > 0
+    monkeypatch.setattr(Config, "RAG_SEARCH_MODE", "auto")
+    assert rag.search("upały", k=1)[0]["content"] == "Len na upały"
+    assert model.calls == []
+
+    # Hybrid: fragment z obu list (wektor + BM25) wygrywa fuzję RRF
+    hybrid = rag.search("Len na upały", k=3, mode="hybrid")
+    assert hybrid[0]["content"] == "Len na upały"
+    assert hybrid[0]["score"] is not None and hybrid[0]["bm25"] is not None
+    assert hybrid[0]["rrf"] == pytest.approx(2 / (Config.RAG_RRF_K + 1))
+    assert model.calls == [["Len na upały"]]
+    assert rag.search_batch(["Len na upały", "wełna"], k=3, mode="hybrid")[0] == hybrid
+    assert rag.search_batch(["wełna"], k=3) == [rag.search("wełna", k=3, mode="lexical")]
+
+    with pytest.raises(ValueError):
+        rag.search("len", mode="fuzzy")
+
+    # Generacja bez indeksu BM25 (sprzed tej zmiany): wyszukiwanie wraca do wektorowego
+    rag.lexical = None
+    assert "bm25" not in rag.search("Len na upały", k=1, mode="hybrid")[0]
+
+
+def test_retrieval_benchmark_builds_deterministic_corpus_and_measures_search(tmp_path, monkeypatch):
+    from benchmarks import bench_retrieval as bench
+
+    monkeypatch.setattr(Config, "RAG_BATCH_WINDOW_MS", 0)
+    monkeypatch.setattr(Config, "RAG_RELOAD_POLL_SECONDS", 0)
+    embedder = bench.HashEmbedder(dimension=32)
+    corpus = bench.SyntheticCorpus(300, embedder, seed=3)
+    docs, vectors = corpus.block(0)
+    again, _ = bench.SyntheticCorpus(300, bench.HashEmbedder(dimension=32), seed=3).block(0)
+    assert len(docs) == 300 and all((a == b).all() for a, b in zip(docs, again))
+    # Wektory fragmentów korpusu = to, co policzy encode() z ich tekstu (zapytania trafiają we właściwe miejsca)
+    assert np.allclose(embedder.encode([corpus.text(docs[7])])[0], vectors[7], atol=1e-5)
+
+    store = str(tmp_path / "store")
+    assert bench.build_store(store, corpus, "flat")["reused"] is False
+    assert bench.build_store(store, corpus, "flat")["reused"] is True
+    queries = corpus.queries(20)
+    options = {"k": 3, "modes": ["vector", "lexical", "hybrid"], "batch_sizes": [4], "queries": 12, "dimension": 32}
+    result = bench.measure(store, queries, options)
+
+    assert result["index_type"] == "flat" and result["load_ms"] > 0
+    assert set(result["single"]) == {"vector", "lexical", "hybrid"}
+    assert result["single"]["lexical"]["hit_at_k"] >= 0.9
+    assert result["single"]["hybrid"]["p50_ms"] <= result["single"]["hybrid"]["p99_ms"]
+    assert result["batch"]["4"]["per_query_ms"] > 0
+    assert "single.hybrid.p95_ms" in bench.flatten(result)
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from pydantic import BaseModel
+
+from benchmarks.fake_servers import FakeOpenMeteoServer
+from src.config import Config
+from src.tools.gazetteer import Gazetteer
+from src.tools.registry import ToolRegistry, registry
+from src.utils.metrics import TOOL_CALLS, TOOL_REJECTIONS, TOOL_TIMEOUTS
+import src.tools.definitions as definitions
+
+
+class SleepArgs(BaseModel):
+    seconds: float
+
+
+@pytest.fixture
+def tools(monkeypatch):
+    monkeypatch.setattr(Config, "TOOL_TIMEOUT_SECONDS", 0.5)
+    monkeypatch.setattr(Config, "TOOL_POOL_SIZE", 4)
+    local = ToolRegistry()
+    release = threading.Event()
+
+    @local.register(name="sleep", description="Sleeps.", args_schema=SleepArgs)
+    def sleep(seconds: float):
+        time.sleep(seconds)
+        return {"slept": seconds}
+
+    @local.register(name="block", description="Blocks until released.", args_schema=SleepArgs, max_concurrency=1)
+    def block(seconds: float):
+        release.wait(timeout=seconds)
+        return {"released": release.is_set()}
+
+    yield local, release
+    release.set()
+    local.executor.shutdown()
+
+
+def test_execute_many_runs_calls_concurrently(tools):
+    local, _ = tools
+    start = time.perf_counter()
+    results = local.execute_many([("sleep", {"seconds": 0.3}), ("sleep", {"seconds": 0.3}), ("sleep", '{"seconds": 0.3}')])
+    elapsed = time.perf_counter() - start
+
+    assert [json.loads(r) for r in results] == [{"slept": 0.3}] * 3
+    assert elapsed < 0.6
+    assert local.stats()["completed"] == 3
+
+
+def test_aexecute_many_runs_calls_concurrently(tools):
+    local, _ = tools
+    start = time.perf_counter()
+    results = asyncio.run(local.aexecute_many([("sleep", {"seconds": 0.3}), ("sleep", {"seconds": 0.3})]))
+
+    assert time.perf_counter() - start < 0.6
+    assert [json.loads(r)["slept"] for r in results] == [0.3, 0.3]
+
+
+def test_timed_out_worker_is_counted_as_hung_until_it_finishes(tools):
+    local, release = tools
+    timeouts, rejections = TOOL_TIMEOUTS.labels("block").value, TOOL_REJECTIONS.labels("block").value
+    successes = TOOL_CALLS.labels("block", "success").value
+    result = json.loads(local.execute("block", {"seconds": 5}))
+    assert result == {"error": "Tool execution timed out"}
+
+    stats = local.stats()
+    assert stats["timed_out"] == 1
+    assert stats["hung"] == 1 and stats["leaked_total"] == 1
+    assert stats["tools"]["block"] == {"in_flight": 1, "limit": 1}
+
+    # Limit 1 na narzędzie: zawieszony wątek nadal trzyma slot
+    busy = json.loads(local.execute("block", {"seconds": 5}))
+    assert busy == {"error": "Tool is busy, try again later."}
+    assert local.stats()["rejected"] == 1
+
+    release.set()
+    time.sleep(0.1)
+    stats = local.stats()
+    assert stats["hung"] == 0
+    assert stats["tools"]["block"]["in_flight"] == 0
+    # Metryki: timeout i odrzucenie policzone, a wątek po zwolnieniu kończy się sukcesem
+    assert TOOL_TIMEOUTS.labels("block").value == timeouts + 1
+    assert TOOL_REJECTIONS.labels("block").value == rejections + 1
+    assert TOOL_CALLS.labels("block", "success").value == successes + 1
+
+
+def test_errors_are_returned_as_json(tools):
+    local, _ = tools
+    assert "not found" in json.loads(local.execute("missing", {}))["error"]
+    assert json.loads(local.execute("sleep", "{not json"))["error"] == "Invalid JSON arguments format."
+    assert "Argument validation error" in json.loads(local.execute("sleep", {"wrong": 1}))["error"]
+
+
+def test_invalid_arguments_release_the_concurrency_slot(tools):
+    local, _ = tools
+    for arguments in (None, "[1]", [1]):
+        assert "Argument validation error" in json.loads(local.execute("block", arguments))["error"]
+    # None = wywołanie bez argumentów, trafia do puli; slot zwalnia callback po zakończeniu wątku
+    deadline = time.monotonic() + 1
+    while local.stats()["tools"]["block"]["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert local.stats()["tools"]["block"]["in_flight"] == 0
+    # Także bezpośrednio w puli: wyjątek przy zlecaniu zwalnia slot
+    with pytest.raises(TypeError):
+        local.executor.submit("block", lambda: None, ["x"])
+    assert local.stats()["tools"]["block"]["in_flight"] == 0
+
+
+def test_profile_tool_blocks_path_traversal():
+    result = json.loads(registry.execute("get_user_style_profile", {"user_id": "../etc/passwd"}))
+    assert result == {"error": "Operation blocked by security policy."}
+
+    profile = json.loads(registry.execute("get_user_style_profile", {"user_id": "anna"}))
+    assert "Styl biznesowy" in profile["profile_data"]
+
+
+@pytest.fixture
+def open_meteo(tmp_path, monkeypatch):
+    with FakeOpenMeteoServer() as server:
+        monkeypatch.setattr(Config, "OPEN_METEO_GEOCODING_URL", server.geocoding_url)
+        monkeypatch.setattr(Config, "OPEN_METEO_FORECAST_URL", server.forecast_url)
+        shipped = tmp_path / "gazetteer.json"
+        shipped.write_text(json.dumps({"warszawa": {"name": "Warszawa", "latitude": 52.2, "longitude": 21.0}}),
+                           encoding="utf-8")
+        monkeypatch.setattr(definitions, "gazetteer", Gazetteer(str(shipped), str(tmp_path / "cache" / "learned.json")))
+        yield server
+
+
+def test_weather_uses_gazetteer_after_first_lookup(open_meteo, tmp_path):
+    first = definitions.get_current_weather("Toruń")
+    second = definitions.get_current_weather("toruń")
+
+    assert first["temperature_c"] == second["temperature_c"]
+    assert open_meteo.requests == {"/v1/search": 1, "/v1/forecast": 2}
+
+    # Gazetteer jest trwały: nowa instancja czyta współrzędne z osobnego pliku, a plik z repozytorium się nie zmienia
+    reloaded = Gazetteer(str(tmp_path / "gazetteer.json"), str(tmp_path / "cache" / "learned.json"))
+    assert reloaded.lookup("Toruń")["latitude"] == pytest.approx(53.01375)
+    assert reloaded.lookup("Warszawa")["latitude"] == 52.2
+    assert "toruń" not in json.loads((tmp_path / "gazetteer.json").read_text(encoding="utf-8"))
+
+
+def test_weather_reuses_http_connection(open_meteo):
+    for _ in range(3):
+        definitions.get_current_weather("Kraków")
+    assert open_meteo.requests["/v1/forecast"] == 3
+    assert len(open_meteo.client_ports) == 1
+
+
+def test_trip_weather_fetches_all_cities_in_one_forecast_call(open_meteo):
+    result = registry.execute("get_trip_weather", {"cities": ["Kraków", "Zakopane", "Gdańsk", "Kraków", "Atlantyda"]})
+    cities = json.loads(result)["cities"]
+
+    assert [c["city"] for c in cities] == ["Kraków", "Zakopane", "Gdańsk", "Atlantyda"]
+    assert cities[-1]["error"] == "City 'Atlantyda' not found."
+    assert cities[1]["temperature_c"] == FakeOpenMeteoServer.current_for(49.29899, 19.94885)["current"]["temperature_2m"]
+    assert open_meteo.requests["/v1/forecast"] == 1
+    assert open_meteo.requests["/v1/search"] == 4
+
+
+def test_trip_weather_rejects_incomplete_forecast(open_meteo, monkeypatch):
+    # Odpowiedź tylko dla jednej z dwóch lokalizacji nie może zostać przypisana niewłaściwemu miastu
+    definitions.gazetteer.add("Gdynia", "Gdynia", 54.5, 18.5)
+    response = SimpleNamespace(raise_for_status=lambda: None,
+                               json=lambda: [FakeOpenMeteoServer.current_for(52.2, 21.0)])
+    monkeypatch.setattr(definitions, "get_session", lambda: SimpleNamespace(get=lambda *args, **kwargs: response))
+    with pytest.raises(RuntimeError, match="weather for 1 of 2 locations"):
+        definitions.get_trip_weather(["Warszawa", "Gdynia"])
+
+
+def test_unknown_city_and_invalid_name(open_meteo):
+    assert definitions.get_current_weather("Atlantyda") == {"error": "City 'Atlantyda' not found."}
+    result = json.loads(registry.execute("get_current_weather", {"city": "../etc"}))
+    assert "Validation Error" in result["error"]